@@ -0,0 +1,520 @@
+"""
+End-to-end restore benchmark against a throwaway local PostgreSQL.
+
+A fresh cluster is created with initdb in a temporary directory and listens
+only on a Unix socket there, so nothing outside the benchmark is touched.
+Every run restores a dataset into a new database and times each phase:
+
+  insert_all   the shipped insert_all.sh (psql -f per file, one transaction per row)
+  single_row   the table files as they are, one transaction per table
+  multi_row    consecutive rows folded into INSERT ... VALUES (...), (...) statements
+  copy         COPY blocks streamed into psql (convert_insert_to_copy.py)
+
+single_row, multi_row and copy each run with eager constraints (keys, FKs and
+indexes from table_schema.sql exist before the data goes in) and deferred
+constraints (added after the data). insert_all applies the schema itself, so
+it only runs eager.
+
+table_schema.sql only holds constraints and indexes; the tables themselves
+come from the application's migrations. Unless --ddl is given, CREATE TABLE
+statements are inferred from the data (uuid, boolean, numeric or text per
+column), which keeps relative timings honest even if column types differ.
+
+--scale N adds synthetic copies of each dataset N times the size: every UUID
+is remapped per copy, so keys stay unique and foreign keys stay valid.
+
+Results go to a JSON report (--output) with one record per run.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from convert_insert_to_copy import iter_copy_lines, table_files_in_order
+from dump_io import read_text, table_chunk_map
+from row_store import token_kind
+from schema_model import SchemaModel, parse_schema
+from sql_statements import iter_file_statements, iter_insert_rows, iter_statements, parse_insert_head, split_values
+
+
+STRATEGIES = ("insert_all", "single_row", "multi_row", "copy")
+
+_SQL_TYPES = {"uuid": "uuid", "bool": "boolean", "bare": "numeric", "text": "text"}
+_SCHEMA_TABLE = re.compile(r"(?:ALTER\s+TABLE\s+(?:ONLY\s+)?|\bON\s+)(?:public\.)?\"?(\w+)\"?", re.IGNORECASE)
+_REFERENCES = re.compile(r"REFERENCES\s+(?:public\.)?\"?(\w+)\"?", re.IGNORECASE)
+_UNIQUE = re.compile(
+    r'ALTER\s+TABLE\s+(?:ONLY\s+)?(?:public\.)?"?(\w+)"?\s+ADD\s+CONSTRAINT\s+\S+\s+UNIQUE\s*\(\s*("?\w+"?)\s*\)',
+    re.IGNORECASE,
+)
+_UUID_LITERAL = re.compile(r"'([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})'")
+_SCALE_NAMESPACE = uuid.UUID("6f1c0f2e-6a55-4a8e-9a57-3c1d2b7e0b10")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark restore strategies end to end against a throwaway local PostgreSQL.",
+    )
+    parser.add_argument(
+        "datasets",
+        type=Path,
+        nargs="*",
+        default=[Path("scripts/backup_plain_tables")],
+        help="Table directories to restore (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        action="append",
+        default=[],
+        help="Also benchmark a synthetic copy of each dataset N times the size. Repeatable.",
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=STRATEGIES,
+        action="append",
+        help="Strategy to run; repeatable (default: all).",
+    )
+    parser.add_argument(
+        "--constraints",
+        choices=("eager", "deferred"),
+        action="append",
+        help="Constraint timing to run; repeatable (default: both).",
+    )
+    parser.add_argument(
+        "--rows-per-statement",
+        type=int,
+        default=1000,
+        help="Rows per INSERT for the multi_row strategy (default: 1000).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Runs per combination; the report keeps every timing (default: 1).",
+    )
+    parser.add_argument(
+        "--ddl",
+        type=Path,
+        help="CREATE TABLE script to use instead of tables inferred from the data.",
+    )
+    parser.add_argument(
+        "--pg-bin",
+        type=Path,
+        help="Directory with initdb, pg_ctl and psql (default: from PATH).",
+    )
+    parser.add_argument(
+        "--server-option",
+        "-c",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Extra postgres setting for the throwaway server, e.g. -c shared_buffers=1GB. Repeatable.",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory for the cluster and scaled datasets (default: system temp dir).",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=Path,
+        default=Path("bench_restore.json"),
+        help="JSON report to write (default: bench_restore.json).",
+    )
+    return parser.parse_args()
+
+
+class TempPostgres:
+    """A PostgreSQL cluster in a temporary directory, reachable only through its Unix socket."""
+
+    def __init__(self, root: Path, pg_bin: Path | None = None, options: list[str] | None = None) -> None:
+        self.root = root
+        self.data_dir = root / "data"
+        self.socket_dir = root / "socket"
+        self.options = options or []
+        self._bin = pg_bin
+
+    def tool(self, name: str) -> str:
+        if self._bin is not None:
+            return str(self._bin / name)
+        path = shutil.which(name)
+        if path is None:
+            raise RuntimeError(f"'{name}' not found; install PostgreSQL or pass --pg-bin")
+        return path
+
+    def start(self) -> None:
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+        subprocess.run(
+            [self.tool("initdb"), "-D", str(self.data_dir), "-U", "postgres", "-A", "trust",
+             "-E", "UTF8", "--locale=C", "--no-sync"],
+            check=True, capture_output=True,
+        )
+        server_options = f"-k {self.socket_dir} -c listen_addresses=''"
+        for option in self.options:
+            server_options += f" -c {option}"
+        subprocess.run(
+            [self.tool("pg_ctl"), "-D", str(self.data_dir), "-l", str(self.root / "server.log"),
+             "-o", server_options, "-w", "start"],
+            check=True, capture_output=True,
+        )
+
+    def stop(self) -> None:
+        subprocess.run(
+            [self.tool("pg_ctl"), "-D", str(self.data_dir), "-m", "fast", "-w", "stop"],
+            capture_output=True,
+        )
+
+    def env(self, dbname: str) -> dict[str, str]:
+        """Environment for psql (and insert_all.sh) to reach this cluster."""
+        return {
+            **os.environ,
+            "PGHOST": str(self.socket_dir),
+            "PGUSER": "postgres",
+            "PGDATABASE": dbname,
+            "DB_USER": "postgres",
+            "DB_NAME": dbname,
+        }
+
+    def psql(self, dbname: str, lines: Iterable[str]) -> None:
+        """Stream SQL into psql, stopping at the first error (raised as RuntimeError)."""
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(
+                [self.tool("psql"), "-X", "-q", "-v", "ON_ERROR_STOP=1", "-f", "-"],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr, env=self.env(dbname),
+            )
+            assert proc.stdin is not None
+            try:
+                with io.TextIOWrapper(proc.stdin, encoding="utf-8") as fin:
+                    fin.writelines(lines)
+            except BrokenPipeError:
+                pass
+            if proc.wait() != 0:
+                stderr.seek(0)
+                error = stderr.read().decode("utf-8", errors="replace").strip()
+                raise RuntimeError(error or f"psql exited with code {proc.returncode}")
+
+    def query(self, dbname: str, sql: str) -> list[list[str]]:
+        result = subprocess.run(
+            [self.tool("psql"), "-X", "-At", "-F", "\t", "-c", sql],
+            check=True, capture_output=True, env=self.env(dbname),
+        )
+        return [line.split("\t") for line in result.stdout.decode("utf-8").splitlines() if line]
+
+
+@contextmanager
+def temp_postgres(work_dir: Path | None, pg_bin: Path | None, options: list[str]) -> Iterator[TempPostgres]:
+    with tempfile.TemporaryDirectory(prefix="bench_pg_", dir=work_dir) as tmp:
+        server = TempPostgres(Path(tmp), pg_bin, options)
+        server.start()
+        try:
+            yield server
+        finally:
+            server.stop()
+
+
+def infer_table_ddl(table_dir: Path, model: SchemaModel) -> list[str]:
+    """
+    CREATE TABLE statements inferred from the INSERT statements of a table directory.
+
+    A column is uuid, boolean or numeric if every non-NULL value has that kind,
+    else text. FK columns and the columns they reference are forced to the
+    same type so the constraints can be created.
+    """
+    columns: dict[str, dict[str, set[str]]] = {}
+    for table, chunk_files in table_chunk_map(table_dir).items():
+        kinds = columns.setdefault(table, {})
+        for chunk_file in chunk_files:
+            for _, names, values, _ in iter_insert_rows(iter_file_statements(chunk_file)):
+                for name, token in zip(names, values):
+                    kind = token_kind(token)
+                    seen = kinds.setdefault(name, set())
+                    if kind is not None:
+                        seen.add(kind)
+
+    # None: only NULLs seen, so the type is free to follow an FK
+    types: dict[tuple[str, str], str | None] = {
+        (table, name): (_SQL_TYPES[next(iter(seen))] if len(seen) == 1 else "text") if seen else None
+        for table, kinds in columns.items()
+        for name, seen in kinds.items()
+    }
+    pairs = [
+        ((fk.table, c), (fk.ref_table, r))
+        for fk in model.foreign_keys
+        for c, r in zip(fk.columns, fk.ref_columns)
+        if (fk.table, c) in types and (fk.ref_table, r) in types
+    ]
+    changed = True
+    while changed:
+        changed = False
+        for child, parent in pairs:
+            if types[child] == types[parent]:
+                continue
+            if types[child] is None or types[parent] is None:
+                types[child] = types[parent] = types[child] or types[parent]
+            else:
+                types[child] = types[parent] = "text"
+            changed = True
+
+    return [
+        f"CREATE TABLE public.{table} (\n"
+        + ",\n".join(f"    {name} {types[(table, name)] or 'text'}" for name in kinds)
+        + "\n);\n"
+        for table, kinds in sorted(columns.items())
+    ]
+
+
+def schema_statements(schema_file: Path, tables: set[str]) -> list[str]:
+    """Constraint and index statements of table_schema.sql that only touch tables in `tables`."""
+    statements = []
+    for statement in iter_statements(io.StringIO(read_text(schema_file))):
+        upper = statement.upper()
+        if not (upper.startswith("ALTER TABLE") or upper.startswith("CREATE INDEX") or upper.startswith("CREATE UNIQUE")):
+            continue
+        match = _SCHEMA_TABLE.search(statement)
+        if match is None or match.group(1) not in tables:
+            continue
+        ref = _REFERENCES.search(statement)
+        if ref is not None and ref.group(1) not in tables:
+            continue
+        statements.append(statement + "\n")
+    return statements
+
+
+def _scale_statement(statement: str, copy: int, unique_columns: set[str]) -> str:
+    """Copy `copy` of a row: UUIDs remapped, single-column UNIQUE text values suffixed."""
+    if copy == 0:
+        return statement
+    head = parse_insert_head(statement)
+    if head is None:
+        return statement
+    _, columns, values_start = head
+    values, values_end = split_values(statement, values_start)
+    for i, (column, token) in enumerate(zip(columns, values)):
+        match = _UUID_LITERAL.fullmatch(token)
+        if match:
+            values[i] = f"'{uuid.uuid5(_SCALE_NAMESPACE, f'{match.group(1)}:{copy}')}'"
+        elif column in unique_columns and token_kind(token) == "text":
+            values[i] = f"{token[:-1]}-{copy}'"
+    return statement[:values_start] + ", ".join(values) + statement[values_end:]
+
+
+def scale_dataset(table_dir: Path, factor: int, output_dir: Path) -> Path:
+    """Write `factor` copies of every row of table_dir into output_dir (plus schema and insert_all.sh)."""
+    schema_file = table_dir / "table_schema.sql"
+    unique: dict[str, set[str]] = {}
+    for table, column in _UNIQUE.findall(read_text(schema_file)):
+        unique.setdefault(table, set()).add(column)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for table, chunk_files in table_chunk_map(table_dir).items():
+        with (output_dir / f"table_{table}.sql").open("w", encoding="utf-8") as fout:
+            for copy in range(factor):
+                for chunk_file in chunk_files:
+                    for statement in iter_file_statements(chunk_file):
+                        fout.write(_scale_statement(statement, copy, unique.get(table, set())) + "\n")
+
+    shutil.copyfile(schema_file, output_dir / "table_schema.sql")
+    if (table_dir / "insert_all.sh").exists():
+        shutil.copyfile(table_dir / "insert_all.sh", output_dir / "insert_all.sh")
+    return output_dir
+
+
+def iter_single_row_sql(table_files: list[Path]) -> Iterator[str]:
+    """The table files' statements unchanged, one transaction per file."""
+    for table_file in table_files:
+        yield "BEGIN;\n"
+        for statement in iter_file_statements(table_file):
+            yield statement + "\n"
+        yield "COMMIT;\n"
+
+
+def iter_multi_row_sql(table_files: list[Path], rows_per_statement: int) -> Iterator[str]:
+    """Consecutive single-row INSERTs with the same column list folded into multi-row INSERTs."""
+    for table_file in table_files:
+        yield "BEGIN;\n"
+        prefix: str | None = None
+        tuples: list[str] = []
+        for statement in iter_file_statements(table_file):
+            head = parse_insert_head(statement)
+            if head is None:
+                continue
+            _, _, values_start = head
+            _, values_end = split_values(statement, values_start)
+            # values_start is just past "(", values_end is at ")"
+            statement_prefix = statement[:values_start - 1]
+            if statement_prefix != prefix or len(tuples) >= rows_per_statement:
+                if tuples:
+                    yield prefix + ",\n".join(tuples) + ";\n"
+                prefix, tuples = statement_prefix, []
+            tuples.append(statement[values_start - 1:values_end + 1])
+        if tuples:
+            yield prefix + ",\n".join(tuples) + ";\n"
+        yield "COMMIT;\n"
+
+
+def count_rows(table_files: dict[str, list[Path]]) -> dict[str, int]:
+    """INSERT statements per table, i.e. the rows a complete restore must contain."""
+    return {
+        table: sum(1 for chunk in chunks for s in iter_file_statements(chunk) if parse_insert_head(s) is not None)
+        for table, chunks in table_files.items()
+    }
+
+
+def run_restore(
+    server: TempPostgres,
+    dataset: Path,
+    strategy: str,
+    constraints: str,
+    ddl: list[str],
+    rows_per_statement: int,
+    dbname: str,
+) -> dict:
+    """Restore one dataset into a fresh database. Returns per-phase timings and loaded rows."""
+    tables = table_chunk_map(dataset)
+    constraint_sql = schema_statements(dataset / "table_schema.sql", set(tables))
+    table_files = table_files_in_order(dataset)
+
+    server.psql("postgres", [f"DROP DATABASE IF EXISTS {dbname};\n", f"CREATE DATABASE {dbname};\n"])
+    phases: dict[str, float] = {}
+    error = None
+
+    def timed(phase: str, action) -> None:
+        started = time.perf_counter()
+        action()
+        phases[phase] = time.perf_counter() - started
+
+    try:
+        timed("create_tables", lambda: server.psql(dbname, ddl))
+        if strategy == "insert_all":
+            # The script runs table_schema.sql itself before any data
+            timed("load", lambda: subprocess.run(
+                ["bash", "insert_all.sh"], cwd=dataset, env=server.env(dbname),
+                check=True, capture_output=True,
+            ))
+        else:
+            if constraints == "eager":
+                timed("constraints", lambda: server.psql(dbname, constraint_sql))
+            if strategy == "single_row":
+                data = iter_single_row_sql(table_files)
+            elif strategy == "multi_row":
+                data = iter_multi_row_sql(table_files, rows_per_statement)
+            else:
+                data = iter_copy_lines(s for f in table_files for s in iter_file_statements(f))
+            timed("load", lambda: server.psql(dbname, data))
+            if constraints == "deferred":
+                timed("constraints", lambda: server.psql(dbname, constraint_sql))
+    except (RuntimeError, subprocess.CalledProcessError) as exc:
+        error = str(exc)[:500]
+
+    union = " UNION ALL ".join(f"SELECT '{t}', count(*) FROM public.{t}" for t in sorted(tables))
+    loaded = {row[0]: int(row[1]) for row in server.query(dbname, union)} if tables and "create_tables" in phases else {}
+    server.psql("postgres", [f"DROP DATABASE IF EXISTS {dbname};\n"])
+
+    return {
+        "phases": phases,
+        "seconds": sum(phases.values()),
+        "rows_loaded": sum(loaded.values()),
+        "error": error,
+    }
+
+
+def benchmark(server: TempPostgres, datasets: list[tuple[str, Path]], args: argparse.Namespace) -> list[dict]:
+    """Run every strategy / constraint timing / repeat on every dataset."""
+    strategies = args.strategy or list(STRATEGIES)
+    timings = args.constraints or ["eager", "deferred"]
+    runs = []
+
+    for name, dataset in datasets:
+        model = parse_schema(dataset / "table_schema.sql")
+        ddl = [read_text(args.ddl)] if args.ddl else infer_table_ddl(dataset, model)
+        table_files = table_chunk_map(dataset)
+        rows_expected = sum(count_rows(table_files).values())
+        size = sum(p.stat().st_size for chunks in table_files.values() for p in chunks)
+        print(f"\nDataset '{name}': {rows_expected} rows, {size / (1 << 20):.1f} MB")
+
+        for strategy in strategies:
+            if strategy == "insert_all" and not (dataset / "insert_all.sh").exists():
+                print(f"  {strategy}: skipped (no insert_all.sh)")
+                continue
+            for constraints in (["eager"] if strategy == "insert_all" else timings):
+                for attempt in range(args.repeat):
+                    result = run_restore(
+                        server, dataset, strategy, constraints, ddl, args.rows_per_statement, "bench_restore",
+                    )
+                    seconds = result["seconds"]
+                    runs.append({
+                        "dataset": name,
+                        "bytes": size,
+                        "rows_expected": rows_expected,
+                        "strategy": strategy,
+                        "constraints": constraints,
+                        "attempt": attempt + 1,
+                        **result,
+                        "rows_per_second": result["rows_loaded"] / seconds if seconds else None,
+                        "mb_per_second": size / (1 << 20) / seconds if seconds else None,
+                    })
+                    if result["error"]:
+                        status = f"error: {result['error'].splitlines()[0]}"
+                    else:
+                        status = f"{seconds:.2f}s, {result['rows_loaded']}/{rows_expected} rows"
+                    print(f"  {strategy} ({constraints}) #{attempt + 1}: {status}")
+
+    return runs
+
+
+def main() -> None:
+    args = parse_args()
+
+    for dataset in args.datasets:
+        if not (dataset / "table_schema.sql").exists():
+            print(f"Error: Schema file not found: {dataset / 'table_schema.sql'}")
+            return
+    if args.rows_per_statement < 1 or args.repeat < 1 or any(n < 2 for n in args.scale):
+        print("Error: --rows-per-statement and --repeat must be at least 1, --scale at least 2")
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bench_data_", dir=args.work_dir) as tmp:
+        datasets = [(str(d), d) for d in args.datasets]
+        for dataset in args.datasets:
+            for factor in args.scale:
+                print(f"Scaling '{dataset}' x{factor}...")
+                scaled = scale_dataset(dataset, factor, Path(tmp) / f"{dataset.name}_x{factor}")
+                datasets.append((f"{dataset}@x{factor}", scaled))
+
+        try:
+            with temp_postgres(args.work_dir, args.pg_bin, args.server_option) as server:
+                version = server.query("postgres", "SHOW server_version")[0][0]
+                runs = benchmark(server, datasets, args)
+        except (RuntimeError, subprocess.CalledProcessError, FileNotFoundError) as exc:
+            print(f"Error: PostgreSQL failed: {exc}")
+            return
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "postgres_version": version,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "server_options": args.server_option,
+        "rows_per_statement": args.rows_per_statement,
+        "runs": runs,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"\nWrote {len(runs)} runs to '{args.output}'")
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Throughput benchmarks for the dump tools on a synthetic dump.
+
+A seeded synthetic dump (generate_synthetic_dump.py) is written once in INSERT
+and COPY form and split into a table directory (dump_source.stream_split). Each tool then runs on it
+--repeat times and the best time is kept:
+
+  convert_copy_to_insert   COPY dump -> INSERT dump
+  convert_insert_to_copy   table directory -> COPY stream
+  split                    split_by_table.split_file (memory-mapped path)
+  stream_split             dump_source.stream_split
+  validate                 validate_json_in_sql over every table file
+  fix_*                    each fixer over a fresh copy of the table directory
+  check_fk                 check_fk_violations.check_fks over every FK
+  order                    generate_insert_order and plan_load.build_plan
+
+Results (seconds, MB/s over the bytes each tool reads, current git commit)
+go to a JSON report. With --baseline, a tool that is more than --tolerance
+slower than in an earlier report is listed and the script exits with
+status 1, so it can gate a commit.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import convert_copy_to_insert
+import fix_json_complete
+import fix_json_final
+import fix_json_in_sql
+import fix_json_multiline
+import fix_json_multiline_inserts
+import fix_remaining_json_errors
+from check_fk_violations import check_fks
+from convert_insert_to_copy import table_files_in_order, write_copy_stream
+from dump_io import list_sql_files, open_output, sql_stem
+from dump_source import stream_split
+from generate_insert_order import get_all_tables, parse_foreign_keys, topological_sort
+from generate_synthetic_dump import generate_dump
+from plan_load import build_plan
+from split_by_table import parse_size, split_file
+from validate_json_in_sql import validate_file
+
+
+FIXERS = {
+    "fix_json_complete": lambda path: fix_json_complete.fix_file(path, False),
+    "fix_json_final": lambda path: fix_json_final.fix_file(path, False),
+    "fix_json_in_sql": lambda path: fix_json_in_sql.fix_file(path, False),
+    "fix_json_multiline": lambda path: fix_json_multiline.fix_file(path, False),
+    "fix_json_multiline_inserts": lambda path: fix_json_multiline_inserts.fix_file(path, False),
+    "fix_remaining_json_errors": lambda path: fix_remaining_json_errors.fix_file(path, False),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput of the dump tools on a synthetic dump.",
+    )
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=parse_size("10M"),
+        help="Size of the synthetic dump, e.g. 10M, 1G, 10G (default: 10M).",
+    )
+    parser.add_argument(
+        "--template",
+        type=Path,
+        default=Path("scripts/backup_plain_tables"),
+        help="Real table directory the synthetic dump is modelled on (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--tool",
+        action="append",
+        help="Only run benchmarks whose name starts with this; repeatable (default: all).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per benchmark; the fastest is reported (default: 3).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for the synthetic dump (default: 0).",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory for the synthetic dump and outputs (default: system temp dir).",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=Path,
+        default=Path("bench_tools.json"),
+        help="JSON report to write (default: bench_tools.json).",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="Earlier report to compare against; exit with status 1 on a regression.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown against the baseline as a fraction (default: 0.2).",
+    )
+    return parser.parse_args()
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def table_sql_files(table_dir: Path) -> list[Path]:
+    return [p for p in list_sql_files(table_dir) if sql_stem(p) != "table_schema"]
+
+
+def dir_size(files: list[Path]) -> int:
+    return sum(p.stat().st_size for p in files)
+
+
+def run_check_fk(table_dir: Path) -> None:
+    for _ in check_fks(table_dir):
+        pass
+
+
+# (run, prepare or None, bytes read by one run)
+Benchmark = tuple[Callable[[], None], Callable[[], None] | None, int]
+
+
+def build_benchmarks(work: Path, insert_dump: Path, copy_dump: Path, table_dir: Path) -> dict[str, Benchmark]:
+    """Every benchmark by name, over the synthetic dumps and their table directory."""
+    table_files = table_sql_files(table_dir)
+    tables_bytes = dir_size(table_files)
+    fix_dir = work / "fix"
+
+    def fresh_copy() -> None:
+        shutil.rmtree(fix_dir, ignore_errors=True)
+        shutil.copytree(table_dir, fix_dir)
+
+    def each_file(files: Callable[[], list[Path]], action: Callable[[Path], object]) -> Callable[[], None]:
+        def run() -> None:
+            for path in files():
+                action(path)
+        return run
+
+    def convert_insert() -> None:
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            write_copy_stream(table_files_in_order(table_dir), devnull)
+
+    def order() -> None:
+        dependencies = parse_foreign_keys(table_dir / "table_schema.sql")
+        topological_sort(get_all_tables(table_dir), dependencies)
+        build_plan(table_dir, 4)
+
+    def clean(path: Path) -> Callable[[], None]:
+        return lambda: shutil.rmtree(path, ignore_errors=True)
+
+    benchmarks = {
+        "convert_copy_to_insert": (
+            lambda: convert_copy_to_insert.convert_file(copy_dump, work / "converted.sql", keep_meta=False),
+            None,
+            copy_dump.stat().st_size,
+        ),
+        "convert_insert_to_copy": (convert_insert, None, tables_bytes),
+        "split": (
+            lambda: split_file(insert_dump, work / "split", "table_"),
+            clean(work / "split"),
+            insert_dump.stat().st_size,
+        ),
+        "stream_split": (
+            lambda: stream_split(insert_dump, work / "stream_split"),
+            clean(work / "stream_split"),
+            insert_dump.stat().st_size,
+        ),
+        "validate": (each_file(lambda: table_files, validate_file), None, tables_bytes),
+        "check_fk": (lambda: run_check_fk(table_dir), None, tables_bytes),
+        "order": (order, None, tables_bytes),
+    }
+    for name, fix_file in FIXERS.items():
+        benchmarks[name] = (each_file(lambda: table_sql_files(fix_dir), fix_file), fresh_copy, tables_bytes)
+    return benchmarks
+
+
+def time_benchmark(run: Callable[[], None], prepare: Callable[[], None] | None, repeat: int) -> float:
+    """Best wall time of `repeat` runs; prepare runs untimed before each one. Output is discarded."""
+    best = float("inf")
+    for _ in range(repeat):
+        if prepare is not None:
+            prepare()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+    return best
+
+
+def compare(results: dict[str, dict], baseline: dict, tolerance: float) -> list[str]:
+    """Descriptions of the tools that got slower than the baseline by more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before.get("mb_per_second"):
+            continue
+        ratio = result["mb_per_second"] / before["mb_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append(
+                f"{name}: {result['mb_per_second']:.1f} MB/s vs {before['mb_per_second']:.1f} MB/s "
+                f"({(1 - ratio) * 100:.0f}% slower)"
+            )
+    return regressions
+
+
+def main() -> None:
+    args = parse_args()
+    if not (args.template / "table_schema.sql").exists():
+        print(f"Error: Schema file not found: {args.template / 'table_schema.sql'}")
+        return
+    if args.repeat < 1:
+        print("Error: --repeat must be at least 1")
+        return
+
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="bench_tools_", dir=args.work_dir) as tmp:
+        work = Path(tmp)
+        insert_dump = work / "synthetic.sql"
+        copy_dump = work / "synthetic_copy.sql"
+        print(f"Generating a {args.size / (1 << 20):.0f} MB synthetic dump from '{args.template}'...")
+        for path, copy_format in ((insert_dump, False), (copy_dump, True)):
+            with open_output(path) as fout:
+                generate_dump(fout, args.template, args.size, copy_format=copy_format, seed=args.seed)
+        # Statement-aware split, so multiline values stay whole in the table files
+        table_dir = work / "tables"
+        stream_split(insert_dump, table_dir)
+
+        benchmarks = build_benchmarks(work, insert_dump, copy_dump, table_dir)
+        for name, (run, prepare, size) in benchmarks.items():
+            if args.tool and not any(name.startswith(prefix) for prefix in args.tool):
+                continue
+            seconds = time_benchmark(run, prepare, args.repeat)
+            results[name] = {"seconds": seconds, "bytes": size, "mb_per_second": size / (1 << 20) / seconds}
+            print(f"  {name}: {seconds:.3f}s, {results[name]['mb_per_second']:.1f} MB/s")
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "size": args.size,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"\nWrote {len(results)} results to '{args.output}'")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print(f"\nRegressions against '{args.baseline}':")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"No regressions against '{args.baseline}'")
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
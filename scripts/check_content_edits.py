@@ -1,9 +1,10 @@
 """Check content_edits.sql for JSON issues."""
 import json
-import re
 import sys
 from pathlib import Path
 
+from sql_statements import SQL_LITERAL, iter_insert_spans
+
 # Set UTF-8 encoding for output
 sys.stdout.reconfigure(encoding='utf-8') if hasattr(sys.stdout, 'reconfigure') else None
 
@@ -11,13 +12,12 @@ file_path = Path("scripts/backup_plain_tables/table_content_edits.sql")
 content = file_path.read_text(encoding="utf-8")
 
 # Find all INSERT statements
-inserts = re.findall(r'INSERT INTO[^;]+;', content, re.DOTALL)
+inserts = [content[start:end] for start, end in iter_insert_spans(content)]
 
 for i, ins in enumerate(inserts, 1):
     # Extract all quoted strings
     json_strings = []
-    pattern = r"'((?:[^'\\]|\\.|'')*?)'"
-    for match in re.finditer(pattern, ins, re.DOTALL):
+    for match in SQL_LITERAL.finditer(ins):
         inner = match.group(1).replace("''", "'")
         if inner.strip().startswith(("{", "[")):
             json_strings.append((match.start(), inner))
@@ -0,0 +1,202 @@
+"""
+Round-trip checks for the fixers' --patch mode (dump_patch).
+
+Every fixer is run twice on small inputs that cover the edge cases of the
+patch format: once rewriting the file, once writing a patch that is then
+applied
+  - in place to a plain file (positioned writes and the tail rewrite),
+  - by rewriting a .gz file (iter_patched_lines),
+  - while reading the original file, as load_tables --patch does.
+Each must give the same content as the direct fix. A patch whose last
+file has changed since it was made must be refused before anything is
+written or loaded. Mismatches are listed as FAIL and the script exits with
+status 1.
+"""
+import argparse
+import contextlib
+import io
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+import dump_patch
+import fix_json_complete
+import fix_json_final
+import fix_json_in_sql
+import fix_json_multiline
+import fix_json_multiline_inserts
+import fix_remaining_json_errors
+from dump_io import open_input_binary, write_text
+from sql_statements import iter_file_statements
+
+_HEAD = "INSERT INTO public.t (id, data) VALUES"
+
+# Input name -> file content
+INPUTS: dict[str, str] = {
+    "unchanged": f"{_HEAD} (1, '{{\"a\": 1}}');\n",
+    # fix_json_complete appends the missing newline: a zero-length span at the end of the file
+    "no_trailing_newline": f"{_HEAD} (1, '{{\"a\":  1}}');\n{_HEAD} (2, '{{\"b\":  2}}');",
+    "raw_newlines": f"{_HEAD} (1, '{{\"a\": \"x\ny\"}}');\n{_HEAD} (2, '{{\"a\": \"z\"}}');\n",
+    "stray_quotes": f"{_HEAD} (1, '{{\"a\": \"he said \"hi\" ok\"}}');\n{_HEAD} (2, 'plain');\n",
+    "multiline_insert": f"{_HEAD}\n(1, '{{\"a\":\n 1}}'),\n(2, '[1,  2]');\n",
+    "line_continuations": f"{_HEAD} (1, '{{\"a\": \\\n  \"x\"}}');\n",
+    "longer_then_shorter": f"{_HEAD} (1, '{{\"a\":1}}', '{{\"b\":  [1,   2]}}');\n",
+}
+
+FIXERS: dict[str, Callable[[Path, bool], object]] = {
+    "fix_json_complete": fix_json_complete.fix_file,
+    "fix_json_final": fix_json_final.fix_file,
+    "fix_json_in_sql": fix_json_in_sql.fix_file,
+    "fix_json_multiline": fix_json_multiline.fix_file,
+    "fix_json_multiline_inserts": fix_json_multiline_inserts.fix_file,
+    "fix_remaining_json_errors": fix_remaining_json_errors.fix_file,
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Check that applying a fixer's --patch output gives the same files as a direct fix.",
+    )
+    parser.add_argument(
+        "--fixer",
+        action="append",
+        help="Only check fixers whose name starts with this; repeatable.",
+    )
+    parser.add_argument(
+        "--input",
+        action="append",
+        help="Only check inputs whose name starts with this; repeatable.",
+    )
+    return parser.parse_args()
+
+
+def _read(path: Path) -> bytes:
+    with open_input_binary(path) as fin:
+        return fin.read()
+
+
+def _fix(fix_file: Callable[[Path, bool], object], path: Path, patch_path: Path | None) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        dump_patch.start_patch(argparse.Namespace(patch=patch_path))
+        try:
+            fix_file(path, False)
+        finally:
+            dump_patch.finish_patch(argparse.Namespace(patch=patch_path))
+
+
+def run_check(fixer_name: str, input_name: str, work: Path) -> list[str]:
+    """Names of the apply modes whose result differs from the direct fix."""
+    fix_file = FIXERS[fixer_name]
+    text = INPUTS[input_name]
+    failed = []
+
+    direct = work / "table_direct.sql"
+    write_text(direct, text)
+    _fix(fix_file, direct, None)
+    expected = _read(direct)
+
+    for suffix in (".sql", ".sql.gz"):
+        path = work / f"table_t{suffix}"
+        patch_path = work / "patch.jsonl"
+        write_text(path, text)
+        _fix(fix_file, path, patch_path)
+        patches = list(dump_patch.read_patch(patch_path))
+        mode = "in_place" if suffix == ".sql" else "rewrite"
+
+        try:
+            # Load path first, while the file is still the original
+            dump_patch.use_patch(patch_path)
+            loaded = list(dump_patch.file_statements(path))
+            if patches:
+                patched = b"".join(line.encode("utf-8") for line in dump_patch.iter_patched_lines(path, patches[0]))
+                if patched != expected:
+                    failed.append(f"{mode}/lines")
+            for patch in patches:
+                dump_patch.apply_patch(path, patch)
+        except dump_patch.PatchError as e:
+            failed.append(f"{mode}: {e}")
+            continue
+        if _read(path) != expected:
+            failed.append(mode)
+        if loaded != list(iter_file_statements(direct)):
+            failed.append(f"{mode}/load")
+    dump_patch.use_patch(work / "empty.jsonl")
+    return failed
+
+
+def run_mismatch_check(work: Path) -> list[str]:
+    """Problems with refusing a patch whose last file changed after it was made."""
+    paths = [work / "table_a.sql", work / "table_b.sql"]
+    for path in paths:
+        write_text(path, INPUTS["no_trailing_newline"])
+    patch_path = work / "patch.jsonl"
+    with contextlib.redirect_stdout(io.StringIO()):
+        dump_patch.start_patch(argparse.Namespace(patch=patch_path))
+        for path in paths:
+            fix_json_complete.fix_file(path, False)
+        dump_patch.finish_patch(argparse.Namespace(patch=patch_path))
+    write_text(paths[1], INPUTS["no_trailing_newline"].replace("2", "3"))
+
+    failed = []
+    dump_patch.use_patch(patch_path)
+    try:
+        dump_patch.check_patches(work)
+        failed.append("check_patches accepted it")
+    except dump_patch.PatchError:
+        pass
+    dump_patch.use_patch(work / "empty.jsonl")
+
+    argv = sys.argv
+    sys.argv = ["dump_patch.py", str(patch_path)]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            dump_patch.main()
+    finally:
+        sys.argv = argv
+    if "Error:" not in out.getvalue():
+        failed.append("dump_patch.py applied it")
+    if _read(paths[0]).decode("utf-8") != INPUTS["no_trailing_newline"]:
+        failed.append("dump_patch.py patched the first file")
+    return failed
+
+
+def main() -> None:
+    args = parse_args()
+    fixers = [name for name in FIXERS if not args.fixer or any(name.startswith(p) for p in args.fixer)]
+    inputs = [name for name in INPUTS if not args.input or any(name.startswith(p) for p in args.input)]
+    print(f"Checking {len(fixers)} fixers on {len(inputs)} inputs...")
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        (work / "empty.jsonl").touch()
+        for fixer_name in fixers:
+            for input_name in inputs:
+                failed = run_check(fixer_name, input_name, work)
+                detail = ", ".join(failed) if failed else "patch matches the direct fix"
+                print(f"  {'FAIL' if failed else 'PASS'} {fixer_name} / {input_name}: {detail}")
+                if failed:
+                    failures.append(f"{fixer_name} / {input_name}: {detail}")
+                for path in work.iterdir():
+                    if path.name != "empty.jsonl":
+                        path.unlink() if path.is_file() else shutil.rmtree(path)
+
+        failed = run_mismatch_check(work)
+        detail = ", ".join(failed) if failed else "refused before anything was written"
+        print(f"  {'FAIL' if failed else 'PASS'} changed file: {detail}")
+        if failed:
+            failures.append(f"changed file: {detail}")
+
+    if failures:
+        print(f"\n{len(failures)} checks failed:")
+        for line in failures:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print(f"\nAll {len(fixers) * len(inputs) + 1} checks passed")
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,109 +1,146 @@
-"""Check for foreign key violations in content_versions."""
-import re
+"""Check for foreign key violations in a directory of table files."""
+import argparse
+from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator
 
-cv_file = Path("scripts/backup_plain_tables/table_content_versions.sql")
-ci_file = Path("scripts/backup_plain_tables/table_content_items.sql")
-
-# Extract contentItemIds from content_versions
-cv_content = cv_file.read_text(encoding="utf-8")
-cv_ids = set()
-
-# Parse INSERT statements - contentItemId is the 2nd column (index 1)
-for line in cv_content.splitlines():
-    if 'INSERT INTO' in line and 'content_versions' in line:
-        # Find VALUES clause
-        values_match = re.search(r'VALUES\s*\(', line, re.IGNORECASE)
-        if values_match:
-            values_start = values_match.end()
-            # Extract all values
-            values_str = line[values_start:]
-            # Find closing paren
-            paren_count = 1
-            i = 0
-            while i < len(values_str) and paren_count > 0:
-                if values_str[i] == '(':
-                    paren_count += 1
-                elif values_str[i] == ')':
-                    paren_count -= 1
-                i += 1
-            
-            if paren_count == 0:
-                values_part = values_str[:i-1]
-                # Split by comma, respecting quotes
-                values = []
-                current = []
-                in_quote = False
-                quote_char = None
-                
-                for char in values_part:
-                    if not in_quote:
-                        if char in ("'", '"'):
-                            in_quote = True
-                            quote_char = char
-                            current.append(char)
-                        elif char == ',':
-                            val = ''.join(current).strip()
-                            if val:
-                                values.append(val)
-                            current = []
-                        else:
-                            current.append(char)
-                    else:
-                        current.append(char)
-                        if char == quote_char:
-                            # Check if escaped
-                            if len(current) > 1 and current[-2] == '\\':
-                                continue
-                            # Check for SQL escape ''
-                            if quote_char == "'" and len(current) > 1 and current[-2] == "'":
-                                continue
-                            in_quote = False
-                            quote_char = None
-                
-                if current:
-                    val = ''.join(current).strip()
-                    if val:
-                        values.append(val)
-                
-                # contentItemId is the 2nd value (index 1)
-                if len(values) > 1:
-                    ci_id = values[1].strip("'\"")
-                    cv_ids.add(ci_id)
-
-print(f"ContentItemIds referenced in content_versions: {len(cv_ids)}")
-if cv_ids:
-    print(f"IDs: {sorted(cv_ids)}")
-
-# Extract IDs from content_items (first value in VALUES)
-ci_content = ci_file.read_text(encoding="utf-8")
-ci_ids = set()
-
-for line in ci_content.splitlines():
-    if 'INSERT INTO' in line and 'content_items' in line:
-        values_match = re.search(r'VALUES\s*\(', line, re.IGNORECASE)
-        if values_match:
-            values_start = values_match.end()
-            # Find first UUID value
-            id_match = re.search(r"'([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})'", line[values_start:values_start+100])
-            if id_match:
-                ci_ids.add(id_match.group(1))
-
-print(f"\nContentItemIds in content_items: {len(ci_ids)}")
-
-# Check which CV IDs are missing in CI
-if cv_ids:
-    missing = cv_ids - ci_ids
-    if missing:
-        print(f"\nERROR: Missing contentItemIds in content_items:")
-        for mid in missing:
-            print(f"  - {mid}")
-        print("\nThese IDs are referenced in content_versions but don't exist in content_items!")
-        print("\nSolution: Either:")
-        print("  1. Remove these rows from content_versions, OR")
-        print("  2. Add the missing content_items first")
-    else:
-        print("\nAll contentItemIds exist in content_items.")
-        print("The issue might be with insert order - make sure content_items is inserted before content_versions.")
-else:
-    print("\nCould not extract contentItemIds from content_versions file.")
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_source import table_chunks
+from dump_stats import add_stats_args, finish_stats, start_stats
+from row_selection import ColumnPositions, Key, iter_table_rows
+from schema_model import ForeignKey, parse_schema
+
+
+@dataclass(frozen=True)
+class Violation:
+    """A row whose FK columns reference a parent key that is not in the parent's table file."""
+
+    fk: ForeignKey
+    key: Key  # raw SQL tokens of the FK columns, e.g. ("'50793e3c-...'",)
+    statement: str
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Check that every foreign key in a split backup resolves to a row of its parent table.",
+    )
+    parser.add_argument(
+        "input_dir",
+        type=Path,
+        nargs="?",
+        default=Path("scripts/backup_plain_tables"),
+        help="Directory with table_schema.sql and table_*.sql files (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--table",
+        action="append",
+        help="Only check the FKs declared on this table; repeatable.",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="Missing keys to list per foreign key (default: 20).",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+def present_keys(table_files: dict[str, list[Path]], fks: list[ForeignKey]) -> dict[tuple[str, tuple[str, ...]], set[Key]]:
+    """(parent table, referenced columns) -> keys present in the parent, one pass per parent table."""
+    wanted: dict[str, set[tuple[str, ...]]] = defaultdict(set)
+    for fk in fks:
+        wanted[fk.ref_table].add(fk.ref_columns)
+
+    positions = ColumnPositions()
+    present: dict[tuple[str, tuple[str, ...]], set[Key]] = {}
+    for table, column_lists in wanted.items():
+        keys = {columns: present.setdefault((table, columns), set()) for columns in column_lists}
+        for table_file in table_files[table]:
+            for columns, values, _ in iter_table_rows(table_file):
+                for ref_columns, found in keys.items():
+                    key = positions.values(columns, values, ref_columns)
+                    if key is not None:
+                        found.add(key)
+    return present
+
+
+def check_fks(table_dir: Path | str, tables: list[str] | None = None) -> Iterator[Violation]:
+    """
+    Yield every row of table_dir whose foreign key has no matching parent row.
+
+    Tables split into chunks are read chunk by chunk. Only the parents' keys
+    are held in memory; child rows are streamed. FKs
+    with a NULL column are not checked, and FKs whose parent has no table
+    file are skipped, as the parent rows may already be in the database.
+    """
+    table_dir = Path(table_dir)
+    model = parse_schema(table_dir / "table_schema.sql")
+    table_files = table_chunks(table_dir)
+    fks = [
+        fk for fk in model.foreign_keys
+        if fk.table in table_files and fk.ref_table in table_files and (tables is None or fk.table in tables)
+    ]
+    present = present_keys(table_files, fks)
+
+    child_fks: dict[str, list[ForeignKey]] = defaultdict(list)
+    for fk in fks:
+        child_fks[fk.table].append(fk)
+
+    positions = ColumnPositions()
+    for table, table_fks in child_fks.items():
+        for table_file in table_files[table]:
+            for columns, values, statement in iter_table_rows(table_file):
+                for fk in table_fks:
+                    key = positions.values(columns, values, fk.columns)
+                    if key is not None and key not in present[(fk.ref_table, fk.ref_columns)]:
+                        yield Violation(fk, key, statement)
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "check_fk_violations")
+    start_profile(args, "check_fk_violations")
+    input_dir: Path = args.input_dir
+
+    if not (input_dir / "table_schema.sql").exists():
+        print(f"Error: Schema file not found: {input_dir / 'table_schema.sql'}")
+        return
+
+    print(f"Checking foreign keys in {input_dir}...")
+    missing: dict[ForeignKey, set[Key]] = defaultdict(set)
+    rows: dict[ForeignKey, int] = defaultdict(int)
+    for violation in check_fks(input_dir, args.table):
+        missing[violation.fk].add(violation.key)
+        rows[violation.fk] += 1
+
+    if not missing:
+        print("\nAll foreign keys resolve to rows of their parent tables.")
+        print("If the load still fails, check the insert order: parents must be inserted before children.")
+        finish_profile(args, "check_fk_violations")
+        finish_stats(args)
+        print("Done!")
+        return
+
+    for fk, keys in missing.items():
+        columns = ", ".join(fk.columns)
+        ref_columns = ", ".join(fk.ref_columns)
+        print(f"\nERROR: {fk.table} ({columns}) -> {fk.ref_table} ({ref_columns}): "
+              f"{rows[fk]} rows reference {len(keys)} missing keys")
+        for key in sorted(keys)[:args.limit]:
+            print(f"  - {', '.join(key)}")
+        if len(keys) > args.limit:
+            print(f"  ... and {len(keys) - args.limit} more")
+
+    print("\nSolution: Either:")
+    print("  1. Remove these rows from the child tables, OR")
+    print("  2. Add the missing parent rows first")
+    finish_profile(args, "check_fk_violations")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Worst-case input checks for the SQL and JSON parsers.
+
+Every parser (validate_json_in_sql, the fix_json_* fixers, the statement
+splitters and converters, and the shared literal/statement scanners in
+sql_statements) is run on pathological inputs: long runs of backslashes,
+doubled quotes, semicolons inside literals, unterminated quotes and INSERTs,
+and so on. Each input is timed at --size characters and at --growth times
+that, and the larger run must finish within a budget that grows linearly
+from the smaller one:
+
+  t(growth * size) <= t(size) * growth * --slack + --floor
+
+A parser that grows super-linearly (a backtracking regex, a rescan per line)
+misses the budget or hits --timeout, is listed as FAIL, and the script exits
+with status 1.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import convert_copy_to_insert
+import fix_json_complete
+import fix_json_final
+import fix_json_in_sql
+import fix_json_multiline
+import fix_json_multiline_inserts
+import fix_remaining_json_errors
+from convert_insert_to_copy import write_copy_stream
+from dump_source import stream_split
+from split_by_table import parse_size, split_file
+from sql_statements import (
+    SQL_LITERAL,
+    iter_file_statements,
+    iter_insert_spans,
+    parse_insert_head,
+    split_values,
+)
+from validate_json_in_sql import validate_bytes, validate_file
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Check that the SQL/JSON parsers stay linear on worst-case inputs.",
+    )
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=parse_size("100K"),
+        help="Characters in the smaller input, e.g. 100K (default: 100K).",
+    )
+    parser.add_argument(
+        "--growth",
+        type=int,
+        default=8,
+        help="The larger input is this many times the smaller one (default: 8).",
+    )
+    parser.add_argument(
+        "--slack",
+        type=float,
+        default=4.0,
+        help="Allowed factor over exactly linear growth; keep it below --growth so quadratic growth still fails (default: 4).",
+    )
+    parser.add_argument(
+        "--floor",
+        type=float,
+        default=0.02,
+        help="Seconds added to every budget to absorb timer noise (default: 0.02).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=30.0,
+        help="Seconds before a single check is killed and failed (default: 30).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per input size; the fastest is used (default: 3).",
+    )
+    parser.add_argument(
+        "--parser",
+        action="append",
+        help="Only check parsers whose name starts with this; repeatable (default: all).",
+    )
+    parser.add_argument(
+        "--input",
+        action="append",
+        help="Only use inputs whose name starts with this; repeatable (default: all).",
+    )
+    return parser.parse_args()
+
+
+def _insert(payload: str) -> str:
+    return f"INSERT INTO public.t (id, data) VALUES (1, '{payload}');\n"
+
+
+def _json_insert(payload: str) -> str:
+    return _insert('{"a": "' + payload + '"}')
+
+
+def _many_rows(n: int) -> str:
+    row = _json_insert("it''s; a \\\"quoted\\\" value")
+    return row * max(1, n // len(row))
+
+
+def _copy_block(n: int) -> str:
+    row = "1\t" + "\\\\" * 8 + "\\N\t{\"a\": \"x\\\\\"}\n"
+    return "COPY public.t (id, data) FROM stdin;\n" + row * max(1, n // len(row)) + "\\.\n"
+
+
+# Input name -> text of about n characters
+INPUTS: dict[str, Callable[[int], str]] = {
+    "backslashes": lambda n: _json_insert("\\" * n),
+    "backslash_quote_pairs": lambda n: _insert("\\'" * (n // 2)),
+    "unterminated_backslash_quotes": lambda n: "INSERT INTO public.t (id, data) VALUES (1, " + "'\\" * (n // 2),
+    "doubled_quotes": lambda n: _json_insert("''" * (n // 2)),
+    "quote_run": lambda n: "INSERT INTO public.t (data) VALUES (" + "'" * n,
+    "semicolons": lambda n: _json_insert(";" * n),
+    "escaped_json_quotes": lambda n: _json_insert('\\\\\\"' * (n // 4)),
+    "newlines": lambda n: _json_insert("x\n" * (n // 2)),
+    "open_parens": lambda n: "INSERT INTO public.t (data) VALUES (" + "(" * n + ";\n",
+    "unterminated_inserts": lambda n: "INSERT INTO public.t VALUES (\n" * (n // 30),
+    "line_continuations": lambda n: "\\ \n" * (n // 3),
+    "trailing_spaces": lambda n: "INSERT INTO public.t VALUES ('\\" + " " * n + "x');\n",
+    "many_rows": _many_rows,
+    "copy_block": _copy_block,
+}
+
+
+def _fixer(fix_file: Callable[[Path, bool], object]) -> Callable[[Path], Callable[[], object]]:
+    def setup(path: Path) -> Callable[[], object]:
+        target = path.with_name("fix_" + path.name)
+        shutil.copyfile(path, target)
+        return lambda: fix_file(target, False)
+    return setup
+
+
+def _in_memory(run: Callable[[str], object]) -> Callable[[Path], Callable[[], object]]:
+    def setup(path: Path) -> Callable[[], object]:
+        text = path.read_text(encoding="utf-8")
+        return lambda: run(text)
+    return setup
+
+
+def _validate_mapped(path: Path) -> Callable[[], object]:
+    data = path.read_bytes()
+    return lambda: validate_bytes(data)
+
+
+def _split_rows(path: Path) -> None:
+    for statement in iter_file_statements(path):
+        head = parse_insert_head(statement)
+        if head is not None:
+            split_values(statement, head[2])
+
+
+def _to_copy(path: Path) -> None:
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        write_copy_stream([path], devnull)
+
+
+def _fresh_dir(path: Path, run: Callable[[Path], object]) -> Callable[[], object]:
+    out = path.with_name(path.name + ".out")
+    shutil.rmtree(out, ignore_errors=True)
+    return lambda: run(out)
+
+
+# Parser name -> setup(input file) returning the call to time
+PARSERS: dict[str, Callable[[Path], Callable[[], object]]] = {
+    "SQL_LITERAL": _in_memory(lambda text: sum(1 for _ in SQL_LITERAL.finditer(text))),
+    "iter_insert_spans": _in_memory(lambda text: sum(1 for _ in iter_insert_spans(text))),
+    "validate_bytes": _validate_mapped,
+    "validate_file": lambda path: lambda: validate_file(path),
+    "iter_statements": lambda path: lambda: sum(1 for _ in iter_file_statements(path)),
+    "split_values": lambda path: lambda: _split_rows(path),
+    "convert_insert_to_copy": lambda path: lambda: _to_copy(path),
+    "convert_copy_to_insert": lambda path: _fresh_dir(
+        path, lambda out: convert_copy_to_insert.convert_file(path, out, keep_meta=False)
+    ),
+    "split_file": lambda path: _fresh_dir(path, lambda out: split_file(path, out, "table_")),
+    "stream_split": lambda path: _fresh_dir(path, lambda out: stream_split(path, out)),
+    "fix_json_complete": _fixer(fix_json_complete.fix_file),
+    "fix_json_final": _fixer(fix_json_final.fix_file),
+    "fix_json_in_sql": _fixer(fix_json_in_sql.fix_file),
+    "fix_json_multiline": _fixer(fix_json_multiline.fix_file),
+    "fix_json_multiline_inserts": _fixer(fix_json_multiline_inserts.fix_file),
+    "fix_remaining_json_errors": _fixer(fix_remaining_json_errors.fix_file),
+}
+
+
+def time_parser(parser_name: str, input_name: str, size: int, repeat: int, work: Path) -> float:
+    """Best wall time of the parser on the input at `size` characters. Errors from the parser count as finished."""
+    path = work / f"{input_name}_{size}.sql"
+    path.write_text(INPUTS[input_name](size), encoding="utf-8")
+    best = float("inf")
+    for _ in range(repeat):
+        run = PARSERS[parser_name](path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            try:
+                run()
+            except (ValueError, UnicodeError):
+                pass
+            best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _check_worker(parser_name: str, input_name: str, sizes: list[int], repeat: int, results) -> None:
+    with tempfile.TemporaryDirectory(prefix="worst_case_") as tmp:
+        for size in sizes:
+            results.put(time_parser(parser_name, input_name, size, repeat, Path(tmp)))
+
+
+def run_check(parser_name: str, input_name: str, args: argparse.Namespace) -> tuple[bool, str]:
+    """Time one parser on one input at both sizes in a child process. Returns (passed, detail)."""
+    sizes = [args.size, args.size * args.growth]
+    results = multiprocessing.Queue()
+    worker = multiprocessing.Process(
+        target=_check_worker,
+        args=(parser_name, input_name, sizes, args.repeat, results),
+        daemon=True,
+    )
+    worker.start()
+    worker.join(args.timeout)
+    if worker.is_alive():
+        worker.terminate()
+        worker.join()
+        return False, f"timed out after {args.timeout:g}s"
+    if worker.exitcode != 0:
+        return False, f"crashed with exit code {worker.exitcode}"
+
+    small, large = results.get(), results.get()
+    budget = small * args.growth * args.slack + args.floor
+    detail = f"{small * 1000:.1f} ms -> {large * 1000:.1f} ms (budget {budget * 1000:.1f} ms)"
+    return large <= budget, detail
+
+
+def main() -> None:
+    args = parse_args()
+    if args.growth < 2:
+        print("Error: --growth must be at least 2")
+        return
+    if args.repeat < 1:
+        print("Error: --repeat must be at least 1")
+        return
+
+    parsers = [name for name in PARSERS if not args.parser or any(name.startswith(p) for p in args.parser)]
+    inputs = [name for name in INPUTS if not args.input or any(name.startswith(p) for p in args.input)]
+    print(
+        f"Checking {len(parsers)} parsers on {len(inputs)} inputs "
+        f"({args.size:,} -> {args.size * args.growth:,} characters)..."
+    )
+
+    failures = []
+    for parser_name in parsers:
+        for input_name in inputs:
+            passed, detail = run_check(parser_name, input_name, args)
+            print(f"  {'PASS' if passed else 'FAIL'} {parser_name} / {input_name}: {detail}")
+            if not passed:
+                failures.append(f"{parser_name} / {input_name}: {detail}")
+
+    if failures:
+        print(f"\n{len(failures)} checks grew super-linearly:")
+        for line in failures:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print(f"\nAll {len(parsers) * len(inputs)} checks stayed within their linear budget")
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
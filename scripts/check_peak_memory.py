@@ -0,0 +1,378 @@
+"""
+Peak-memory checks for the dump tools on synthetic dumps of increasing size.
+
+Seeded synthetic dumps (generate_synthetic_dump.py) of --size, 2x, 4x, ...
+(--steps sizes) are generated once, in INSERT, gzip'd INSERT and COPY form,
+and split into table directories. Every tool then runs on each size in a
+fresh child process under tracemalloc; the peak of Python allocations and
+the growth of the process RSS are recorded.
+
+Tools are either streaming or in-memory:
+
+  streaming   converters, splitters, validate, load, order. Their peak may
+              only grow by --max-slope bytes per extra input byte between the
+              two largest sizes, or the tool fails. The smaller sizes only
+              fill fixed buffers (the read-ahead queue, a load batch).
+  in-memory   the fix_json_* fixers (whole-file rewrites) and check_fk (keeps
+              every parent key). Their growth is reported, not failed.
+
+The assertion uses the tracemalloc peak: RSS also counts the page cache of
+memory-mapped inputs (split, validate), which the kernel reclaims freely.
+
+One JSON report per tool goes to --report-dir. With --baseline (an earlier
+report directory), a tool whose peak at any shared size grew by more than
+--tolerance is listed as a regression, and the script exits with status 1,
+so it can block a merge.
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import convert_copy_to_insert
+from bench_tools import FIXERS, git_commit, run_check_fk, table_sql_files
+from convert_insert_to_copy import table_files_in_order, write_copy_stream
+from dump_io import open_output
+from dump_source import stream_split
+from generate_insert_order import get_all_tables, parse_foreign_keys, topological_sort
+from generate_synthetic_dump import generate_dump
+from load_tables import load_directory
+from plan_load import build_plan
+from split_by_table import parse_size, split_file
+from validate_json_in_sql import validate_file
+
+
+# Headroom over the noise of a single run before a baseline peak counts as grown
+_BASELINE_FLOOR = 256 << 10
+
+# Statements per load batch: small, so the batch buffer is full at every size
+_LOAD_BATCH = 20
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Check that streaming dump tools keep a bounded peak memory as inputs grow.",
+    )
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=parse_size("4M"),
+        help="Size of the smallest synthetic dump, e.g. 4M (default: 4M).",
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=3,
+        help="Number of sizes, each twice the previous one (default: 3).",
+    )
+    parser.add_argument(
+        "--template",
+        type=Path,
+        default=Path("scripts/backup_plain_tables"),
+        help="Real table directory the synthetic dumps are modelled on (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--tool",
+        action="append",
+        help="Only check tools whose name starts with this; repeatable (default: all).",
+    )
+    parser.add_argument(
+        "--max-slope",
+        type=float,
+        default=0.1,
+        help="Bytes a streaming tool's peak may grow per extra input byte (default: 0.1).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for the synthetic dumps (default: 0).",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory for the synthetic dumps and outputs (default: system temp dir).",
+    )
+    parser.add_argument(
+        "--report-dir",
+        type=Path,
+        default=Path("memory_reports"),
+        help="Directory for the per-tool JSON reports (default: memory_reports).",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="Earlier report directory to compare against; exit with status 1 on a regression.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed growth of a peak against the baseline as a fraction (default: 0.25).",
+    )
+    return parser.parse_args()
+
+
+@dataclass
+class Inputs:
+    """The synthetic inputs of one size."""
+    size: int
+    insert_dump: Path
+    gzip_dump: Path
+    copy_dump: Path
+    table_dir: Path
+
+    @property
+    def tables_bytes(self) -> int:
+        return sum(p.stat().st_size for p in table_sql_files(self.table_dir))
+
+
+def make_inputs(work: Path, template: Path, size: int, seed: int) -> Inputs:
+    """Generate the dumps of one size and split them into a table directory."""
+    base = work / f"size_{size}"
+    base.mkdir(parents=True, exist_ok=True)
+    inputs = Inputs(size, base / "dump.sql", base / "dump.sql.gz", base / "dump_copy.sql", base / "tables")
+    for path, copy_format in ((inputs.insert_dump, False), (inputs.copy_dump, True)):
+        with open_output(path) as fout:
+            generate_dump(fout, template, size, copy_format=copy_format, seed=seed)
+    with inputs.insert_dump.open("rb") as fin, gzip.open(inputs.gzip_dump, "wb", compresslevel=1) as fout:
+        shutil.copyfileobj(fin, fout, 1 << 20)
+    stream_split(inputs.insert_dump, inputs.table_dir)
+    return inputs
+
+
+# A tool: setup(inputs, scratch dir) returning the call to measure
+Setup = Callable[[Inputs, Path], Callable[[], object]]
+
+
+def _each_file(files: Callable[[Inputs], list[Path]], action: Callable[[Path], object]) -> Setup:
+    def setup(inputs: Inputs, scratch: Path) -> Callable[[], object]:
+        return lambda: [action(path) for path in files(inputs)]
+    return setup
+
+
+def _fixer(fix_file: Callable[[Path], object]) -> Setup:
+    def setup(inputs: Inputs, scratch: Path) -> Callable[[], object]:
+        target = scratch / "fix"
+        shutil.copytree(inputs.table_dir, target)
+        return lambda: [fix_file(path) for path in table_sql_files(target)]
+    return setup
+
+
+def _convert_insert(inputs: Inputs, scratch: Path) -> Callable[[], object]:
+    def run() -> None:
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            write_copy_stream(table_files_in_order(inputs.table_dir), devnull)
+    return run
+
+
+def _order(inputs: Inputs, scratch: Path) -> Callable[[], object]:
+    def run() -> None:
+        dependencies = parse_foreign_keys(inputs.table_dir / "table_schema.sql")
+        topological_sort(get_all_tables(inputs.table_dir), dependencies)
+        build_plan(inputs.table_dir, 4)
+    return run
+
+
+# Tool name -> (mode, setup, input bytes of one run)
+TOOLS: dict[str, tuple[str, Setup, Callable[[Inputs], int]]] = {
+    "convert_copy_to_insert": (
+        "streaming",
+        lambda inputs, scratch: lambda: convert_copy_to_insert.convert_file(
+            inputs.copy_dump, scratch / "converted.sql", keep_meta=False
+        ),
+        lambda inputs: inputs.copy_dump.stat().st_size,
+    ),
+    "convert_insert_to_copy": ("streaming", _convert_insert, lambda inputs: inputs.tables_bytes),
+    "split": (
+        "streaming",
+        lambda inputs, scratch: lambda: split_file(inputs.insert_dump, scratch / "split", "table_"),
+        lambda inputs: inputs.insert_dump.stat().st_size,
+    ),
+    "split_gzip": (
+        "streaming",
+        lambda inputs, scratch: lambda: split_file(inputs.gzip_dump, scratch / "split", "table_"),
+        lambda inputs: inputs.insert_dump.stat().st_size,
+    ),
+    "stream_split": (
+        "streaming",
+        lambda inputs, scratch: lambda: stream_split(inputs.insert_dump, scratch / "split"),
+        lambda inputs: inputs.insert_dump.stat().st_size,
+    ),
+    "validate": (
+        "streaming",
+        _each_file(lambda inputs: table_sql_files(inputs.table_dir), validate_file),
+        lambda inputs: inputs.tables_bytes,
+    ),
+    "load": (
+        "streaming",
+        lambda inputs, scratch: lambda: load_directory(inputs.table_dir, lambda statements: (0, None), _LOAD_BATCH),
+        lambda inputs: inputs.tables_bytes,
+    ),
+    "order": ("streaming", _order, lambda inputs: inputs.tables_bytes),
+    "check_fk": (
+        "in-memory",
+        lambda inputs, scratch: lambda: run_check_fk(inputs.table_dir),
+        lambda inputs: inputs.tables_bytes,
+    ),
+}
+for _name, _fix_file in FIXERS.items():
+    TOOLS[_name] = ("in-memory", _fixer(_fix_file), lambda inputs: inputs.tables_bytes)
+
+
+def _rss() -> int | None:
+    """Resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fin:
+            return int(fin.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _measure_worker(tool: str, inputs: Inputs, results) -> None:
+    with tempfile.TemporaryDirectory(prefix="peak_memory_") as tmp:
+        run = TOOLS[tool][1](inputs, Path(tmp))
+
+        # Sample the RSS on a thread while the tool runs
+        rss_start = _rss()
+        rss_peak = rss_start
+        done = threading.Event()
+
+        def sample() -> None:
+            nonlocal rss_peak
+            while not done.wait(0.01):
+                rss = _rss()
+                if rss is not None and rss_peak is not None:
+                    rss_peak = max(rss_peak, rss)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run()
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            done.set()
+            sampler.join()
+        seconds = time.perf_counter() - started
+        rss_growth = None if rss_start is None else rss_peak - rss_start
+        results.put({"peak_bytes": peak, "rss_growth_bytes": rss_growth, "seconds": seconds})
+
+
+def measure(tool: str, inputs: Inputs) -> dict:
+    """Run one tool on one input size in a child process and return its memory figures."""
+    results = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=_measure_worker, args=(tool, inputs, results), daemon=True)
+    worker.start()
+    result = results.get()
+    worker.join()
+    return result
+
+
+def slope(input_bytes: list[int], peaks: list[int]) -> float:
+    """Peak bytes gained per extra input byte between the two largest inputs."""
+    if input_bytes[-1] == input_bytes[-2]:
+        return 0.0
+    return (peaks[-1] - peaks[-2]) / (input_bytes[-1] - input_bytes[-2])
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Descriptions of the sizes at which a tool's peak grew past the baseline."""
+    before = {run["size"]: run["peak_bytes"] for run in baseline.get("runs", [])}
+    regressions = []
+    for run in report["runs"]:
+        old = before.get(run["size"])
+        if old is not None and run["peak_bytes"] > old * (1 + tolerance) + _BASELINE_FLOOR:
+            regressions.append(
+                f"{report['tool']} at {run['size'] / (1 << 20):.0f} MB: "
+                f"{run['peak_bytes'] / (1 << 20):.1f} MB peak vs {old / (1 << 20):.1f} MB"
+            )
+    return regressions
+
+
+def main() -> None:
+    args = parse_args()
+    if not (args.template / "table_schema.sql").exists():
+        print(f"Error: Schema file not found: {args.template / 'table_schema.sql'}")
+        return
+    if args.steps < 2:
+        print("Error: --steps must be at least 2")
+        return
+
+    tools = [name for name in TOOLS if not args.tool or any(name.startswith(prefix) for prefix in args.tool)]
+    sizes = [args.size << step for step in range(args.steps)]
+    args.report_dir.mkdir(parents=True, exist_ok=True)
+    failures: list[str] = []
+    regressions: list[str] = []
+
+    with tempfile.TemporaryDirectory(prefix="peak_memory_", dir=args.work_dir) as tmp:
+        work = Path(tmp)
+        print(f"Generating synthetic dumps of {', '.join(f'{s / (1 << 20):.0f} MB' for s in sizes)}...")
+        all_inputs = [make_inputs(work, args.template, size, args.seed) for size in sizes]
+
+        for tool in tools:
+            mode, _, input_size = TOOLS[tool]
+            runs = []
+            for inputs in all_inputs:
+                runs.append({"size": inputs.size, "input_bytes": input_size(inputs), **measure(tool, inputs)})
+            growth = slope([run["input_bytes"] for run in runs], [run["peak_bytes"] for run in runs])
+            passed = mode != "streaming" or growth <= args.max_slope
+
+            report = {
+                "tool": tool,
+                "mode": mode,
+                "generated_at": datetime.now().isoformat(),
+                "commit": git_commit(),
+                "seed": args.seed,
+                "bytes_per_input_byte": growth,
+                "max_slope": args.max_slope if mode == "streaming" else None,
+                "passed": passed,
+                "runs": runs,
+            }
+            (args.report_dir / f"{tool}.json").write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+            peaks = " -> ".join(f"{run['peak_bytes'] / (1 << 20):.1f}" for run in runs)
+            verdict = "PASS" if passed else "FAIL"
+            if mode != "streaming":
+                verdict = "INFO"
+            print(f"  {verdict} {tool} ({mode}): peak {peaks} MB, {growth:.3f} bytes per input byte")
+            if not passed:
+                failures.append(f"{tool}: {growth:.3f} bytes per input byte (limit {args.max_slope:g})")
+
+            if args.baseline:
+                baseline_file = args.baseline / f"{tool}.json"
+                if baseline_file.exists():
+                    baseline = json.loads(baseline_file.read_text(encoding="utf-8"))
+                    regressions.extend(compare(report, baseline, args.tolerance))
+
+    print(f"\nWrote {len(tools)} reports to '{args.report_dir}'")
+    if failures:
+        print("\nStreaming tools whose peak grew with the input:")
+        for line in failures:
+            print(f"  {line}")
+    if regressions:
+        print(f"\nRegressions against '{args.baseline}':")
+        for line in regressions:
+            print(f"  {line}")
+    if failures or regressions:
+        raise SystemExit(1)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""
+Checks for pg_archive against the archives in fixtures/pg_archive.
+
+The fixtures cover archive versions 1.10 through 1.16 in custom format
+(seekable, with data offsets, and as written to a pipe, without) and
+directory format, uncompressed and gzip, plus archives that must be
+rejected. For each one the TOC (dump IDs, descs, tags, sections) and the
+plain SQL that pg_archive streams are compared with the expectations in
+manifest.json and expected.sql; custom-format archives are also read through
+a non-seekable stream, and every fixture is split with split_by_table and
+its per-table INSERT rows compared with the fixture data. Mismatches are listed as FAIL and the script exits
+with status 1.
+
+The fixtures are small hand-built archives that follow pg_dump's layout
+(WriteHead/WriteToc in pg_backup_archiver.c, the custom and directory
+formats' data blocks and files); --write-fixtures rebuilds them.
+"""
+import argparse
+import gzip
+import contextlib
+import io
+import json
+import tempfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO
+
+from convert_copy_to_insert import iter_insert_lines
+from pg_archive import (
+    FORMAT_CUSTOM,
+    FORMAT_DIRECTORY,
+    SECTION_DATA,
+    SECTION_NONE,
+    SECTION_POST_DATA,
+    SECTION_PRE_DATA,
+    ArchiveError,
+    _strip_terminator,
+    is_directory_archive,
+    iter_directory_plain_sql,
+    iter_plain_sql,
+    read_archive,
+    read_directory_archive,
+)
+from split_by_table import split_directory_archive, split_file
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "pg_archive"
+
+# Versions of pg_dump that wrote each archive version, for the header
+_DUMP_VERSIONS = {
+    (1, 10): "8.3.23",
+    (1, 11): "8.4.22",
+    (1, 12): "9.6.24",
+    (1, 13): "11.22",
+    (1, 14): "14.13",
+    (1, 15): "16.4",
+    (1, 16): "17.0",
+}
+
+_USERS_DATA = (
+    b"1\tAn Nguy\xe1\xbb\x85n\t{\"tags\": [\"a\\\\tb\"], \"note\": \"it's\"}\n"
+    b"2\tB\\\\C\t\\N\n"
+    b"3\ttab\\there\t{}\n"
+)
+# The last row's last field ends in an escaped backslash and '.', like a terminator line
+_POSTS_DATA = b"10\t1\tHello\n11\t3\tmulti\\nline\n12\t2\tC:\\\\dir\\\\.\n"
+
+# (dump_id, desc, tag, defn, copy_stmt, data, dependencies)
+_ENTRIES = [
+    (201, "TABLE", "users", "CREATE TABLE public.users (\n    id integer NOT NULL,\n    name text,\n    profile jsonb\n);\n",
+     "", None, []),
+    (202, "TABLE", "posts", "CREATE TABLE public.posts (\n    id integer NOT NULL,\n    user_id integer,\n    body text\n);\n",
+     "", None, []),
+    (203, "COMMENT", "TABLE users", "COMMENT ON TABLE public.users IS 'app users';\n", "", None, [201]),
+    (3001, "TABLE DATA", "users", "", "COPY public.users (id, name, profile) FROM stdin;\n", _USERS_DATA, [201]),
+    (3002, "TABLE DATA", "posts", "", "COPY public.posts (id, user_id, body) FROM stdin;\n", _POSTS_DATA, [202]),
+    (3101, "CONSTRAINT", "users users_pkey", "ALTER TABLE ONLY public.users\n    ADD CONSTRAINT users_pkey PRIMARY KEY (id);\n",
+     "", None, [201]),
+    (3102, "FK CONSTRAINT", "posts posts_user_id_fkey",
+     "ALTER TABLE ONLY public.posts\n    ADD CONSTRAINT posts_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id);\n",
+     "", None, [202, 3101]),
+]
+
+_SECTIONS = {
+    "COMMENT": SECTION_NONE,
+    "TABLE DATA": SECTION_DATA,
+    "BLOBS": SECTION_DATA,
+    "CONSTRAINT": SECTION_POST_DATA,
+    "FK CONSTRAINT": SECTION_POST_DATA,
+}
+
+# name -> (version, format, gzip, variant)
+#   variant: "seek" (data offsets set), "pipe" (no offsets), "blobs" (pipe, with a large-object block),
+#   "terminator" (data stored with its \. line), "missing_block" (a data block is not in the file)
+FIXTURES: dict[str, tuple[tuple[int, int], int, bool, str]] = {
+    "v1_10_custom_gzip": ((1, 10), FORMAT_CUSTOM, True, "terminator"),
+    "v1_11_custom_pipe": ((1, 11), FORMAT_CUSTOM, False, "pipe"),
+    "v1_12_custom_gzip": ((1, 12), FORMAT_CUSTOM, True, "seek"),
+    "v1_12_directory_gzip": ((1, 12), FORMAT_DIRECTORY, True, "seek"),
+    "v1_13_custom_blobs": ((1, 13), FORMAT_CUSTOM, False, "blobs"),
+    "v1_14_custom": ((1, 14), FORMAT_CUSTOM, False, "seek"),
+    "v1_14_directory": ((1, 14), FORMAT_DIRECTORY, False, "seek"),
+    "v1_15_custom_gzip_pipe": ((1, 15), FORMAT_CUSTOM, True, "pipe"),
+    "v1_16_custom_gzip": ((1, 16), FORMAT_CUSTOM, True, "seek"),
+    "v1_16_directory_gzip": ((1, 16), FORMAT_DIRECTORY, True, "seek"),
+    "v1_16_custom_missing_block": ((1, 16), FORMAT_CUSTOM, False, "missing_block"),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Check pg_archive against the committed pg_dump archive fixtures.",
+    )
+    parser.add_argument(
+        "--write-fixtures",
+        action="store_true",
+        help=f"Rebuild the fixtures in {FIXTURE_DIR} instead of checking them.",
+    )
+    return parser.parse_args()
+
+
+class _Writer:
+    """WriteByte/WriteInt/WriteStr/WriteOffset of pg_backup_archiver.c, with 4-byte ints and 8-byte offsets."""
+
+    def __init__(self) -> None:
+        self.buf = bytearray()
+
+    def byte(self, value: int) -> None:
+        self.buf.append(value)
+
+    def int(self, value: int) -> None:
+        self.byte(1 if value < 0 else 0)
+        self.buf += abs(value).to_bytes(4, "little")
+
+    def str(self, value: str | None) -> None:
+        if value is None:
+            self.int(-1)
+            return
+        data = value.encode("utf-8")
+        self.int(len(data))
+        self.buf += data
+
+    def offset(self, state: int, value: int) -> None:
+        self.byte(state)
+        self.buf += value.to_bytes(8, "little")
+
+
+def _section(desc: str) -> int:
+    return _SECTIONS.get(desc, SECTION_PRE_DATA)
+
+
+def _entries(variant: str) -> list[tuple]:
+    entries = list(_ENTRIES)
+    if variant == "blobs":
+        entries.insert(5, (3003, "BLOBS", "BLOBS", "", "", b"", []))
+    return entries
+
+
+def _has_data(entry: tuple) -> bool:
+    return entry[5] is not None
+
+
+def _stored_data(data: bytes, variant: str) -> bytes:
+    return data + b"\\.\n" if variant == "terminator" else data
+
+
+def _header(w: _Writer, version: tuple[int, int], archive_format: int, compressed: bool) -> None:
+    w.buf += b"PGDMP"
+    for part in (*version, 0):
+        w.byte(part)
+    w.byte(4)
+    w.byte(8)
+    w.byte(archive_format)
+    if version >= (1, 15):
+        w.byte(1 if compressed else 0)
+    else:
+        w.int(-1 if compressed else 0)  # Z_DEFAULT_COMPRESSION
+    for value in (12, 30, 4, 19, 9, 126, 0):  # struct tm
+        w.int(value)
+    w.str("edtech")
+    w.str(_DUMP_VERSIONS[version])
+    w.str(_DUMP_VERSIONS[version])
+
+
+def _toc(w: _Writer, version: tuple[int, int], archive_format: int, entries: list[tuple], extra: dict[int, tuple]) -> None:
+    w.int(len(entries))
+    for dump_id, desc, tag, defn, copy_stmt, data, dependencies in entries:
+        w.int(dump_id)
+        w.int(1 if data is not None else 0)
+        w.str("1259")
+        w.str(str(16384 + dump_id))
+        w.str(tag)
+        w.str(desc)
+        if version >= (1, 11):
+            w.int(_section(desc))
+        w.str(defn)
+        w.str("")
+        w.str(copy_stmt)
+        w.str("public")
+        w.str(None if desc == "COMMENT" else "")
+        if version >= (1, 14):
+            w.str("heap" if desc == "TABLE" else None)
+        if version >= (1, 16):
+            w.int(ord("r") if desc in ("TABLE", "TABLE DATA") else 0)
+        w.str("postgres")
+        w.str("false")
+        for dep in dependencies:
+            w.str(str(dep))
+        w.str(None)
+        if archive_format == FORMAT_CUSTOM:
+            w.offset(*extra[dump_id])
+        else:
+            w.str(extra[dump_id])
+
+
+def _data_block(dump_id: int, data: bytes, compressed: bool, block_type: int = 1) -> bytes:
+    w = _Writer()
+    w.byte(block_type)
+    w.int(dump_id)
+    payload = zlib.compress(data) if compressed else data
+    # Several chunks, as pg_dump flushes its buffer
+    for start in range(0, len(payload), 40):
+        chunk = payload[start:start + 40]
+        w.int(len(chunk))
+        w.buf += chunk
+    w.int(0)
+    return bytes(w.buf)
+
+
+def _blobs_block(dump_id: int, compressed: bool) -> bytes:
+    w = _Writer()
+    w.byte(3)
+    w.int(dump_id)
+    for oid, data in ((16500, b"\x89PNG fake image"), (16501, b"")):
+        w.int(oid)
+        payload = zlib.compress(data) if compressed else data
+        if payload:
+            w.int(len(payload))
+            w.buf += payload
+        w.int(0)
+    w.int(0)
+    return bytes(w.buf)
+
+
+def build_custom(version: tuple[int, int], compressed: bool, variant: str) -> bytes:
+    entries = _entries(variant)
+    blocks = []
+    for dump_id, desc, _, _, _, data, _ in entries:
+        if data is None:
+            continue
+        if desc == "BLOBS":
+            blocks.append((dump_id, _blobs_block(dump_id, compressed)))
+        elif not (variant == "missing_block" and dump_id == 3001):
+            blocks.append((dump_id, _data_block(dump_id, _stored_data(data, variant), compressed)))
+
+    def toc(offsets: dict[int, int]) -> bytes:
+        w = _Writer()
+        _header(w, version, FORMAT_CUSTOM, compressed)
+        extra = {}
+        for entry in entries:
+            if not _has_data(entry):
+                extra[entry[0]] = (3, 0)
+            elif variant == "seek" or variant == "terminator":
+                extra[entry[0]] = (2, offsets.get(entry[0], 0))
+            else:
+                extra[entry[0]] = (1, 0)
+        _toc(w, version, FORMAT_CUSTOM, entries, extra)
+        return bytes(w.buf)
+
+    # The TOC's size does not depend on the offsets: write it once to place the blocks
+    pos = len(toc({}))
+    offsets = {}
+    for dump_id, block in blocks:
+        offsets[dump_id] = pos
+        pos += len(block)
+    return toc(offsets) + b"".join(block for _, block in blocks)
+
+
+def build_directory(archive_dir: Path, version: tuple[int, int], compressed: bool) -> None:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    for old in archive_dir.iterdir():
+        old.unlink()
+    entries = _entries("seek")
+    extra = {}
+    for dump_id, _, _, _, _, data, _ in entries:
+        if data is None:
+            extra[dump_id] = ""
+            continue
+        extra[dump_id] = f"{dump_id}.dat"
+        if compressed:
+            (archive_dir / f"{dump_id}.dat.gz").write_bytes(gzip.compress(data, mtime=0))
+        else:
+            (archive_dir / f"{dump_id}.dat").write_bytes(data)
+    w = _Writer()
+    _header(w, version, FORMAT_DIRECTORY, compressed)
+    _toc(w, version, FORMAT_DIRECTORY, entries, extra)
+    (archive_dir / "toc.dat").write_bytes(bytes(w.buf))
+
+
+def expected_sql(variant: str) -> bytes:
+    """What pg_restore -f - prints for the fixture (schema from the TOC, data as COPY blocks)."""
+    parts = []
+    for _, desc, _, defn, copy_stmt, data, _ in _entries(variant):
+        if desc == "TABLE DATA":
+            parts.append(copy_stmt.encode("utf-8") + data + b"\\.\n\n")
+        elif defn:
+            parts.append((defn.rstrip("\n") + "\n\n").encode("utf-8"))
+    return b"".join(parts)
+
+
+def write_fixtures() -> None:
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for name, (version, archive_format, compressed, variant) in FIXTURES.items():
+        if archive_format == FORMAT_CUSTOM:
+            (FIXTURE_DIR / f"{name}.dump").write_bytes(build_custom(version, compressed, variant))
+        else:
+            build_directory(FIXTURE_DIR / name, version, compressed)
+        record = {
+            "version": list(version),
+            "toc": [[e[0], e[1], e[2], _section(e[1]), _has_data(e)] for e in _entries(variant)],
+        }
+        if variant == "missing_block":
+            record["error"] = "missing or out of order"
+        manifest[name] = record
+    # Schema and data are the same in every fixture
+    (FIXTURE_DIR / "expected.sql").write_bytes(expected_sql("seek"))
+    (FIXTURE_DIR / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    print(f"Wrote {len(FIXTURES)} fixtures to {FIXTURE_DIR}")
+
+
+class _Pipe(io.RawIOBase):
+    """A non-seekable view of a file, like pg_dump output read from a pipe."""
+
+    def __init__(self, fh: BinaryIO) -> None:
+        self._fh = fh
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._fh.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def check_fixture(name: str, record: dict) -> list[str]:
+    """Problems found with one fixture; empty if it reads as expected."""
+    path = FIXTURE_DIR / name if (FIXTURE_DIR / name).is_dir() else FIXTURE_DIR / f"{name}.dump"
+    problems = []
+    try:
+        if is_directory_archive(path):
+            archive = read_directory_archive(path)
+        else:
+            with path.open("rb") as fh:
+                archive = read_archive(fh)
+    except ArchiveError as e:
+        return [f"TOC: {e}"]
+
+    if list(archive.version[:2]) != record["version"]:
+        problems.append(f"version {archive.version}")
+    toc = [[e.dump_id, e.desc, e.tag, e.section, e.has_data] for e in archive.entries]
+    if toc != record["toc"]:
+        problems.append("TOC differs")
+
+    if is_directory_archive(path):
+        readers = {"directory": lambda: b"".join(iter_directory_plain_sql(path))}
+    else:
+        def read_file(pipe: bool) -> bytes:
+            with path.open("rb") as fh:
+                return b"".join(iter_plain_sql(io.BufferedReader(_Pipe(fh)) if pipe else fh))
+        readers = {"file": lambda: read_file(False), "pipe": lambda: read_file(True)}
+
+    readers["split"] = lambda: _split_rows(path)
+
+    for how, read in readers.items():
+        try:
+            sql = read()
+        except ArchiveError as e:
+            if record.get("error", "\0") not in str(e):
+                problems.append(f"{how}: {e}")
+            continue
+        if "error" in record:
+            problems.append(f"{how}: read without the expected error")
+        elif how == "split":
+            if sql != _expected_rows():
+                problems.append("split: table rows differ")
+        elif sql != (FIXTURE_DIR / "expected.sql").read_bytes():
+            problems.append(f"{how}: SQL differs")
+    return problems
+
+
+def _expected_rows() -> bytes:
+    """The INSERT rows split_by_table should write for the fixture data, table by table."""
+    rows = []
+    for _, desc, tag, _, copy_stmt, data, _ in sorted(_ENTRIES, key=lambda e: e[2]):
+        if desc == "TABLE DATA":
+            rows.extend(iter_insert_lines(copy_stmt, data.decode("utf-8").splitlines(keepends=True)))
+    return "".join(rows).encode("utf-8")
+
+
+def _split_rows(path: Path) -> bytes:
+    """Split an archive with split_by_table and return its table files' INSERT rows, table by table."""
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        output_dir = Path(tmp)
+        if is_directory_archive(path):
+            split_directory_archive(path, output_dir)
+        else:
+            split_file(path, output_dir, "table_")
+        rows = []
+        for table_file in sorted(output_dir.glob("table_*.sql")):
+            with table_file.open(encoding="utf-8") as fin:
+                rows.extend(line for line in fin if line.startswith("INSERT INTO"))
+    return "".join(rows).encode("utf-8")
+
+
+# COPY data as stored -> as streamed, with '\\.' only dropped when it is a line of its own
+_TERMINATOR_CASES = [
+    (b"1\ta\n\\.\n", b"1\ta\n"),
+    (b"\\.\n", b""),
+    (b"1\tC:\\\\dir\\\\.\n", b"1\tC:\\\\dir\\\\.\n"),
+    (b"1\tC:\\\\dir\\\\.\n\\.\n", b"1\tC:\\\\dir\\\\.\n"),
+    (b"x\\.\n", b"x\\.\n"),
+]
+
+
+def check_strip_terminator() -> list[str]:
+    """Terminator cases that stream wrongly, with the data split at every byte."""
+    problems = []
+    for stored, expected in _TERMINATOR_CASES:
+        for cut in range(len(stored) + 1):
+            got = b"".join(_strip_terminator(iter([stored[:cut], stored[cut:]])))
+            if got != expected:
+                problems.append(f"{stored!r} split at {cut}: {got!r}")
+                break
+    return problems
+
+
+def main() -> None:
+    args = parse_args()
+    if args.write_fixtures:
+        write_fixtures()
+        return
+
+    manifest_file = FIXTURE_DIR / "manifest.json"
+    if not manifest_file.exists():
+        print(f"Error: Fixture manifest not found: {manifest_file}")
+        return
+
+    manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    print(f"Checking {len(manifest)} archive fixtures...")
+    failures = []
+    for name, record in manifest.items():
+        problems = check_fixture(name, record)
+        print(f"  {'FAIL' if problems else 'PASS'} {name}" + (f": {', '.join(problems)}" if problems else ""))
+        if problems:
+            failures.append(name)
+
+    problems = check_strip_terminator()
+    print(f"  {'FAIL' if problems else 'PASS'} COPY terminator cases" + (f": {', '.join(problems)}" if problems else ""))
+    if problems:
+        failures.append("COPY terminator cases")
+
+    if failures:
+        print(f"\n{len(failures)} checks failed: {', '.join(failures)}")
+        raise SystemExit(1)
+    print(f"\nAll {len(manifest)} fixtures read as expected")
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 import argparse
+import itertools
 import re
 from pathlib import Path
+from typing import Iterable, Iterator
+
+from dump_io import compression_of, is_stdio, open_input, open_output, sql_stem
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import add_progress_args, finish_progress, follow, start_progress
+from dump_stats import add_stats_args, finish_stats, start_stats, timed_iter, timed_writer
 
 
 def parse_args() -> argparse.Namespace:
@@ -13,19 +20,28 @@ def parse_args() -> argparse.Namespace:
   parser.add_argument(
     "input",
     type=Path,
-    help="Path to original pg_dump SQL file (with COPY ... FROM stdin blocks).",
+    help="Path to original pg_dump SQL file (with COPY ... FROM stdin blocks); .gz/.zst or '-' for stdin.",
   )
   parser.add_argument(
     "output",
     type=Path,
     nargs="?",
-    help="Path to output SQL file (default: <input>_plain.sql).",
+    help="Path to output SQL file; .gz/.zst or '-' for stdout (default: <input>_plain.sql).",
   )
   parser.add_argument(
     "--keep-meta",
     action="store_true",
     help="Keep pg_dump/psql meta statements (SET, SELECT set_config, \\restrict, GRANT/REVOKE...).",
   )
+  parser.add_argument(
+    "--compress-threads",
+    type=int,
+    default=1,
+    help="Worker threads for compressing .gz/.zst output in parallel blocks (default: 1).",
+  )
+  add_progress_args(parser)
+  add_stats_args(parser)
+  add_profile_args(parser)
   return parser.parse_args()
 
 
@@ -33,6 +49,7 @@ _re_int = re.compile(r"^[+-]?\d+$")
 _re_float = re.compile(r"^[+-]?(?:\d+\.\d*|\d*\.\d+)(?:[eE][+-]?\d+)?$|^[+-]?\d+[eE][+-]?\d+$")
 
 
+@hot_path
 def escape_value(value: str) -> str:
   """
   Convert a single COPY field to an SQL literal.
@@ -70,6 +87,12 @@ def convert_copy_block(header_line: str, data_lines: list[str]) -> list[str]:
   Example header:
     COPY public.users (id, email) FROM stdin;
   """
+  return list(iter_insert_lines(header_line, data_lines))
+
+
+@hot_path
+def iter_insert_lines(header_line: str, data_lines: Iterable[str]) -> Iterator[str]:
+  """Streaming form of convert_copy_block: yield one INSERT line per COPY data line."""
   header = header_line.strip()
   # Remove trailing " FROM stdin;" and leading "COPY "
   assert header.startswith("COPY "), f"Unexpected COPY header: {header}"
@@ -79,7 +102,6 @@ def convert_copy_block(header_line: str, data_lines: list[str]) -> list[str]:
 
   insert_prefix = f"INSERT INTO {header_body} VALUES "
 
-  insert_lines: list[str] = []
   for raw in data_lines:
     line = raw.rstrip("\n")
     if not line or line == r"\.":
@@ -87,12 +109,10 @@ def convert_copy_block(header_line: str, data_lines: list[str]) -> list[str]:
 
     fields = line.split("\t")
     values_sql = ", ".join(escape_value(f) for f in fields)
-    insert_lines.append(insert_prefix + f"({values_sql});\n")
+    yield insert_prefix + f"({values_sql});\n"
 
-  return insert_lines
 
-
-def _is_meta_line(line: str) -> bool:
+def is_meta_line(line: str) -> bool:
   stripped = line.strip()
 
   # psql meta commands in plain dumps (not valid SQL)
@@ -115,43 +135,48 @@ def _is_meta_line(line: str) -> bool:
   return False
 
 
-def convert_file(input_path: Path, output_path: Path, *, keep_meta: bool) -> None:
-  # Stream line-by-line so it works for large dumps
-  with input_path.open("r", encoding="utf-8") as fin, output_path.open("w", encoding="utf-8") as fout:
-    while True:
-      line = fin.readline()
-      if not line:
-        break
-
-      if line.startswith("COPY ") and line.rstrip().endswith("FROM stdin;"):
-        copy_header = line
-        data_lines: list[str] = []
+def iter_plain_lines(lines: Iterable[str], *, keep_meta: bool = False) -> Iterator[str]:
+  """Yield the plain-SQL form of a pg_dump text stream: COPY blocks become INSERT lines."""
+  it = iter(lines)
+  for line in it:
+    if line.startswith("COPY ") and line.rstrip().endswith("FROM stdin;"):
+      # takewhile consumes the \. terminator, so the outer loop resumes after the block
+      yield from iter_insert_lines(line, itertools.takewhile(lambda l: l.strip() != r"\.", it))
+      continue
 
-        while True:
-          data_line = fin.readline()
-          if not data_line:
-            break
-          if data_line.strip() == r"\.":
-            break
-          data_lines.append(data_line)
+    if not keep_meta and is_meta_line(line):
+      continue
 
-        for ins in convert_copy_block(copy_header, data_lines):
-          fout.write(ins)
-        continue
+    yield line
 
-      if not keep_meta and _is_meta_line(line):
-        continue
 
-      fout.write(line)
+def convert_file(input_path: Path, output_path: Path, *, keep_meta: bool, compress_threads: int = 1) -> None:
+  # Stream line-by-line so it works for large dumps; (de)compression runs off the parsing thread
+  with open_input(input_path) as fin, open_output(output_path, threads=compress_threads) as fout, follow(fin):
+    lines = iter_plain_lines(timed_iter(fin, "read"), keep_meta=keep_meta)
+    timed_writer(fout).writelines(timed_iter(lines, "serialize"))
 
 
 def main() -> None:
   args = parse_args()
+  start_stats(args, "convert_copy_to_insert")
+  start_progress(args, "convert_copy_to_insert")
+  start_profile(args, "convert_copy_to_insert")
   input_path: Path = args.input
-  output_path: Path = args.output or input_path.with_name(input_path.stem + "_plain.sql")
-
-  convert_file(input_path, output_path, keep_meta=args.keep_meta)
-  print(f"Converted '{input_path}' -> '{output_path}'")
+  if args.output:
+    output_path: Path = args.output
+  elif is_stdio(input_path):
+    output_path = Path("-")
+  else:
+    suffix = f".{compression_of(input_path)}" if compression_of(input_path) else ""
+    output_path = input_path.with_name(sql_stem(input_path) + "_plain.sql" + suffix)
+
+  convert_file(input_path, output_path, keep_meta=args.keep_meta, compress_threads=args.compress_threads)
+  finish_profile(args, "convert_copy_to_insert")
+  finish_progress(args)
+  if not is_stdio(output_path):
+    print(f"Converted '{input_path}' -> '{output_path}'")
+  finish_stats(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+"""Convert per-table INSERT files back into COPY ... FROM stdin blocks and optionally load them."""
+import argparse
+import io
+import subprocess
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO
+
+from dump_io import compression_of, is_stdio, open_output, sql_stem, table_chunk_map
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import add_progress_args, expect, finish_progress, start_progress
+from dump_stats import add_stats_args, finish_stats, start_stats, timed_iter, timed_writer
+from load_tables import add_connection_args, psql_command
+from schema_model import parse_schema
+from sql_statements import iter_file_statements, parse_insert_target, split_values
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Rewrite single-row INSERT statements (as produced by convert_copy_to_insert.py) "
+            "into PostgreSQL COPY text format, or stream them straight into psql with --load."
+        ),
+    )
+    parser.add_argument(
+        "input",
+        type=Path,
+        help="A table_*.sql file, or a directory of them (loaded in FK-safe order).",
+    )
+    parser.add_argument(
+        "output",
+        type=Path,
+        nargs="?",
+        help="Output SQL file; .gz/.zst or '-' for stdout (default: <input>_copy.sql, or <dir>/restore_copy.sql).",
+    )
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help="Pipe the COPY stream into psql instead of writing an output file.",
+    )
+    add_connection_args(parser)
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+@hot_path
+def copy_field(token: str) -> str:
+    """
+    Convert a raw SQL value token into a COPY text-format field.
+
+    - NULL -> \\N
+    - TRUE/FALSE -> t/f
+    - quoted literals are unquoted ('' -> ') and backslash, tab, newline and
+      carriage return are escaped as COPY expects
+    - bare numbers are kept as-is
+    """
+    if not token:
+        raise ValueError("Empty value in INSERT statement")
+    if token[0] == "'":
+        if len(token) < 2 or token[-1] != "'":
+            raise ValueError(f"Unsupported value in INSERT statement: {token[:50]}")
+        return token[1:-1].replace("''", "'").translate(_COPY_ESCAPES)
+
+    upper = token.upper()
+    if upper == "NULL":
+        return r"\N"
+    if upper == "TRUE":
+        return "t"
+    if upper == "FALSE":
+        return "f"
+    if token[0] in "+-.0123456789":
+        return token
+
+    raise ValueError(f"Unsupported value in INSERT statement: {token[:50]}")
+
+
+@hot_path
+def iter_copy_lines(statements: Iterable[str]) -> Iterator[str]:
+    """
+    Yield COPY headers, data lines and terminators for a stream of INSERT statements.
+
+    Consecutive statements for the same table and column list share one COPY block.
+    The table name is kept as the INSERT writes it (schema, quoting).
+    """
+    current_header: str | None = None
+
+    for statement in statements:
+        head = parse_insert_target(statement)
+        if head is None:
+            raise ValueError(f"Not an INSERT ... VALUES statement: {statement[:80]}")
+
+        target, columns, values_start = head
+        values, _ = split_values(statement, values_start)
+
+        header = f"COPY {target} ({', '.join(columns)}) FROM stdin;\n"
+        if header != current_header:
+            if current_header is not None:
+                yield "\\.\n"
+            yield header
+            current_header = header
+
+        yield "\t".join(copy_field(v) for v in values) + "\n"
+
+    if current_header is not None:
+        yield "\\.\n"
+
+
+def table_files_in_order(input_dir: Path) -> list[Path]:
+    """Return the table files of a backup directory in FK-safe order, as load_tables loads them."""
+    table_files = table_chunk_map(input_dir)
+    insert_order = parse_schema(input_dir / "table_schema.sql").insert_order(list(table_files))
+    return [chunk for table in insert_order for chunk in table_files[table]]
+
+
+def write_copy_stream(input_files: list[Path], fout: TextIO) -> int:
+    """Stream every input file as COPY blocks into fout. Returns the number of rows written."""
+    rows = 0
+    fout = timed_writer(fout)
+    for input_file in input_files:
+        for line in timed_iter(iter_copy_lines(iter_file_statements(input_file)), "serialize"):
+            if not line.startswith(("COPY ", "\\.")):
+                rows += 1
+            fout.write(line)
+    return rows
+
+
+def load_copy_stream(input_files: list[Path], command: list[str]) -> int:
+    """Stream COPY blocks into psql's stdin without an intermediate file. Returns the row count."""
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+    assert proc.stdin is not None
+    try:
+        with io.TextIOWrapper(proc.stdin, encoding="utf-8") as fout:
+            rows = write_copy_stream(input_files, fout)
+    except BrokenPipeError:
+        rows = 0
+    returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"psql exited with code {returncode}")
+    return rows
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "convert_insert_to_copy")
+    start_progress(args, "convert_insert_to_copy")
+    start_profile(args, "convert_insert_to_copy")
+    input_path: Path = args.input
+
+    if input_path.is_dir():
+        if not (input_path / "table_schema.sql").exists():
+            print(f"Error: Schema file not found: {input_path / 'table_schema.sql'}")
+            return
+        input_files = table_files_in_order(input_path)
+        output_path: Path = args.output or input_path / "restore_copy.sql"
+    elif is_stdio(input_path) or input_path.exists():
+        input_files = [input_path]
+        if args.output:
+            output_path = args.output
+        elif is_stdio(input_path):
+            output_path = Path("-")
+        else:
+            suffix = f".{compression_of(input_path)}" if compression_of(input_path) else ""
+            output_path = input_path.with_name(sql_stem(input_path) + "_copy.sql" + suffix)
+    else:
+        print(f"Error: Input '{input_path}' not found")
+        return
+
+    expect(sum(p.stat().st_size for p in input_files if not is_stdio(p)))
+    if args.load:
+        print(f"Streaming {len(input_files)} file(s) into psql via COPY...")
+        rows = load_copy_stream(input_files, psql_command(args))
+        print(f"Loaded {rows} rows")
+    else:
+        with open_output(output_path) as fout:
+            rows = write_copy_stream(input_files, fout)
+        if is_stdio(output_path):
+            finish_profile(args, "convert_insert_to_copy")
+            finish_progress(args)
+            finish_stats(args)
+            return
+        print(f"Converted {len(input_files)} file(s) -> '{output_path}' ({rows} rows)")
+    finish_profile(args, "convert_insert_to_copy")
+    finish_progress(args)
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
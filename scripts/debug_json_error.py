@@ -3,11 +3,13 @@ import json
 import re
 from pathlib import Path
 
+from sql_statements import iter_insert_spans
+
 file_path = Path("scripts/backup_plain_tables/table_content_edits.sql")
 content = file_path.read_text(encoding="utf-8")
 
 # Find all INSERT statements
-inserts = re.findall(r'INSERT INTO[^;]+;', content, re.DOTALL)
+inserts = [content[start:end] for start, end in iter_insert_spans(content)]
 
 # Check INSERT 2, JSON 4 (originalContentSnapshot)
 ins2 = inserts[1]
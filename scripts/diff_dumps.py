@@ -0,0 +1,310 @@
+"""
+Row-level diff between two dumps, written as an upsert/delete delta script.
+
+Rows are matched per table by primary key and compared by a 16-byte
+fingerprint of their column values, so only keys and fingerprints of the
+old side are held in memory. Tables whose index grows past --max-keys are
+hash-partitioned to disk and compared one partition at a time.
+
+The delta upserts parents before children and deletes children before
+parents, inside one transaction.
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, TextIO
+
+from dump_io import is_stdio, open_output
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, start_stats, timed_writer
+from dump_source import resolve_table_dir, table_files
+from row_selection import iter_table_rows
+from schema_model import parse_schema
+from sql_statements import parse_insert_head
+
+
+# Number of on-disk partitions once a table's key index no longer fits in memory
+_SPILL_PARTITIONS = 64
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Diff two dumps (or two backup_plain_tables directories) row by row and write "
+            "a delta script of INSERT ... ON CONFLICT and DELETE statements."
+        ),
+    )
+    parser.add_argument(
+        "old",
+        type=Path,
+        help="The dump the target database currently matches: a table directory, SQL dump (.gz/.zst) or pg_dump archive.",
+    )
+    parser.add_argument(
+        "new",
+        type=Path,
+        help="The dump the target database should match after applying the delta.",
+    )
+    parser.add_argument(
+        "output",
+        type=Path,
+        nargs="?",
+        default=Path("delta.sql"),
+        help="Delta SQL file; .gz/.zst or '-' for stdout (default: delta.sql).",
+    )
+    parser.add_argument(
+        "--max-keys",
+        type=int,
+        default=1_000_000,
+        help="Keys per table to index in memory before spilling to disk (default: 1000000).",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory for extracted tables and spill files (default: system temp dir).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when an input is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+@dataclass
+class DiffStats:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
+
+def row_fingerprint(columns: list[str], values: list[str]) -> bytes:
+    """Hash a row's (column, raw value) pairs; independent of column order in the statement."""
+    digest = hashlib.blake2b(digest_size=16)
+    for column, value in sorted(zip(columns, values)):
+        digest.update(column.encode("utf-8"))
+        digest.update(b"\x1e")
+        digest.update(value.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.digest()
+
+
+def iter_keyed_rows(table_file: Path, pk_columns: tuple[str, ...]) -> Iterator[tuple[tuple[str, ...], bytes, str]]:
+    """Yield (primary key tokens, fingerprint, statement) for every row of a table file."""
+    positions: dict[tuple[str, ...], list[int]] = {}
+    for columns, values, statement in iter_table_rows(table_file):
+        key_columns = tuple(columns)
+        pk_positions = positions.get(key_columns)
+        if pk_positions is None:
+            missing = [c for c in pk_columns if c not in columns]
+            if missing:
+                raise ValueError(f"{table_file.name}: INSERT without primary key column(s) {', '.join(missing)}")
+            pk_positions = positions[key_columns] = [columns.index(c) for c in pk_columns]
+        key = tuple(values[i] for i in pk_positions)
+        yield key, row_fingerprint(columns, values), statement
+
+
+def upsert_statement(statement: str, pk_columns: tuple[str, ...]) -> str:
+    """Turn a single-row INSERT into INSERT ... ON CONFLICT (pk) DO UPDATE."""
+    head = parse_insert_head(statement)
+    assert head is not None
+    _, columns, _ = head
+    updates = [f"{c} = EXCLUDED.{c}" for c in columns if c not in pk_columns]
+    action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+    return f"{statement.rstrip().rstrip(';')} ON CONFLICT ({', '.join(pk_columns)}) {action};\n"
+
+
+def delete_statement(table: str, pk_columns: tuple[str, ...], key: tuple[str, ...]) -> str:
+    if len(pk_columns) == 1:
+        return f"DELETE FROM public.{table} WHERE {pk_columns[0]} = {key[0]};\n"
+    return f"DELETE FROM public.{table} WHERE ({', '.join(pk_columns)}) = ({', '.join(key)});\n"
+
+
+def _partition_of(key: tuple[str, ...]) -> int:
+    return zlib.crc32("\x1f".join(key).encode("utf-8")) % _SPILL_PARTITIONS
+
+
+def _open_partitions(spill_dir: Path, side: str) -> list[BinaryIO]:
+    return [(spill_dir / f"{side}_{i:02d}.bin").open("wb") for i in range(_SPILL_PARTITIONS)]
+
+
+def _read_records(path: Path) -> Iterator[tuple]:
+    with path.open("rb") as fin:
+        while True:
+            try:
+                yield pickle.load(fin)
+            except EOFError:
+                return
+
+
+def _compare(
+    table: str,
+    pk_columns: tuple[str, ...],
+    old_index: dict[tuple[str, ...], bytes],
+    new_rows: Iterable[tuple[tuple[str, ...], bytes, str]],
+    upserts: TextIO,
+    deletes: TextIO,
+    stats: DiffStats,
+) -> None:
+    for key, fingerprint, statement in new_rows:
+        previous = old_index.pop(key, None)
+        if previous == fingerprint:
+            stats.unchanged += 1
+            continue
+        if previous is None:
+            stats.inserted += 1
+        else:
+            stats.updated += 1
+        upserts.write(upsert_statement(statement, pk_columns))
+
+    # Whatever is left was not in the new dump
+    for key in old_index:
+        deletes.write(delete_statement(table, pk_columns, key))
+        stats.deleted += 1
+
+
+def diff_table(
+    table: str,
+    pk_columns: tuple[str, ...],
+    old_file: Path | None,
+    new_file: Path | None,
+    upserts: TextIO,
+    deletes: TextIO,
+    max_keys: int,
+    spill_dir: Path,
+) -> DiffStats:
+    """Diff one table, writing upserts and deletes to the given streams."""
+    stats = DiffStats()
+    old_index: dict[tuple[str, ...], bytes] = {}
+    old_parts: list[BinaryIO] | None = None
+
+    if old_file is not None:
+        for key, fingerprint, _ in iter_keyed_rows(old_file, pk_columns):
+            if old_parts is None:
+                old_index[key] = fingerprint
+                if len(old_index) > max_keys:
+                    # Switch to partitioned mode: flush the index and route the rest to disk
+                    old_parts = _open_partitions(spill_dir, "old")
+                    for k, f in old_index.items():
+                        pickle.dump((k, f), old_parts[_partition_of(k)])
+                    old_index.clear()
+            else:
+                pickle.dump((key, fingerprint), old_parts[_partition_of(key)])
+
+    new_rows = iter_keyed_rows(new_file, pk_columns) if new_file is not None else iter(())
+
+    if old_parts is None:
+        _compare(table, pk_columns, old_index, new_rows, upserts, deletes, stats)
+        return stats
+
+    new_parts = _open_partitions(spill_dir, "new")
+    for row in new_rows:
+        pickle.dump(row, new_parts[_partition_of(row[0])])
+    for fh in old_parts + new_parts:
+        fh.close()
+
+    for i in range(_SPILL_PARTITIONS):
+        old_path = spill_dir / f"old_{i:02d}.bin"
+        new_path = spill_dir / f"new_{i:02d}.bin"
+        partition_index = dict(_read_records(old_path))
+        _compare(table, pk_columns, partition_index, _read_records(new_path), upserts, deletes, stats)
+        old_path.unlink()
+        new_path.unlink()
+
+    return stats
+
+
+def diff_dirs(old_dir: Path, new_dir: Path, fout: TextIO, max_keys: int, work_dir: Path) -> dict[str, DiffStats]:
+    """Write the delta between two table directories to fout. Returns stats per table."""
+    schema_file = new_dir / "table_schema.sql"
+    if not schema_file.exists():
+        schema_file = old_dir / "table_schema.sql"
+    model = parse_schema(schema_file)
+
+    old_tables = table_files(old_dir)
+    new_tables = table_files(new_dir)
+    order = model.insert_order(list(set(old_tables) | set(new_tables)))
+
+    spill_dir = work_dir / "spill"
+    spill_dir.mkdir(parents=True, exist_ok=True)
+    delete_dir = work_dir / "deletes"
+    delete_dir.mkdir(parents=True, exist_ok=True)
+
+    results: dict[str, DiffStats] = {}
+    for table in order:
+        pk_columns = model.primary_keys.get(table)
+        if not pk_columns:
+            print(f"  Warning: {table} has no primary key in the schema, skipped")
+            continue
+
+        with (delete_dir / f"{table}.sql").open("w", encoding="utf-8") as deletes:
+            results[table] = diff_table(
+                table, pk_columns, old_tables.get(table), new_tables.get(table), fout, deletes, max_keys, spill_dir,
+            )
+
+    # Children before parents
+    for table in reversed(order):
+        delete_file = delete_dir / f"{table}.sql"
+        if delete_file.exists():
+            with delete_file.open("r", encoding="utf-8") as fin:
+                shutil.copyfileobj(fin, fout)
+
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "diff_dumps")
+    start_profile(args, "diff_dumps")
+
+    for path in (args.old, args.new):
+        if not is_stdio(path) and not path.exists():
+            print(f"Error: Input '{path}' not found")
+            return
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        work_dir = Path(tmp)
+        try:
+            old_dir = resolve_table_dir(args.old, work_dir / "old", args.jobs)
+            new_dir = resolve_table_dir(args.new, work_dir / "new", args.jobs)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+
+        with open_output(args.output) as output:
+            fout = timed_writer(output)
+            fout.write(f"-- Delta from {args.old} to {args.new}\n")
+            fout.write(f"-- Generated at: {datetime.now().isoformat()}\n\n")
+            fout.write("BEGIN;\n")
+            results = diff_dirs(old_dir, new_dir, fout, args.max_keys, work_dir)
+            fout.write("COMMIT;\n")
+
+    if is_stdio(args.output):
+        finish_profile(args, "diff_dumps")
+        finish_stats(args)
+        return
+
+    changed = 0
+    for table, stats in results.items():
+        if stats.inserted or stats.updated or stats.deleted:
+            changed += stats.inserted + stats.updated + stats.deleted
+            print(f"  {table}: +{stats.inserted} ~{stats.updated} -{stats.deleted}")
+    print(f"\nWrote {changed} changed rows to '{args.output}'")
+    finish_profile(args, "diff_dumps")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
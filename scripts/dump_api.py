@@ -0,0 +1,175 @@
+"""
+Iterator API over the dump tools, for use in-process (seed jobs, notebooks).
+
+Everything streams: nothing is written to disk and no subprocess is started.
+Sources are a plain or compressed SQL file, '-' for stdin, or any iterable
+of lines; iter_inserts and iter_values also take a split table directory,
+whose tables are read parents first.
+
+    import sys
+    sys.path.insert(0, "scripts")
+    from dump_api import iter_values, repair_json, iter_inserts
+
+    for table, columns, row in iter_values("backup.sql.gz"):
+        if table == "users":
+            print(row.text("email"))
+
+    with open("fixed.sql", "w", encoding="utf-8") as fout:
+        fout.writelines(s + "\\n" for s in repair_json(iter_inserts("backup_plain_tables")))
+
+iter_copy_rows    (table, columns, fields) of the COPY blocks of a pg_dump text file
+iter_inserts      INSERT statements; COPY blocks are converted on the fly
+iter_values       (table, columns, LazyRow) for every INSERT ... VALUES row
+repair_json       statements with their JSON literals repaired
+check_fks         rows whose foreign key has no parent row in a table directory
+plan_order        (table, files) of a table directory in FK-safe load order
+"""
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from check_fk_violations import Violation, check_fks
+from convert_copy_to_insert import iter_plain_lines
+from dump_io import open_input, table_chunk_map
+from dump_progress import follow
+from fix_json_complete import repair_json_literal
+from fix_remaining_json_errors import fix_json_string
+from schema_model import parse_schema
+from sql_statements import SQL_LITERAL, LazyRow, iter_insert_rows, iter_statements
+
+__all__ = [
+    "Violation",
+    "check_fks",
+    "decode_copy_field",
+    "iter_copy_rows",
+    "iter_inserts",
+    "iter_values",
+    "plan_order",
+    "repair_json",
+]
+
+Source = Path | str | Iterable[str]
+
+_COPY_HEAD = re.compile(
+    r'COPY\s+((?:"[^"]+"|\w+)(?:\.(?:"[^"]+"|\w+))?)\s*(?:\(([^)]*)\))?\s+FROM\s+stdin;',
+    re.IGNORECASE,
+)
+_COPY_ESCAPE = re.compile(r"\\(?:([0-7]{1,3})|x([0-9A-Fa-f]{1,2})|(.))")
+_COPY_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+
+
+@contextmanager
+def _lines(source: Source) -> Iterator[Iterable[str]]:
+    if isinstance(source, (str, Path)):
+        with open_input(source) as fin, follow(fin):
+            yield fin
+    else:
+        yield source
+
+
+def _unescape(match: re.Match) -> str:
+    octal, hexadecimal, char = match.groups()
+    if octal:
+        return chr(int(octal, 8))
+    if hexadecimal:
+        return chr(int(hexadecimal, 16))
+    return _COPY_ESCAPES.get(char, char)
+
+
+def decode_copy_field(field: str) -> str | None:
+    """Decode one COPY text-format field: \\N is None, backslash escapes are resolved."""
+    if field == r"\N":
+        return None
+    if "\\" not in field:
+        return field
+    return _COPY_ESCAPE.sub(_unescape, field)
+
+
+def iter_copy_rows(source: Source) -> Iterator[tuple[str, list[str], list[str | None]]]:
+    """Yield (table, columns, fields) for every data line of the COPY ... FROM stdin blocks in source."""
+    with _lines(source) as lines:
+        table: str | None = None
+        columns: list[str] = []
+        for line in lines:
+            if table is None:
+                if line.startswith("COPY "):
+                    match = _COPY_HEAD.match(line)
+                    if match:
+                        table = match.group(1).split(".")[-1].strip('"')
+                        columns = [c.strip() for c in (match.group(2) or "").split(",") if c.strip()]
+                continue
+            line = line.rstrip("\n")
+            if line == r"\.":
+                table = None
+                continue
+            yield table, columns, [decode_copy_field(f) for f in line.split("\t")]
+
+
+def plan_order(table_dir: Path | str) -> Iterator[tuple[str, list[Path]]]:
+    """
+    Yield (table, files) for a split table directory, parents before children.
+
+    files are the table's chunks in load order. Without a table_schema.sql the
+    tables come in name order.
+    """
+    table_dir = Path(table_dir)
+    table_files = table_chunk_map(table_dir)
+    schema_file = table_dir / "table_schema.sql"
+    if schema_file.exists():
+        order = parse_schema(schema_file).insert_order(list(table_files))
+    else:
+        order = sorted(table_files)
+    for table in order:
+        yield table, table_files[table]
+
+
+def iter_inserts(source: Source) -> Iterator[str]:
+    """Yield the INSERT statements of source; COPY blocks are converted to INSERTs as they are read."""
+    if isinstance(source, (str, Path)) and Path(source).is_dir():
+        for _, files in plan_order(source):
+            for path in files:
+                yield from iter_inserts(path)
+        return
+    with _lines(source) as lines:
+        for statement in iter_statements(iter_plain_lines(lines)):
+            if statement[:6].upper() == "INSERT":
+                yield statement
+
+
+def iter_values(source: Source, tables: Iterable[str] | None = None) -> Iterator[tuple[str, list[str], LazyRow]]:
+    """
+    Yield (table, columns, row) for every INSERT ... VALUES row of source, optionally of some tables only.
+
+    row is a LazyRow: row[i] and row.raw(column) are raw SQL tokens, row.text()
+    and row.json() decode a column; fields are only split out when read.
+    """
+    wanted = set(tables) if tables is not None else None
+    for table, columns, row, _ in iter_insert_rows(iter_inserts(source)):
+        if wanted is None or table in wanted:
+            yield table, columns, row
+
+
+def _repair_literal(match: re.Match) -> str:
+    inner = match.group(1).replace("''", "'")
+    fixed = repair_json_literal(inner)
+    if fixed is None and inner.lstrip().startswith(("{", "[")):
+        # Still unparseable: try escaping the stray quote the parser stopped at
+        candidate = fix_json_string(inner)
+        fixed = candidate if candidate != inner else None
+    if fixed is None:
+        return match.group(0)
+    return "'" + fixed.replace("'", "''") + "'"
+
+
+def repair_json(statements: Iterable[str]) -> Iterator[str]:
+    """
+    Yield each statement with its JSON literals repaired.
+
+    Raw newlines and tabs are escaped and every JSON literal is re-serialized,
+    as fix_json_complete does; a literal that still fails to parse gets the
+    stray-quote escaping of fix_remaining_json_errors. Other literals are
+    left alone.
+    """
+    for statement in statements:
+        yield SQL_LITERAL.sub(_repair_literal, statement)
@@ -0,0 +1,373 @@
+"""
+Transparent compressed input/output for the dump tools.
+
+Paths ending in .gz or .zst are (de)compressed on the fly and '-' means
+stdin/stdout. Compressed input is detected from its magic bytes, so piped
+input works too, and pg_dump custom-format archives (or -Fd directories)
+are read as the plain SQL they contain (see pg_archive.py). Decompression
+runs on a background thread and compression runs on a worker pool in
+independent blocks, so both overlap with parsing; zlib and zstandard
+release the GIL while they work.
+
+zstd support needs the optional `zstandard` package.
+"""
+import gzip
+import io
+import mmap
+import queue
+import re
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, TextIO
+
+from dump_stats import add, stage
+from pg_archive import ARCHIVE_MAGIC, is_directory_archive, iter_directory_plain_sql, iter_plain_sql
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_CHUNK_NUMBER = re.compile(r"\.(\d{4,})$")
+
+_CHUNK_SIZE = 1 << 20
+_BLOCK_SIZE = 4 << 20
+
+
+def is_stdio(path: Path | str) -> bool:
+    return str(path) == "-"
+
+
+def compression_of(path: Path | str) -> str | None:
+    """Return 'gz', 'zst' or None based on the file extension."""
+    name = str(path)
+    if name.endswith(".gz"):
+        return "gz"
+    if name.endswith(".zst"):
+        return "zst"
+    return None
+
+
+def sql_stem(path: Path) -> str:
+    """File name without .sql and compression suffixes: table_users.sql.gz -> table_users."""
+    name = path.name
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+            break
+    if name.endswith(".sql"):
+        name = name[: -len(".sql")]
+    return name
+
+
+def list_sql_files(directory: Path, pattern: str = "table_*") -> list[Path]:
+    """Glob plain and compressed .sql files in a directory, sorted by name."""
+    files: list[Path] = []
+    for suffix in (".sql",) + tuple(".sql" + s for s in COMPRESSED_SUFFIXES):
+        files.extend(directory.glob(pattern + suffix))
+    return sorted(files, key=lambda p: p.name)
+
+
+def table_chunk_map(directory: Path, prefix: str = "table_") -> dict[str, list[Path]]:
+    """
+    Map table name -> its files in load order.
+
+    A table is either one table_<name>.sql[.gz|.zst] file or numbered chunks
+    table_<name>.0001.sql, table_<name>.0002.sql, ... (split_by_table.py --max-chunk-*).
+    """
+    chunks: dict[str, dict[int, Path]] = {}
+    for path in list_sql_files(directory, prefix + "*"):
+        name = sql_stem(path)[len(prefix):]
+        number = 0
+        match = _CHUNK_NUMBER.search(name)
+        if match:
+            name, number = name[: match.start()], int(match.group(1))
+        if name != "schema":
+            chunks.setdefault(name, {}).setdefault(number, path)
+    return {name: [files[n] for n in sorted(files)] for name, files in chunks.items()}
+
+
+def table_file_map(directory: Path, prefix: str = "table_") -> dict[str, Path]:
+    """Map table name -> table file for every table_<name>.sql[.gz|.zst] in a directory."""
+    tables: dict[str, Path] = {}
+    for name, files in table_chunk_map(directory, prefix).items():
+        if len(files) > 1:
+            raise ValueError(
+                f"Table {name} is split into {len(files)} chunks in '{directory}'; "
+                "re-split without --max-chunk-bytes/--max-chunk-rows for this tool"
+            )
+        tables[name] = files[0]
+    return tables
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise RuntimeError("zstd support requires the 'zstandard' package (pip install zstandard)")
+
+
+class _IteratorReader(io.RawIOBase):
+    """Adapts an iterator of byte chunks to a readable binary stream."""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        super().__init__()
+        self._chunks = chunks
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        # Chunks are handed over whole; callers only use this through _ReadAheadReader
+        return next(self._chunks, b"")
+
+
+class _ReadAheadReader(io.RawIOBase):
+    """Reads (and decompresses) a binary stream on a background thread."""
+
+    def __init__(self, source: BinaryIO, owned: list[BinaryIO], depth: int = 4) -> None:
+        super().__init__()
+        self._source = source
+        self._owned = owned
+        self._queue: queue.Queue = queue.Queue(maxsize=depth)
+        self._pending = memoryview(b"")
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _put(self, item: object) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _pump(self) -> None:
+        try:
+            while True:
+                chunk = self._source.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if not self._put(chunk):
+                    return
+        except BaseException as exc:  # re-raised on the reading thread
+            self._put(exc)
+        self._put(None)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            self._pending = memoryview(item)
+
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            for fh in reversed(self._owned):
+                fh.close()
+        super().close()
+
+
+class _BlockCompressWriter(io.RawIOBase):
+    """
+    Compresses fixed-size blocks on a worker pool and writes them in order.
+
+    Each block becomes an independent gzip member / zstd frame; concatenated
+    members are valid input for gzip, zcat and zstd.
+    """
+
+    def __init__(self, sink: BinaryIO, compress: Callable[[bytes], bytes], threads: int, close_sink: bool) -> None:
+        super().__init__()
+        self._sink = sink
+        self._compress = compress
+        self._close_sink = close_sink
+        self._threads = max(1, threads)
+        self._executor = ThreadPoolExecutor(max_workers=self._threads)
+        self._pending: deque[Future] = deque()
+        self._block = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._block += data
+        if len(self._block) >= _BLOCK_SIZE:
+            self._submit()
+        return len(data)
+
+    def _submit(self) -> None:
+        block = bytes(self._block)
+        self._block.clear()
+        self._pending.append(self._executor.submit(self._compress, block))
+        # Bound memory: keep at most two blocks in flight per worker
+        while len(self._pending) > 2 * self._threads:
+            self._sink.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                if self._block:
+                    self._submit()
+                while self._pending:
+                    self._sink.write(self._pending.popleft().result())
+                self._sink.flush()
+            finally:
+                self._executor.shutdown()
+                if self._close_sink:
+                    self._sink.close()
+        super().close()
+
+
+def _compressor(kind: str, level: int | None) -> Callable[[bytes], bytes]:
+    if kind == "gz":
+        compresslevel = 6 if level is None else level
+        return lambda block: gzip.compress(block, compresslevel=compresslevel, mtime=0)
+
+    _require_zstandard()
+    zstd_level = 3 if level is None else level
+
+    def compress(block: bytes) -> bytes:
+        # ZstdCompressor objects are not thread-safe, so use one per block
+        return zstandard.ZstdCompressor(level=zstd_level).compress(block)
+
+    return compress
+
+
+def open_input_binary(path: Path | str) -> BinaryIO:
+    """Open a dump for binary reading, decompressing gzip/zstd input on a background thread."""
+    if is_stdio(path):
+        raw: BinaryIO = open(sys.stdin.fileno(), "rb", closefd=False)
+    elif is_directory_archive(Path(path)):
+        source = _IteratorReader(iter_directory_plain_sql(Path(path)))
+        return io.BufferedReader(_ReadAheadReader(source, []), buffer_size=_CHUNK_SIZE)
+    else:
+        raw = open(path, "rb")
+
+    buffered = raw if isinstance(raw, io.BufferedReader) else io.BufferedReader(raw)
+    magic = buffered.peek(5)[:5]
+
+    if magic.startswith(ARCHIVE_MAGIC):
+        source: BinaryIO = _IteratorReader(iter_plain_sql(buffered))
+    elif magic.startswith(_GZIP_MAGIC):
+        source = gzip.GzipFile(fileobj=buffered, mode="rb")
+    elif magic.startswith(_ZSTD_MAGIC):
+        _require_zstandard()
+        source = zstandard.ZstdDecompressor().stream_reader(buffered, read_across_frames=True)
+    else:
+        return buffered
+
+    return io.BufferedReader(_ReadAheadReader(source, [source, buffered]), buffer_size=_CHUNK_SIZE)
+
+
+def input_fileno(stream: TextIO | BinaryIO) -> int | None:
+    """
+    File descriptor of the file under a stream from open_input / open_input_binary.
+
+    For compressed input this is the compressed file, so its offset tracks
+    how much of the file on disk has been consumed. None for streams that are
+    not backed by a single file (pg_dump -Fd directories).
+    """
+    binary = getattr(stream, "buffer", stream)
+    raw = getattr(binary, "raw", binary)
+    if isinstance(raw, _ReadAheadReader):
+        if not raw._owned:
+            return None
+        binary = raw._owned[-1]
+    try:
+        return binary.fileno()
+    except (OSError, ValueError):
+        return None
+
+
+def open_input(path: Path | str) -> TextIO:
+    """Open a dump for UTF-8 text reading. Accepts '-', .gz and .zst."""
+    return io.TextIOWrapper(open_input_binary(path), encoding="utf-8")
+
+
+def open_output_binary(path: Path | str, *, threads: int = 1, level: int | None = None) -> BinaryIO:
+    """Open a dump for binary writing; .gz/.zst paths are compressed in blocks on `threads` workers."""
+    kind = compression_of(path)
+    compress = _compressor(kind, level) if kind else None
+
+    if is_stdio(path):
+        sink: BinaryIO = open(sys.stdout.fileno(), "wb", closefd=False)
+    else:
+        sink = open(path, "wb")
+
+    if compress is None:
+        return sink
+
+    writer = _BlockCompressWriter(sink, compress, threads, close_sink=True)
+    return io.BufferedWriter(writer, buffer_size=_CHUNK_SIZE)
+
+
+def open_output(path: Path | str, *, threads: int = 1, level: int | None = None) -> TextIO:
+    """Open a dump for UTF-8 text writing. Accepts '-', .gz and .zst."""
+    return io.TextIOWrapper(open_output_binary(path, threads=threads, level=level), encoding="utf-8")
+
+
+@contextmanager
+def map_input(path: Path | str) -> Iterator[mmap.mmap | None]:
+    """
+    Memory-map a dump for bytes-level scanning.
+
+    Yields None when the input cannot be mapped as-is (stdin, directories,
+    empty files, compressed files and pg_dump archives); callers then fall
+    back to open_input.
+    """
+    if is_stdio(path) or not Path(path).is_file() or Path(path).stat().st_size == 0:
+        yield None
+        return
+
+    with open(path, "rb") as fh:
+        mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mapped[:5].startswith((_GZIP_MAGIC, _ZSTD_MAGIC, ARCHIVE_MAGIC)):
+                yield None
+            else:
+                yield mapped
+        finally:
+            mapped.close()
+
+
+def read_text(path: Path | str) -> str:
+    """Read a whole (possibly compressed) dump as text."""
+    with stage("read"):
+        with open_input(path) as fin:
+            text = fin.read()
+    add("read", nbytes=len(text))
+    return text
+
+
+def write_text(path: Path | str, text: str, *, threads: int = 1) -> None:
+    """Write text to a (possibly compressed) dump."""
+    with stage("write", nbytes=len(text)):
+        with open_output(path, threads=threads) as fout:
+            fout.write(text)
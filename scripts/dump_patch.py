@@ -0,0 +1,472 @@
+"""
+Patch files for the JSON fixers (--patch), and applying them.
+
+With --patch PATCH a fixer leaves the table files alone and records every
+value it changed, as JSON lines:
+
+    {"file": "backup_plain_tables/table_users.sql", "size": 1318467}
+    {"offset": 5120, "start": 210, "end": 388, "hash": "9f2c...", "text": "'{...}'"}
+    ...
+
+offset is the byte offset of the INSERT statement in the file (as read,
+i.e. decompressed), start and end delimit the old literal in bytes
+relative to it, hash is the blake2b digest of the old bytes and text is
+the new literal. Entries follow the line of their file, in file order.
+When a fixer changes more than literals (joined lines, removed line
+continuations), the entry covers the whole statement, or the text between
+two statements.
+
+The patch can then be applied
+  - in place: python dump_patch.py PATCH. Plain files get positioned
+    writes; from the first entry that changes the length on, the rest of
+    the file is rewritten once. Compressed files are rewritten.
+  - while loading: load_tables.py --patch PATCH reads the original files
+    and substitutes the new literals on the fly.
+Both check every old span against its hash (and the file size) of every
+patched file before the first one is written or loaded, and refuse a patch
+if any file changed since it was made.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from dump_io import compression_of, open_input_binary, open_output, write_text
+from dump_stats import add_stats_args, finish_stats, stage, start_stats, timed_writer
+from sql_statements import SQL_LITERAL_BYTES, iter_file_statements, iter_insert_spans, iter_statements
+
+# (start, end, replacement) of one span of a file's content
+Span = tuple[int, int, str]
+
+_COPY_CHUNK = 1 << 20
+
+
+class PatchError(Exception):
+    """A patch does not match the file it is applied to."""
+
+
+@dataclass
+class PatchEntry:
+    offset: int
+    start: int
+    end: int
+    hash: str
+    text: str
+
+    @property
+    def span(self) -> tuple[int, int]:
+        """Absolute (start, end) of the old bytes in the file."""
+        return self.offset + self.start, self.offset + self.end
+
+
+@dataclass
+class FilePatch:
+    file: Path
+    size: int
+    entries: list[PatchEntry]
+
+
+def span_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def apply_spans(content: str, spans: Iterable[Span]) -> Iterator[str]:
+    """The pieces of content with each (start, end) span replaced, for spans in ascending order."""
+    pos = 0
+    for start, end, replacement in spans:
+        yield content[pos:start]
+        yield replacement
+        pos = end
+    yield content[pos:]
+
+
+def _diff_statement(old: bytes, new: bytes) -> list[tuple[int, int, bytes]]:
+    """(start, end, new bytes) per literal that differs, or one span for the whole statement."""
+    old_literals = list(SQL_LITERAL_BYTES.finditer(old))
+    new_literals = list(SQL_LITERAL_BYTES.finditer(new))
+    whole = [(0, len(old), new)]
+    if len(old_literals) != len(new_literals):
+        return whole
+
+    spans = []
+    old_pos = new_pos = 0
+    for o, n in zip(old_literals, new_literals):
+        if old[old_pos:o.start()] != new[new_pos:n.start()]:
+            return whole
+        if o.group() != n.group():
+            spans.append((o.start(), o.end(), n.group()))
+        old_pos, new_pos = o.end(), n.end()
+    if old[old_pos:] != new[new_pos:]:
+        return whole
+    return spans
+
+
+def diff_entries(old: bytes, new: bytes) -> Iterator[tuple[int, int, int, bytes]]:
+    """
+    (offset, start, end, new bytes) for every change from old to new.
+
+    Statements are paired in order and compared literal by literal, so the
+    usual fixer output (same statements, some literals re-serialized) gives
+    one entry per changed literal. Anything else falls back to larger spans.
+    """
+    old_spans = list(iter_insert_spans(old))
+    new_spans = list(iter_insert_spans(new))
+    if len(old_spans) != len(new_spans):
+        yield 0, 0, len(old), new
+        return
+
+    old_pos = new_pos = 0
+    for (old_start, old_end), (new_start, new_end) in zip(old_spans, new_spans):
+        if old[old_pos:old_start] != new[new_pos:new_start]:
+            yield old_pos, 0, old_start - old_pos, new[new_pos:new_start]
+        old_statement = old[old_start:old_end]
+        new_statement = new[new_start:new_end]
+        if old_statement != new_statement:
+            for start, end, text in _diff_statement(old_statement, new_statement):
+                yield old_start, start, end, text
+        old_pos, new_pos = old_end, new_end
+    if old[old_pos:] != new[new_pos:]:
+        yield old_pos, 0, len(old) - old_pos, new[new_pos:]
+
+
+class PatchWriter:
+    """Writes the changes the fixers make to a patch file instead of to the table files."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.files = 0
+        self.entries = 0
+        self._fout = path.open("w", encoding="utf-8")
+
+    def add(self, file_path: Path, text: str) -> int:
+        """Record the changes from the file's current content to text. Returns the number of entries."""
+        with stage("diff"):
+            with open_input_binary(file_path) as fin:
+                old = fin.read()
+            entries = list(diff_entries(old, text.encode("utf-8")))
+        if not entries:
+            return 0
+        self._fout.write(json.dumps({"file": str(file_path), "size": len(old)}, ensure_ascii=False) + "\n")
+        for offset, start, end, new in entries:
+            entry = {
+                "offset": offset,
+                "start": start,
+                "end": end,
+                "hash": span_hash(old[offset + start:offset + end]),
+                "text": new.decode("utf-8"),
+            }
+            self._fout.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.files += 1
+        self.entries += len(entries)
+        return len(entries)
+
+    def close(self) -> None:
+        self._fout.close()
+
+
+_writer: PatchWriter | None = None
+# File name -> patch, for reading patched files (load_tables --patch)
+_patches: dict[str, FilePatch] = {}
+
+
+def write_fixed(file_path: Path, text: str | Iterable[str], backup: bool = False) -> None:
+    """
+    Write a fixer's output for file_path, or add it to the patch when --patch is on.
+
+    text is the new content, or its pieces, which are then written one by one.
+    backup first copies the file to <file>.bak; not in patch mode, which
+    leaves the file alone.
+    """
+    if _writer is not None:
+        _writer.add(file_path, text if isinstance(text, str) else "".join(text))
+        return
+    if backup:
+        backup_path = file_path.with_suffix(file_path.suffix + ".bak")
+        backup_path.write_bytes(file_path.read_bytes())
+    if isinstance(text, str):
+        write_text(file_path, text)
+    else:
+        with open_output(file_path) as fout:
+            timed_writer(fout).writelines(text)
+
+
+def read_patch(patch_path: Path) -> Iterator[FilePatch]:
+    """The per-file patches of a patch file, in order."""
+    current: FilePatch | None = None
+    with patch_path.open(encoding="utf-8") as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "file" in record:
+                if current is not None:
+                    yield current
+                current = FilePatch(Path(record["file"]), record["size"], [])
+            elif current is None:
+                raise PatchError(f"Entry before the first file line in '{patch_path}'")
+            else:
+                current.entries.append(PatchEntry(**record))
+    if current is not None:
+        yield current
+
+
+def _check_sizes(patch: FilePatch, size: int) -> None:
+    if size != patch.size:
+        raise PatchError(f"'{patch.file}' is {size} bytes, the patch was made for {patch.size}")
+
+
+def iter_patched_lines(file_path: Path, patch: FilePatch) -> Iterator[str]:
+    """
+    Lines of file_path with the patch applied, read in one pass.
+
+    Each old span is checked against its hash as it is passed; PatchError is
+    raised on the first one that does not match.
+    """
+    entries = patch.entries
+    i = 0
+    pos = 0
+    skip_to = -1
+    old: list[bytes] = []
+    out: list[bytes] = []
+    with open_input_binary(file_path) as fin:
+        for line in fin:
+            line_start = pos
+            pos += len(line)
+            cursor = line_start
+            while cursor < pos:
+                if skip_to > cursor:
+                    # Inside an old span: collect it for the hash check
+                    old.append(line[cursor - line_start:min(skip_to, pos) - line_start])
+                    cursor = min(skip_to, pos)
+                    if cursor == skip_to:
+                        entry = entries[i - 1]
+                        if span_hash(b"".join(old)) != entry.hash:
+                            raise PatchError(f"'{file_path}' differs from the patch at byte {entry.span[0]}")
+                        old = []
+                    continue
+                if i < len(entries) and entries[i].span[0] < pos:
+                    start, skip_to = entries[i].span
+                    out.append(line[cursor - line_start:start - line_start])
+                    out.append(entries[i].text.encode("utf-8"))
+                    i += 1
+                    cursor = start
+                    if start == skip_to:
+                        skip_to = -1
+                    continue
+                out.append(line[cursor - line_start:])
+                cursor = pos
+            if out and out[-1].endswith(b"\n"):
+                yield b"".join(out).decode("utf-8")
+                out = []
+    # Insertions at the end of the file (e.g. a newline after the last statement)
+    while i < len(entries) and entries[i].span == (pos, pos):
+        out.append(entries[i].text.encode("utf-8"))
+        i += 1
+    if skip_to > pos or i < len(entries):
+        raise PatchError(f"'{file_path}' ends before the last patched span")
+    _check_sizes(patch, pos)
+    if out:
+        yield b"".join(out).decode("utf-8")
+
+
+def _copy(src: BinaryIO, dst: BinaryIO, nbytes: int) -> None:
+    while nbytes > 0:
+        chunk = src.read(min(nbytes, _COPY_CHUNK))
+        if not chunk:
+            raise PatchError("File ended while copying")
+        dst.write(chunk)
+        nbytes -= len(chunk)
+
+
+def _check_spans(fd: int, file_path: Path, patch: FilePatch) -> None:
+    _check_sizes(patch, os.fstat(fd).st_size)
+    for entry in patch.entries:
+        start, end = entry.span
+        if span_hash(os.pread(fd, end - start, start)) != entry.hash:
+            raise PatchError(f"'{file_path}' differs from the patch at byte {start}")
+
+
+def check_patch(file_path: Path, patch: FilePatch) -> None:
+    """
+    Raise PatchError if file_path does not match its patch, without changing it.
+
+    Plain files are checked with positioned reads of the old spans; compressed
+    files are read through once.
+    """
+    if compression_of(file_path) is None:
+        with file_path.open("rb") as f:
+            _check_spans(f.fileno(), file_path, patch)
+    else:
+        for _ in iter_patched_lines(file_path, patch):
+            pass
+
+
+def _patch_in_place(file_path: Path, patch: FilePatch) -> None:
+    with file_path.open("r+b") as f:
+        fd = f.fileno()
+        _check_spans(fd, file_path, patch)
+
+        new = [entry.text.encode("utf-8") for entry in patch.entries]
+        first = next(
+            (k for k, entry in enumerate(patch.entries) if len(new[k]) != entry.end - entry.start),
+            len(new),
+        )
+        for entry, text in zip(patch.entries[:first], new[:first]):
+            os.pwrite(fd, text, entry.span[0])
+        if first == len(new):
+            return
+
+        # From here on the content moves: spool the tail once and write it back patched
+        tail_start = patch.entries[first].span[0]
+        with tempfile.TemporaryFile() as spool:
+            f.seek(tail_start)
+            shutil.copyfileobj(f, spool, _COPY_CHUNK)
+            spool.seek(0)
+            f.seek(tail_start)
+            pos = tail_start
+            for entry, text in zip(patch.entries[first:], new[first:]):
+                start, end = entry.span
+                _copy(spool, f, start - pos)
+                spool.seek(end - start, os.SEEK_CUR)
+                f.write(text)
+                pos = end
+            shutil.copyfileobj(spool, f, _COPY_CHUNK)
+            f.truncate()
+
+
+def _rewrite(file_path: Path, patch: FilePatch) -> None:
+    # Same extension, so the temporary file gets the same compression
+    tmp_path = file_path.with_name("patching_" + file_path.name)
+    try:
+        with open_output(tmp_path) as fout:
+            fout.writelines(iter_patched_lines(file_path, patch))
+        os.replace(tmp_path, file_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def apply_patch(file_path: Path, patch: FilePatch) -> None:
+    """Apply a file's patch to file_path: positioned writes for plain files, a rewrite for compressed ones."""
+    with stage("apply", nbytes=sum(len(e.text) for e in patch.entries), rows=len(patch.entries)):
+        if compression_of(file_path) is None:
+            _patch_in_place(file_path, patch)
+        else:
+            _rewrite(file_path, patch)
+
+
+def add_patch_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--patch",
+        type=Path,
+        help=(
+            "Write the fixed values to this patch file instead of rewriting the table files "
+            "(apply it with dump_patch.py or load_tables.py --patch). Tables extracted from a "
+            "pg_dump -Fd directory are still written directly."
+        ),
+    )
+
+
+def start_patch(args: argparse.Namespace) -> None:
+    """Send write_fixed() to a patch file if --patch was given."""
+    global _writer
+    if args.patch:
+        _writer = PatchWriter(args.patch)
+
+
+def finish_patch(args: argparse.Namespace) -> None:
+    global _writer
+    writer, _writer = _writer, None
+    if writer is None:
+        return
+    writer.close()
+    print(f"Wrote {writer.entries} changes to {writer.files} files to patch '{writer.path}'")
+
+
+def use_patch(patch_path: Path) -> None:
+    """Read table files through patch_path from now on (see file_statements)."""
+    _patches.clear()
+    for patch in read_patch(patch_path):
+        _patches[patch.file.name] = patch
+
+
+def check_patches(directory: Path) -> None:
+    """Check every file of directory that the use_patch() patch covers; raises PatchError on the first mismatch."""
+    for name, patch in _patches.items():
+        file_path = directory / name
+        if file_path.exists():
+            check_patch(file_path, patch)
+
+
+def file_statements(file_path: Path) -> Iterator[str]:
+    """iter_file_statements, with the patch from use_patch() applied to files it covers."""
+    patch = _patches.get(file_path.name)
+    if patch is None:
+        return iter_file_statements(file_path)
+    return iter_statements(iter_patched_lines(file_path, patch))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Apply a patch file written by the JSON fixers' --patch option to the table files.",
+    )
+    parser.add_argument(
+        "patch",
+        type=Path,
+        help="Patch file to apply.",
+    )
+    parser.add_argument(
+        "--dir",
+        type=Path,
+        help="Directory with the table files (default: the paths recorded in the patch).",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only check that the patch matches the files.",
+    )
+    add_stats_args(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "dump_patch")
+
+    if not args.patch.exists():
+        print(f"Error: Patch file not found: {args.patch}")
+        return
+
+    print(f"Applying '{args.patch}'...")
+    targets: list[tuple[Path, FilePatch]] = []
+    try:
+        for patch in read_patch(args.patch):
+            file_path = args.dir / patch.file.name if args.dir else patch.file
+            if not file_path.exists():
+                print(f"Error: File not found: {file_path}")
+                return
+            targets.append((file_path, patch))
+        # Check every file before the first write, so a mismatch leaves all of them unpatched
+        for file_path, patch in targets:
+            check_patch(file_path, patch)
+        if not args.check:
+            for file_path, patch in targets:
+                apply_patch(file_path, patch)
+    except PatchError as e:
+        print(f"Error: {e}")
+        return
+    for file_path, patch in targets:
+        print(f"  {file_path.name}: {len(patch.entries)} changes")
+
+    verb = "Checked" if args.check else "Applied"
+    print(f"\n{verb} {sum(len(p.entries) for _, p in targets)} changes to {len(targets)} files")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Profiling hooks for the dump tools (--profile / --time-function).
+
+Hot-path functions (the statement tokenizer, value splitters, the fixers'
+fix_json_value, escape_value, ...) are marked with @hot_path where they are
+defined. The decorator only records the function and returns it as-is, so
+marked code runs exactly as before until a hook is installed. Installing
+one replaces the function wherever a loaded module holds it as a global,
+which is where every call site looks it up.
+
+--profile DIR traces the hot paths with cProfile, enabling the profiler
+only while one of them runs (--profile-scope all traces the whole run),
+and samples the stacks of all threads every --profile-interval ms. It
+writes
+  DIR/<tool>.pstats      for python -m pstats, snakeviz, ...
+  DIR/<tool>.collapsed   "frame;frame;frame count" lines for flamegraph.pl
+                         or speedscope; in hot scope only samples taken
+                         inside a hot path are kept.
+
+--time-function NAME wraps the hot paths whose qualified name starts with
+NAME in a dump_stats stage called "fn:<name>", so their calls and
+exclusive wall/CPU time appear in the --stats report (implied).
+
+Generator functions are timed and profiled per step, not per call.
+Worker processes (pg_dump -Fd extraction) are not profiled.
+"""
+import argparse
+import cProfile
+import functools
+import inspect
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+import dump_stats
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# "module.qualname" -> function, for every @hot_path
+HOT_PATHS: dict[str, Callable[..., Any]] = {}
+
+
+def hot_path(func: F) -> F:
+    """Mark a function as a hot path. Returns it unchanged."""
+    module = func.__module__
+    if module == "__main__":
+        module = Path(func.__code__.co_filename).stem
+    HOT_PATHS[f"{module}.{func.__qualname__}"] = func
+    return func
+
+
+def _wrap(func: Callable[..., Any], enter: Callable[[], Any], leave: Callable[[Any], None]) -> Callable[..., Any]:
+    """func with enter() before and leave(token) after every call, or every step of a generator."""
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+            gen = func(*args, **kwargs)
+            while True:
+                token = enter()
+                try:
+                    item = next(gen)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    leave(token)
+                yield item
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = enter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            leave(token)
+    return wrapper
+
+
+def _install(name: str, replacement: Callable[..., Any]) -> None:
+    """Replace the hot path `name` in the globals of every loaded module that holds it."""
+    original = HOT_PATHS[name]
+    current = getattr(original, "_dump_profile_current", original)
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, "__dict__", None)
+        if not namespace:
+            continue
+        for attr, value in list(namespace.items()):
+            if value is current:
+                namespace[attr] = replacement
+    original._dump_profile_current = replacement  # type: ignore[attr-defined]
+
+
+def time_functions(prefixes: list[str]) -> list[str]:
+    """Time the hot paths matching any prefix ("all" for every one) as dump_stats stages. Returns their names."""
+    names = [
+        name for name in HOT_PATHS
+        if "all" in prefixes or any(name.startswith(p) or name.split(".", 1)[1].startswith(p) for p in prefixes)
+    ]
+    for name in names:
+        func = getattr(HOT_PATHS[name], "_dump_profile_current", HOT_PATHS[name])
+        stage_name = f"fn:{name}"
+        _install(name, _wrap(func, lambda stage_name=stage_name: dump_stats._begin(),
+                             lambda started, stage_name=stage_name: dump_stats._end(stage_name, started)))
+    return names
+
+
+class Profiler:
+    """cProfile limited to the hot paths (or the whole run) plus a stack sampler."""
+
+    def __init__(self, scope: str, interval: float) -> None:
+        self.scope = scope
+        self.interval = interval
+        self.profile = cProfile.Profile()
+        self.samples: Counter[str] = Counter()
+        self._depth = threading.local()
+        self._hot_codes = {inspect.unwrap(f).__code__ for f in HOT_PATHS.values()}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        if self.scope == "all":
+            self.profile.enable()
+        else:
+            for name, func in HOT_PATHS.items():
+                _install(name, _wrap(getattr(func, "_dump_profile_current", func), self._enter, self._leave))
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+        if self.scope == "all":
+            self.profile.disable()
+
+    def _enter(self) -> None:
+        # cProfile traces only the thread that enabled it, and nested hot paths enable it once
+        depth = getattr(self._depth, "value", 0)
+        self._depth.value = depth + 1
+        if depth == 0:
+            self.profile.enable()
+
+    def _leave(self, _: None) -> None:
+        self._depth.value -= 1
+        if self._depth.value == 0:
+            self.profile.disable()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                hot = self.scope == "all"
+                while frame is not None:
+                    code = frame.f_code
+                    frame = frame.f_back
+                    if code.co_filename == __file__:
+                        continue  # the hook wrappers
+                    hot = hot or code in self._hot_codes
+                    stack.append(f"{Path(code.co_filename).stem}:{getattr(code, 'co_qualname', code.co_name)}")
+                if hot:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, output_dir: Path, tool: str) -> tuple[Path, Path]:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        pstats_file = output_dir / f"{tool}.pstats"
+        collapsed_file = output_dir / f"{tool}.collapsed"
+        self.profile.dump_stats(str(pstats_file))
+        with collapsed_file.open("w", encoding="utf-8") as fout:
+            for stack, count in self.samples.most_common():
+                fout.write(f"{stack} {count}\n")
+        return pstats_file, collapsed_file
+
+
+_profiler: Profiler | None = None
+
+
+def add_profile_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="DIR",
+        help="Profile the run and write <tool>.pstats and <tool>.collapsed (flamegraph stacks) to DIR.",
+    )
+    parser.add_argument(
+        "--profile-scope",
+        choices=["hot", "all"],
+        default="hot",
+        help="Trace only the hot-path functions (default) or the whole run.",
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=5.0,
+        help="Milliseconds between stack samples for the collapsed stacks (default: 5).",
+    )
+    parser.add_argument(
+        "--time-function",
+        action="append",
+        metavar="NAME",
+        help="Report calls and time of the hot paths starting with NAME ('all' for every one) with --stats; repeatable.",
+    )
+
+
+def start_profile(args: argparse.Namespace, tool: str) -> None:
+    """Install the hooks requested on the command line. Call after start_stats()."""
+    global _profiler
+    if args.time_function:
+        if not dump_stats.enabled():
+            args.stats = True
+            dump_stats.start_stats(args, tool)
+        names = time_functions(args.time_function)
+        if not names:
+            print(f"Warning: no hot path matches {', '.join(args.time_function)}", file=sys.stderr)
+    if args.profile:
+        _profiler = Profiler(args.profile_scope, args.profile_interval / 1000)
+        _profiler.start()
+
+
+def finish_profile(args: argparse.Namespace, tool: str) -> None:
+    """Stop profiling and write the profile files."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+    profiler.stop()
+    pstats_file, collapsed_file = profiler.write(args.profile, tool)
+    print(f"Wrote profile to '{pstats_file}' and '{collapsed_file}'", file=sys.stderr)
@@ -0,0 +1,266 @@
+"""
+Live progress and ETA for the long-running dump tools (--progress).
+
+Progress is measured as a byte position in the tool's input: bytes of
+inputs already finished plus the position inside the current one. A
+reporter thread samples that position every --progress-interval seconds
+and hands a ProgressUpdate to a callback; the command-line default prints
+throughput and an ETA to stderr.
+
+The hot loops pay (almost) nothing for this:
+
+    with open_input(path) as fin, follow(fin):
+        for line in fin: ...            # position is the file offset, read by the reporter
+
+    with tracking(nbytes, len(lines)) as tracker:
+        for i, line in enumerate(lines):
+            tracker.position = i        # one attribute store per step
+
+follow() reads the offset of the file under the stream with lseek() from
+the reporter thread, so streaming loops are not touched at all; for
+compressed input that is the offset in the compressed file, which is what
+the file size is measured in. tracking() is for work on data already in
+memory or mapped, where the loop stores its position itself, in any unit
+(characters, lines, ...) scaled to nbytes.
+
+Only the outermost source counts: a follow() or tracking() opened while
+another one is active is ignored, so a fixer tracking its repair pass can
+call helpers that stream files without counting those bytes twice. When no
+reporter is running both are no-ops.
+
+Programmatic use:
+
+    dump_progress.start(lambda update: print(update.fraction), interval=1.0)
+    expect(total_bytes)      # optional: total of all inputs, for an overall ETA
+    ...
+    dump_progress.stop()
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, TextIO
+
+from dump_io import input_fileno
+
+
+@dataclass
+class ProgressUpdate:
+    label: str
+    position: int
+    total: int | None
+    elapsed: float
+    bytes_per_second: float
+    final: bool = False
+
+    @property
+    def fraction(self) -> float | None:
+        if not self.total:
+            return None
+        return min(1.0, self.position / self.total)
+
+    @property
+    def eta_seconds(self) -> float | None:
+        if not self.total or self.bytes_per_second <= 0:
+            return None
+        return max(0.0, self.total - self.position) / self.bytes_per_second
+
+
+class Tracker:
+    """Position of a tracking() source, stored by the loop that owns it."""
+
+    __slots__ = ("position",)
+
+    def __init__(self) -> None:
+        self.position = 0
+
+
+class _Source:
+    def __init__(self, nbytes: int, position: Callable[[], int]) -> None:
+        self.nbytes = nbytes
+        self.position = position
+
+
+class _Reporter:
+    def __init__(self, callback: Callable[[ProgressUpdate], None], interval: float, label: str) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.label = label
+        self.expected: int | None = None
+        self.done = 0
+        self.source: _Source | None = None
+        self.started = time.perf_counter()
+        self._last_time = self.started
+        self._last_position = 0
+        self._rate = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def position(self) -> tuple[int, int | None]:
+        """(bytes processed, total bytes or None) right now."""
+        done = self.done
+        source = self.source
+        if source is None:
+            return done, self.expected if self.expected is not None else (done or None)
+        try:
+            current = min(source.position(), source.nbytes)
+        except (OSError, ValueError):
+            current = 0
+        if self.expected is not None:
+            return done + current, self.expected
+        return done + current, done + source.nbytes
+
+    def update(self, final: bool = False) -> ProgressUpdate:
+        now = time.perf_counter()
+        position, total = self.position()
+        if now > self._last_time:
+            recent = (position - self._last_position) / (now - self._last_time)
+            # Smooth the rate so the ETA does not jump with every sample
+            self._rate = recent if self._rate == 0 else 0.3 * recent + 0.7 * self._rate
+        self._last_time = now
+        self._last_position = position
+        elapsed = now - self.started
+        rate = position / elapsed if final and elapsed > 0 else self._rate
+        return ProgressUpdate(self.label, position, total, elapsed, rate, final)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.callback(self.update())
+
+
+_reporter: _Reporter | None = None
+_NO_TRACKER = Tracker()
+
+
+def active() -> bool:
+    return _reporter is not None
+
+
+def start(callback: Callable[[ProgressUpdate], None], interval: float = 2.0, label: str = "") -> None:
+    """Start reporting progress to callback every `interval` seconds on a background thread."""
+    global _reporter
+    stop()
+    _reporter = _Reporter(callback, interval, label)
+    _reporter._thread.start()
+
+
+def stop() -> None:
+    """Stop the reporter; the callback gets one last update with final=True."""
+    global _reporter
+    reporter, _reporter = _reporter, None
+    if reporter is None:
+        return
+    reporter._stop.set()
+    reporter._thread.join()
+    reporter.source = None
+    reporter.callback(reporter.update(final=True))
+
+
+def expect(nbytes: int) -> None:
+    """Add nbytes to the expected total of the run; without it the total is the current input's size."""
+    if _reporter is not None:
+        _reporter.expected = (_reporter.expected or 0) + nbytes
+
+
+@contextmanager
+def _source(nbytes: int, position: Callable[[], int]) -> Iterator[None]:
+    reporter = _reporter
+    if reporter is None or reporter.source is not None:
+        yield
+        return
+    reporter.source = _Source(nbytes, position)
+    try:
+        yield
+    finally:
+        reporter.done += nbytes
+        reporter.source = None
+
+
+@contextmanager
+def follow(stream: TextIO) -> Iterator[None]:
+    """
+    Count a stream from dump_io.open_input as the current input while the block runs.
+
+    Leave the block before the stream is closed. Streams that are not a
+    seekable file on disk (stdin, pipes) are not counted.
+    """
+    fd = input_fileno(stream) if _reporter is not None else None
+    if fd is None:
+        yield
+        return
+    try:
+        position = os.lseek(fd, 0, os.SEEK_CUR)
+        size = os.fstat(fd).st_size
+    except OSError:
+        yield
+        return
+    with _source(size - position, lambda: os.lseek(fd, 0, os.SEEK_CUR) - position):
+        yield
+
+
+@contextmanager
+def tracking(nbytes: int, length: int | None = None) -> Iterator[Tracker]:
+    """
+    Count nbytes of in-memory work; the caller stores its progress in tracker.position.
+
+    position runs from 0 to length (default: nbytes), in whatever unit the
+    loop has at hand, and is scaled to bytes when sampled.
+    """
+    if _reporter is None or _reporter.source is not None:
+        yield _NO_TRACKER
+        return
+    tracker = Tracker()
+    scale = nbytes / length if length else 1.0
+    with _source(nbytes, lambda: int(tracker.position * scale)):
+        yield tracker
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def print_update(update: ProgressUpdate, fout: TextIO | None = None) -> None:
+    """The default callback: one status line on stderr."""
+    fout = fout or sys.stderr
+    mb = update.position / (1 << 20)
+    text = f"[{update.label}] {mb:,.1f}"
+    if update.total:
+        text += f"/{update.total / (1 << 20):,.1f} MB ({update.fraction * 100:.1f}%)"
+    else:
+        text += " MB"
+    text += f", {update.bytes_per_second / (1 << 20):.1f} MB/s"
+    if update.final:
+        text += f", done in {_format_seconds(update.elapsed)}"
+    elif update.eta_seconds is not None:
+        text += f", ETA {_format_seconds(update.eta_seconds)}"
+    fout.write(text + "\n")
+    fout.flush()
+
+
+def add_progress_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Print bytes processed, throughput and an ETA to stderr while running.",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between progress lines (default: 2).",
+    )
+
+
+def start_progress(args: argparse.Namespace, tool: str) -> None:
+    """Start the stderr reporter if --progress was given."""
+    if args.progress:
+        start(print_update, max(0.1, args.progress_interval), tool)
+
+
+def finish_progress(args: argparse.Namespace) -> None:
+    if args.progress:
+        stop()
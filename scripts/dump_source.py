@@ -0,0 +1,87 @@
+"""
+Resolve any dump input to a directory of per-table INSERT files.
+
+The row-level tools (diff, delta, subset, merge) work table by table. They
+accept a backup_plain_tables-style directory (or a row_store.py directory
+of .rows files) as-is; a plain or compressed
+dump file (INSERT or COPY format, or a pg_dump -Fc archive) is streamed
+once into per-table files, and a pg_dump -Fd directory is split in parallel.
+"""
+from contextlib import ExitStack
+from pathlib import Path
+from typing import TextIO
+
+from convert_copy_to_insert import iter_plain_lines
+from dump_io import is_stdio, open_input, open_output, sql_stem, table_chunk_map, table_file_map
+from dump_stats import timed_iter, timed_writer
+from pg_archive import is_directory_archive
+from row_store import store_file_map
+from split_by_table import split_directory_archive
+from sql_statements import iter_statements, parse_insert_head
+
+
+def stream_split(input_path: Path, output_dir: Path, prefix: str = "table_") -> dict[str, int]:
+    """
+    Split a dump into table_<name>.sql files in one streaming pass.
+
+    Unlike split_by_table.split_file nothing is buffered in memory: each
+    statement goes straight to its table's file. Non-INSERT statements go to
+    <prefix>schema.sql. Returns rows written per table.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rows: dict[str, int] = {}
+
+    with ExitStack() as stack:
+        fin = stack.enter_context(open_input(input_path))
+        schema = stack.enter_context((output_dir / f"{prefix}schema.sql").open("w", encoding="utf-8"))
+        outputs: dict[str, TextIO] = {}
+
+        for statement in timed_iter(iter_statements(iter_plain_lines(timed_iter(fin, "read"))), "tokenize"):
+            head = parse_insert_head(statement)
+            if head is None:
+                schema.write(statement + "\n")
+                continue
+
+            table = head[0]
+            fout = outputs.get(table)
+            if fout is None:
+                fout = timed_writer(stack.enter_context(open_output(output_dir / f"{prefix}{table}.sql")))
+                outputs[table] = fout
+                rows[table] = 0
+            fout.write(statement + "\n")
+            rows[table] += 1
+
+    return rows
+
+
+def table_files(directory: Path) -> dict[str, Path]:
+    """Map table name -> table file, preferring a parsed .rows store over table_<name>.sql."""
+    return {**table_file_map(directory), **store_file_map(directory)}
+
+
+def table_chunks(directory: Path) -> dict[str, list[Path]]:
+    """Like table_files, but map each table to all its files, so tables split into chunks are read too."""
+    return {**table_chunk_map(directory), **{table: [path] for table, path in store_file_map(directory).items()}}
+
+
+def resolve_table_dir(path: Path, work_dir: Path, jobs: int = 1) -> Path:
+    """
+    Return a directory of table_<name>.sql files (plus table_schema.sql) for `path`.
+
+    Extracted copies are written below work_dir, which the caller owns.
+    Raises ValueError for a directory with no table files, or with tables
+    split into chunks (split_by_table.py --max-chunk-*).
+    """
+    if not is_stdio(path) and path.is_dir():
+        if is_directory_archive(path):
+            output_dir = work_dir / f"{path.name}_tables"
+            split_directory_archive(path, output_dir, jobs=jobs)
+            return output_dir
+        if not table_files(path):
+            raise ValueError(f"No table_*.sql or table_*.rows files in '{path}'")
+        return path
+
+    name = "stdin" if is_stdio(path) else sql_stem(path)
+    output_dir = work_dir / f"{name}_tables"
+    stream_split(path, output_dir)
+    return output_dir
@@ -0,0 +1,356 @@
+"""
+Per-stage metrics for the dump tools (--stats / --stats-json).
+
+One process-wide collector records, per named stage (read, tokenize,
+json_parse, repair, serialize, write, ...), the number of calls, wall and
+CPU time, and the bytes and rows that went through it, plus counters such
+as json_parsed / json_repaired and the peak RSS of the run. Tools report
+through the module functions, so code deep inside a fixer needs no extra
+argument:
+
+    with stage("repair"):
+        ...
+    add("read", nbytes=len(data))
+    count("json_repaired")
+
+Until a tool's main() enables the collector with start_stats(), stage()
+hands out a shared no-op context manager and the wrappers return their
+argument unchanged, so instrumented code costs a flag check at most.
+
+Stage times are exclusive: while a stage runs inside another (say a
+json_parse inside a repair, or a read pulled by a tokenizing iterator),
+the time is counted for the inner stage only, so the stages of one thread
+add up to at most its total. CPU time is that of the calling thread.
+Worker processes collect into their own collector: run the task through
+run_collected() and pass what it returns to merge_collected() in the
+parent.
+"""
+import argparse
+import contextlib
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class _Stage:
+    __slots__ = ("calls", "wall", "cpu", "bytes", "rows")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes = 0
+        self.rows = 0
+
+
+class Stats:
+    """Accumulated stage timings and counters for one process."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.tool = ""
+        self.stages: dict[str, _Stage] = {}
+        self.counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._started_wall = 0.0
+        self._started_cpu = 0.0
+
+    def start(self, tool: str) -> None:
+        self.enabled = True
+        self.tool = tool
+        self.stages.clear()
+        self.counters.clear()
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+    def _entry(self, name: str) -> _Stage:
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages.setdefault(name, _Stage())
+        return entry
+
+    def record(self, name: str, wall: float = 0.0, cpu: float = 0.0, nbytes: int = 0, rows: int = 0, calls: int = 1) -> None:
+        with self._lock:
+            entry = self._entry(name)
+            entry.calls += calls
+            entry.wall += wall
+            entry.cpu += cpu
+            entry.bytes += nbytes
+            entry.rows += rows
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> dict[str, Any]:
+        """Stages and counters as plain data, e.g. to send back from a worker process."""
+        with self._lock:
+            return {
+                "stages": {
+                    name: [s.calls, s.wall, s.cpu, s.bytes, s.rows] for name, s in self.stages.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot: dict[str, Any]) -> None:
+        for name, (calls, wall, cpu, nbytes, rows) in snapshot["stages"].items():
+            self.record(name, wall, cpu, nbytes, rows, calls)
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+
+    def report(self) -> dict[str, Any]:
+        """The JSON-ready report of everything recorded since start()."""
+        stages = {}
+        for name, s in self.stages.items():
+            stages[name] = {
+                "calls": s.calls,
+                "wall_seconds": s.wall,
+                "cpu_seconds": s.cpu,
+                "bytes": s.bytes,
+                "rows": s.rows,
+                "bytes_per_second": s.bytes / s.wall if s.wall > 0 else None,
+                "rows_per_second": s.rows / s.wall if s.wall > 0 else None,
+            }
+        return {
+            "tool": self.tool,
+            "wall_seconds": time.perf_counter() - self._started_wall,
+            "cpu_seconds": time.process_time() - self._started_cpu,
+            "peak_rss_bytes": peak_rss(),
+            "stages": stages,
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+
+_collector = Stats()
+_NO_STAGE = contextlib.nullcontext()
+_local = threading.local()
+
+
+def enabled() -> bool:
+    return _collector.enabled
+
+
+def _begin() -> tuple[float, float]:
+    """Open a timed section on this thread; returns its (wall, cpu) start."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append([0.0, 0.0])
+    return time.perf_counter(), time.thread_time()
+
+
+def _end(name: str, started: tuple[float, float], nbytes: int = 0, rows: int = 0) -> None:
+    """Close the innermost section and record its time minus that of the sections nested in it."""
+    wall = time.perf_counter() - started[0]
+    cpu = time.thread_time() - started[1]
+    stack = _local.stack
+    nested_wall, nested_cpu = stack.pop()
+    if stack:
+        stack[-1][0] += wall
+        stack[-1][1] += cpu
+    _collector.record(name, wall - nested_wall, cpu - nested_cpu, nbytes, rows)
+
+
+@contextlib.contextmanager
+def _timed_stage(name: str, nbytes: int, rows: int) -> Iterator[None]:
+    started = _begin()
+    try:
+        yield
+    finally:
+        _end(name, started, nbytes, rows)
+
+
+def stage(name: str, nbytes: int = 0, rows: int = 0) -> contextlib.AbstractContextManager:
+    """Time the body of a with block as one call of `name`."""
+    if not _collector.enabled:
+        return _NO_STAGE
+    return _timed_stage(name, nbytes, rows)
+
+
+def add(name: str, nbytes: int = 0, rows: int = 0) -> None:
+    """Credit bytes and rows to a stage without timing anything."""
+    if _collector.enabled:
+        _collector.record(name, nbytes=nbytes, rows=rows, calls=0)
+
+
+def count(name: str, n: int = 1) -> None:
+    if _collector.enabled:
+        _collector.count(name, n)
+
+
+def timed_iter(items: Iterable, name: str) -> Iterable:
+    """
+    Time every step of an iterator as stage `name`, counting items as rows and their len() as bytes.
+
+    Returns `items` unchanged when stats are off.
+    """
+    if not _collector.enabled:
+        return items
+    return _timed_iter(iter(items), name)
+
+
+def _timed_iter(items: Iterator, name: str) -> Iterator:
+    while True:
+        started = _begin()
+        try:
+            item = next(items)
+        except StopIteration:
+            _end(name, started)
+            return
+        except BaseException:
+            _end(name, started)
+            raise
+        _end(name, started, len(item), 1)
+        yield item
+
+
+class _TimedWriter:
+    """A file proxy that times write() and writelines() as one stage."""
+
+    def __init__(self, fout: TextIO, name: str) -> None:
+        self._fout = fout
+        self._name = name
+
+    def write(self, text) -> int:
+        started = _begin()
+        try:
+            return self._fout.write(text)
+        finally:
+            _end(self._name, started, len(text))
+
+    def writelines(self, lines: Iterable) -> None:
+        for line in lines:
+            self.write(line)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._fout, attr)
+
+
+def timed_writer(fout: TextIO, name: str = "write") -> TextIO:
+    """Wrap a file so its writes are timed as stage `name`; returns fout itself when stats are off."""
+    if not _collector.enabled:
+        return fout
+    return _TimedWriter(fout, name)  # type: ignore[return-value]
+
+
+def parse_json(text: str | bytes) -> Any:
+    """json.loads, timed as json_parse and counted as json_parsed."""
+    if not _collector.enabled:
+        return json.loads(text)
+    _collector.count("json_parsed")
+    started = _begin()
+    try:
+        return json.loads(text)
+    finally:
+        _end("json_parse", started, len(text), 1)
+
+
+def serialize_json(value: Any) -> str:
+    """
+    json.dumps(value, ensure_ascii=False) for a repaired value, timed as serialize.
+
+    The fixers re-serialize exactly the values they repair, so each call is
+    also counted as json_repaired.
+    """
+    if not _collector.enabled:
+        return json.dumps(value, ensure_ascii=False)
+    _collector.count("json_repaired")
+    started = _begin()
+    text = json.dumps(value, ensure_ascii=False)
+    _end("serialize", started, len(text), 1)
+    return text
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size in bytes of this process or its largest finished child, if known."""
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_collected(collect: bool, func: Callable[..., Any], *args: Any) -> tuple[Any, dict[str, Any] | None]:
+    """
+    Run func(*args) in a worker process, collecting stats when `collect` is set.
+
+    Returns (result, snapshot); hand the pair to merge_collected() in the parent.
+    """
+    if not collect:
+        return func(*args), None
+    _collector.start(_collector.tool)
+    try:
+        return func(*args), _collector.snapshot()
+    finally:
+        _collector.enabled = False
+
+
+def merge_collected(result: tuple[Any, dict[str, Any] | None]) -> Any:
+    """Fold a worker's stats into this process and return the worker's result."""
+    value, snapshot = result
+    if snapshot is not None:
+        _collector.merge(snapshot)
+    return value
+
+
+def add_stats_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-stage timings, throughput, JSON counts and peak RSS to stderr when done.",
+    )
+    parser.add_argument(
+        "--stats-json",
+        type=Path,
+        help="Write the per-stage metrics as JSON to this file.",
+    )
+
+
+def start_stats(args: argparse.Namespace, tool: str) -> None:
+    """Enable the collector if --stats or --stats-json was given."""
+    if args.stats or args.stats_json:
+        _collector.start(tool)
+
+
+def finish_stats(args: argparse.Namespace) -> None:
+    """Print and/or write the report requested on the command line."""
+    if not _collector.enabled:
+        return
+    report = _collector.report()
+    if args.stats_json:
+        args.stats_json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.stats:
+        print_report(report, sys.stderr)
+
+
+def print_report(report: dict[str, Any], fout: TextIO) -> None:
+    rss = report["peak_rss_bytes"]
+    rss_text = f", peak RSS {rss / (1 << 20):.1f} MB" if rss is not None else ""
+    fout.write(
+        f"\nStats for {report['tool']}: {report['wall_seconds']:.3f}s wall, "
+        f"{report['cpu_seconds']:.3f}s CPU{rss_text}\n"
+    )
+    if report["stages"]:
+        width = max(14, *(len(name) for name in report["stages"]))
+        fout.write(f"  {'stage':<{width}} {'calls':>9} {'wall s':>9} {'cpu s':>9} {'MB':>9} {'MB/s':>9} {'rows':>10} {'rows/s':>10}\n")
+        for name, s in report["stages"].items():
+            mb = s["bytes"] / (1 << 20)
+            mb_per_s = f"{s['bytes_per_second'] / (1 << 20):.1f}" if s["bytes"] and s["bytes_per_second"] else "-"
+            rows_per_s = f"{s['rows_per_second']:.0f}" if s["rows"] and s["rows_per_second"] else "-"
+            fout.write(
+                f"  {name:<{width}} {s['calls']:>9} {s['wall_seconds']:>9.3f} {s['cpu_seconds']:>9.3f} "
+                f"{mb:>9.1f} {mb_per_s:>9} {s['rows']:>10} {rows_per_s:>10}\n"
+            )
+    for name, n in report["counters"].items():
+        fout.write(f"  {name}: {n}\n")
@@ -0,0 +1,133 @@
+"""
+One entry point for the dump tools:
+
+    python scripts/dumptool.py [shared options] COMMAND [VARIANT] [options] ...
+
+Each command runs the main() of the tool script it stands for, with the
+remaining arguments, so `dumptool split --help` shows that tool's options.
+A tool's modules are imported only when its command runs; `dumptool --help`
+and `dumptool fix` (which lists its variants) import nothing but argparse.
+
+The shared options (--jobs, --compress, --compress-threads, --stats,
+--stats-json, --progress, --progress-interval, --profile) may also be
+given before the command; they are passed on to the tool, which rejects
+the ones it does not support.
+"""
+import argparse
+import importlib
+import sys
+
+# command -> (module, help), or command -> {variant: (module, help)}
+COMMANDS: dict[str, tuple[str, str] | dict[str, tuple[str, str]]] = {
+    "convert": {
+        "to-insert": ("convert_copy_to_insert", "pg_dump text file with COPY blocks -> INSERT statements"),
+        "to-copy": ("convert_insert_to_copy", "table directory of INSERTs -> COPY stream, optionally loaded"),
+    },
+    "split": ("split_by_table", "split a dump into one file per table"),
+    "fix": {
+        "complete": ("fix_json_complete", "join multiline INSERTs and re-serialize every JSON value"),
+        "final": ("fix_json_final", "escape raw newlines in the JSON strings of every file"),
+        "in-sql": ("fix_json_in_sql", "repair JSON values of single-line INSERTs"),
+        "multiline": ("fix_json_multiline", "fix JSON in the multiline INSERTs of one file"),
+        "multiline-inserts": ("fix_json_multiline_inserts", "repair JSON values of multiline INSERTs"),
+        "remaining": ("fix_remaining_json_errors", "escape stray quotes in JSON values that still fail to parse"),
+    },
+    "validate": ("validate_json_in_sql", "check that every JSON value parses"),
+    "check-fk": ("check_fk_violations", "find rows whose foreign key has no parent row"),
+    "order": ("generate_insert_order", "print the FK-safe insert order of a table directory"),
+    "plan": ("plan_load", "schedule a parallel load of a table directory"),
+    "load": ("load_tables", "load a table directory into PostgreSQL in FK-safe batches"),
+    "diff": ("diff_dumps", "diff two dumps row by row into a delta script"),
+    "merge": ("merge_dumps", "merge dumps into one table directory, resolving key conflicts"),
+    "subset": ("subset_dump", "write the FK closure of some seed rows as a mini dump"),
+    "extract": ("extract_changes", "rows changed since a timestamp, with their FK parents"),
+    "store": ("row_store", "build or read a columnar row store of a table directory"),
+    "patch": ("dump_patch", "apply a patch file written by the fixers' --patch option"),
+}
+
+# dest -> option string, for the options that are passed on to the tool
+_SHARED = {
+    "jobs": "--jobs",
+    "compress": "--compress",
+    "compress_threads": "--compress-threads",
+    "stats": "--stats",
+    "stats_json": "--stats-json",
+    "progress": "--progress",
+    "progress_interval": "--progress-interval",
+    "profile": "--profile",
+}
+
+
+def _command_list() -> str:
+    lines = ["commands:"]
+    for command, entry in COMMANDS.items():
+        if isinstance(entry, dict):
+            lines.append(f"  {command} {{{','.join(entry)}}}")
+            for variant, (_, help_text) in entry.items():
+                lines.append(f"      {variant:<18} {help_text}")
+        else:
+            lines.append(f"  {command:<22} {entry[1]}")
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="dumptool",
+        description="Convert, split, fix, patch, validate, order and load PostgreSQL dumps.",
+        epilog=_command_list() + "\n\nRun 'dumptool COMMAND --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--jobs", "-j", type=int, help="Worker processes, for the commands that have them.")
+    parser.add_argument("--compress", choices=["gz", "zst"], help="Compress the output files.")
+    parser.add_argument("--compress-threads", type=int, help="Worker threads for compressing output.")
+    parser.add_argument("--stats", action="store_true", help="Print per-stage timings to stderr when done.")
+    parser.add_argument("--stats-json", help="Write the per-stage metrics as JSON to this file.")
+    parser.add_argument("--progress", action="store_true", help="Print progress and an ETA to stderr.")
+    parser.add_argument("--progress-interval", type=float, help="Seconds between progress lines.")
+    parser.add_argument("--profile", metavar="DIR", help="Write a profile of the run to DIR.")
+    parser.add_argument("command", choices=list(COMMANDS), metavar="COMMAND", help="One of the commands below.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def shared_argv(args: argparse.Namespace) -> list[str]:
+    """The shared options given before the command, as arguments for the tool."""
+    argv: list[str] = []
+    for dest, option in _SHARED.items():
+        value = getattr(args, dest)
+        if value is True:
+            argv.append(option)
+        elif value not in (None, False):
+            argv += [option, str(value)]
+    return argv
+
+
+def main() -> None:
+    args = parse_args()
+    entry = COMMANDS[args.command]
+    rest: list[str] = args.args
+    prog = f"dumptool {args.command}"
+
+    if isinstance(entry, dict):
+        if not rest or rest[0] not in entry:
+            if rest and not rest[0].startswith("-"):
+                print(f"Error: Unknown {args.command} variant: {rest[0]}")
+            print(f"usage: {prog} {{{','.join(entry)}}} ...\n")
+            for variant, (_, help_text) in entry.items():
+                print(f"  {variant:<18} {help_text}")
+            if rest and rest[0] not in ("-h", "--help"):
+                sys.exit(2)
+            return
+        module_name = entry[rest[0]][0]
+        prog += f" {rest[0]}"
+        rest = rest[1:]
+    else:
+        module_name = entry[0]
+
+    # The tools parse sys.argv; prog replaces the script name in their usage lines
+    sys.argv = [prog, *shared_argv(args), *rest]
+    importlib.import_module(module_name).main()
+
+
+if __name__ == "__main__":
+    main()
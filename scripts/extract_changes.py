@@ -0,0 +1,182 @@
+"""
+Extract the rows changed after a point in time as a small incremental restore set.
+
+A row is changed when any of its timestamp columns ("updatedAt", "createdAt"
+by default) is at or after --since. Tables without those columns contribute
+only the parent rows that changed rows reference, so the restore set never
+points at a parent the target database might be missing. Rows are written
+as INSERT ... ON CONFLICT DO UPDATE, so the set can be loaded over an
+existing database with load_tables.py.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from diff_dumps import upsert_statement
+from dump_io import is_stdio, sql_stem
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, start_stats
+from dump_source import resolve_table_dir, table_files as dump_table_files
+from row_selection import Selection, parent_closure, write_selection
+from schema_model import parse_schema
+from sql_statements import decode_literal
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Write the rows changed since a timestamp (plus their FK parents) as an incremental restore set.",
+    )
+    parser.add_argument(
+        "input",
+        type=Path,
+        help="Table directory, SQL dump (.gz/.zst, '-' for stdin) or pg_dump archive.",
+    )
+    parser.add_argument(
+        "output_dir",
+        type=Path,
+        nargs="?",
+        help="Directory for the restore set (default: <input>_since_<YYYYMMDDTHHMMSS>/).",
+    )
+    parser.add_argument(
+        "--since",
+        required=True,
+        type=datetime.fromisoformat,
+        help="Keep rows whose timestamp columns are at or after this ISO timestamp, e.g. '2026-01-20 00:00'.",
+    )
+    parser.add_argument(
+        "--timestamp-columns",
+        default="updatedAt,createdAt",
+        help="Comma-separated timestamp column names (default: updatedAt,createdAt).",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory for tables extracted from a dump file (default: system temp dir).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when the input is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive timestamps (timestamp without time zone) are treated as UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def parse_timestamp(token: str) -> datetime | None:
+    """Parse a raw SQL timestamp token ('2026-01-11 05:07:32.277562') as an aware datetime."""
+    text = decode_literal(token)
+    if text is None:
+        return None
+    try:
+        return _as_utc(datetime.fromisoformat(text))
+    except ValueError:
+        return None
+
+
+def changed_since(since: datetime, timestamp_columns: list[str]):
+    """Build a row predicate: true when any timestamp column is >= since."""
+    since = _as_utc(since)
+    wanted = {c.strip('"') for c in timestamp_columns}
+    positions_cache: dict[tuple[str, ...], list[int]] = {}
+
+    def predicate(table: str, columns: list[str], values: list[str]) -> bool:
+        key = tuple(columns)
+        positions = positions_cache.get(key)
+        if positions is None:
+            positions = positions_cache[key] = [i for i, c in enumerate(columns) if c.strip('"') in wanted]
+        for i in positions:
+            timestamp = parse_timestamp(values[i])
+            if timestamp is not None and timestamp >= since:
+                return True
+        return False
+
+    return predicate
+
+
+def extract_changes(
+    table_dir: Path,
+    output_dir: Path,
+    since: datetime,
+    timestamp_columns: list[str],
+    source_name: str,
+) -> tuple[dict[str, int], dict[str, int]]:
+    """
+    Write the changed rows and their FK-parent closure to output_dir.
+
+    Returns (rows written per table, changed rows per table); the difference
+    between the two is the parent rows pulled in by the closure.
+    """
+    schema_file = table_dir / "table_schema.sql"
+    model = parse_schema(schema_file)
+    table_files = dump_table_files(table_dir)
+
+    predicate = changed_since(since, timestamp_columns)
+    changed: dict[str, int] = {}
+
+    def seed(table: str, columns: list[str], values: list[str]) -> bool:
+        if predicate(table, columns, values):
+            changed[table] = changed.get(table, 0) + 1
+            return True
+        return False
+
+    selected: Selection = parent_closure(table_files, model, {}, seed)
+
+    def as_upsert(table: str, statement: str) -> str:
+        pk_columns = model.primary_keys.get(table)
+        return upsert_statement(statement, pk_columns) if pk_columns else statement + "\n"
+
+    written = write_selection(table_files, model, selected, output_dir, source_name, transform=as_upsert)
+    shutil.copyfile(schema_file, output_dir / "table_schema.sql")
+    return written, changed
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "extract_changes")
+    start_profile(args, "extract_changes")
+    input_path: Path = args.input
+
+    if not is_stdio(input_path) and not input_path.exists():
+        print(f"Error: Input '{input_path}' not found")
+        return
+
+    name = "stdin" if is_stdio(input_path) else (input_path.name if input_path.is_dir() else sql_stem(input_path))
+    output_dir: Path = args.output_dir or Path(f"{name}_since_{args.since.strftime('%Y%m%dT%H%M%S')}")
+    timestamp_columns = [c.strip() for c in args.timestamp_columns.split(",") if c.strip()]
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        try:
+            table_dir = resolve_table_dir(input_path, Path(tmp), args.jobs)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        if not (table_dir / "table_schema.sql").exists():
+            print(f"Error: Schema file not found: {table_dir / 'table_schema.sql'}")
+            return
+
+        print(f"Extracting rows changed since {args.since.isoformat()} from '{input_path}'...")
+        written, changed = extract_changes(table_dir, output_dir, args.since, timestamp_columns, name)
+
+    for table, rows in written.items():
+        parents = rows - changed.get(table, 0)
+        extra = f" (+{parents} FK parents)" if parents else ""
+        print(f"  table_{table}.sql: {changed.get(table, 0)} changed rows{extra}")
+    print(f"\nWrote {sum(written.values())} rows in {len(written)} table files to '{output_dir}'")
+    finish_profile(args, "extract_changes")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
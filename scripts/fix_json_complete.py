@@ -1,9 +1,19 @@
 """Complete fix for JSON in SQL files - handles multiline INSERT statements."""
 import argparse
 import json
+import os
 import re
+from functools import partial
 from pathlib import Path
 
+from dump_io import list_sql_files, read_text, sql_stem
+from dump_patch import add_patch_args, finish_patch, start_patch, write_fixed
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import add_progress_args, expect, finish_progress, start_progress, tracking
+from dump_stats import add_stats_args, finish_stats, parse_json, serialize_json, stage, start_stats
+from split_by_table import prepare_table_dir
+from sql_statements import SQL_LITERAL
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -12,171 +22,103 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "input_dir",
         type=Path,
-        help="Directory containing SQL files to fix.",
+        help="Directory containing SQL files to fix, or a pg_dump -Fd directory.",
     )
     parser.add_argument(
         "--backup",
         action="store_true",
         help="Create backup files before fixing.",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when input_dir is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    add_patch_args(parser)
     return parser.parse_args()
 
 
-def fix_json_value(value: str) -> str:
-    """Fix a single JSON value."""
-    if value.strip() == "NULL":
-        return value
-    
-    if not (value.startswith("'") and value.endswith("'")):
-        return value
-    
-    inner = value[1:-1].replace("''", "'")
-    
+@hot_path
+def repair_json_literal(inner: str) -> str | None:
+    """
+    Repair the body of a SQL literal ('' already unescaped) that holds JSON.
+
+    Returns the re-serialized JSON, or None if the body is not JSON or cannot
+    be parsed even with its raw newlines and tabs escaped.
+    """
     if not inner.strip().startswith(("{", "[")):
-        return value
+        return None
     
-    # Check if it has actual newlines
     has_newline = "\n" in inner or "\r" in inner
     
     if has_newline:
         try:
-            # Replace actual newlines with escape sequences
             inner_fixed = inner.replace("\n", "\\n")
             inner_fixed = inner_fixed.replace("\r", "\\r")
             inner_fixed = inner_fixed.replace("\t", "\\t")
-            
-            parsed = json.loads(inner_fixed)
-            fixed = json.dumps(parsed, ensure_ascii=False)
-            fixed = fixed.replace("'", "''")
-            return f"'{fixed}'"
+            return serialize_json(parse_json(inner_fixed))
         except json.JSONDecodeError:
             try:
-                # Try more fixes
                 inner_fixed = inner.replace("\\\\n", "\n")
                 inner_fixed = inner_fixed.replace("\\\\t", "\t")
                 inner_fixed = inner_fixed.replace("\\\\r", "\r")
                 inner_fixed = inner_fixed.replace("\n", "\\n")
                 inner_fixed = inner_fixed.replace("\r", "\\r")
                 inner_fixed = inner_fixed.replace("\t", "\\t")
-                inner_fixed = re.sub(r'\\{3,}"', lambda m: '\\' * (len(m.group(0)) - 1) + '"', inner_fixed)
-                
-                parsed = json.loads(inner_fixed)
-                fixed = json.dumps(parsed, ensure_ascii=False)
-                fixed = fixed.replace("'", "''")
-                return f"'{fixed}'"
+                return serialize_json(parse_json(inner_fixed))
             except:
-                return value
-    else:
-        try:
-            parsed = json.loads(inner)
-            fixed = json.dumps(parsed, ensure_ascii=False)
-            fixed = fixed.replace("'", "''")
-            return f"'{fixed}'"
-        except json.JSONDecodeError:
-            return value
-
-
-def extract_values_carefully(values_str: str) -> list[str]:
-    """Extract values from VALUES clause, handling quotes and nested structures."""
-    values = []
-    current = []
-    depth = 0
-    in_string = False
-    quote_char = None
-    
-    i = 0
-    while i < len(values_str):
-        char = values_str[i]
-        
-        if not in_string:
-            if char in ("'", '"'):
-                in_string = True
-                quote_char = char
-                current.append(char)
-            elif char == '(':
-                depth += 1
-                current.append(char)
-            elif char == ')':
-                depth -= 1
-                current.append(char)
-            elif char == ',' and depth == 0:
-                val = ''.join(current).strip()
-                if val:
-                    values.append(val)
-                current = []
-            else:
-                current.append(char)
-        else:
-            current.append(char)
-            if char == quote_char:
-                # Check if escaped: look for '' pattern (SQL escape)
-                if quote_char == "'" and i + 1 < len(values_str) and values_str[i + 1] == "'":
-                    # SQL escape: ''
-                    current.append("'")
-                    i += 1  # Skip next quote
-                else:
-                    # Check if backslash-escaped
-                    backslash_count = 0
-                    j = len(current) - 2
-                    while j >= 0 and current[j] == '\\':
-                        backslash_count += 1
-                        j -= 1
-                    
-                    # Even number means quote is not escaped
-                    if backslash_count % 2 == 0:
-                        in_string = False
-                        quote_char = None
-        
-        i += 1
-    
-    if current:
-        val = ''.join(current).strip()
-        if val:
-            values.append(val)
-    
-    return values
+                return None
+    try:
+        return serialize_json(parse_json(inner))
+    except json.JSONDecodeError:
+        return None
 
 
 def fix_file(file_path: Path, backup: bool) -> tuple[int, int]:
     """Fix JSON in a SQL file, joining multiline INSERT statements."""
-    if backup:
-        backup_path = file_path.with_suffix(file_path.suffix + ".bak")
-        backup_path.write_text(file_path.read_text(encoding="utf-8"), encoding="utf-8")
-    
-    content = file_path.read_text(encoding="utf-8")
+    size = file_path.stat().st_size
+    content = read_text(file_path)
     
     # Remove SQL line continuations
     content = re.sub(r'\\\s*\n\s*', '', content)
     
     # Join multiline INSERT statements
-    lines = content.splitlines(keepends=True)
-    joined_lines = []
-    i = 0
+    with stage("tokenize", nbytes=len(content)):
+        lines = content.splitlines(keepends=True)
+        joined_lines = []
+        i = 0
     
-    while i < len(lines):
-        line = lines[i]
+        while i < len(lines):
+            line = lines[i]
         
-        if line.strip().upper().startswith("INSERT INTO"):
-            # Collect the entire INSERT statement
-            insert_text = line.rstrip('\n\r')
-            j = i + 1
+            if line.strip().upper().startswith("INSERT INTO"):
+                # Collect the entire INSERT statement
+                parts = [line.rstrip('\n\r')]
+                complete = ';' in parts[0]
+                j = i + 1
             
-            while j < len(lines):
-                next_line = lines[j]
-                insert_text += next_line.rstrip('\n\r')
+                while j < len(lines):
+                    next_line = lines[j].rstrip('\n\r')
+                    parts.append(next_line)
                 
-                # Check if INSERT statement is complete (ends with ;)
-                if ';' in insert_text:
-                    break
-                j += 1
+                    # Check if INSERT statement is complete (ends with ;); only the
+                    # new line is searched so long statements stay linear
+                    if complete or ';' in next_line:
+                        break
+                    j += 1
             
-            joined_lines.append(insert_text + '\n')
-            i = j + 1
-        else:
-            joined_lines.append(line)
-            i += 1
+                joined_lines.append(''.join(parts) + '\n')
+                i = j + 1
+            else:
+                joined_lines.append(line)
+                i += 1
     
-    content = ''.join(joined_lines)
+        content = ''.join(joined_lines)
     
     # Now fix JSON in the joined content
     fixes = [0]
@@ -184,88 +126,67 @@ def fix_file(file_path: Path, backup: bool) -> tuple[int, int]:
     
     def fix_json_match(match):
         """Fix a quoted string that contains JSON."""
-        full = match.group(0)
-        inner = match.group(1)
-        
-        inner = inner.replace("''", "'")
-        
-        if not inner.strip().startswith(("{", "[")):
-            return full
-        
-        has_newline = "\n" in inner or "\r" in inner
-        
-        if has_newline:
-            try:
-                inner_fixed = inner.replace("\n", "\\n")
-                inner_fixed = inner_fixed.replace("\r", "\\r")
-                inner_fixed = inner_fixed.replace("\t", "\\t")
-                
-                parsed = json.loads(inner_fixed)
-                fixed = json.dumps(parsed, ensure_ascii=False)
-                fixed = fixed.replace("'", "''")
-                fixes[0] += 1
-                return f"'{fixed}'"
-            except json.JSONDecodeError:
-                try:
-                    inner_fixed = inner.replace("\\\\n", "\n")
-                    inner_fixed = inner_fixed.replace("\\\\t", "\t")
-                    inner_fixed = inner_fixed.replace("\\\\r", "\r")
-                    inner_fixed = inner_fixed.replace("\n", "\\n")
-                    inner_fixed = inner_fixed.replace("\r", "\\r")
-                    inner_fixed = inner_fixed.replace("\t", "\\t")
-                    inner_fixed = re.sub(r'\\{3,}"', lambda m: '\\' * (len(m.group(0)) - 1) + '"', inner_fixed)
-                    
-                    parsed = json.loads(inner_fixed)
-                    fixed = json.dumps(parsed, ensure_ascii=False)
-                    fixed = fixed.replace("'", "''")
-                    fixes[0] += 1
-                    return f"'{fixed}'"
-                except:
-                    return full
-        else:
-            try:
-                parsed = json.loads(inner)
-                fixed = json.dumps(parsed, ensure_ascii=False)
-                fixed = fixed.replace("'", "''")
-                fixes[0] += 1
-                return f"'{fixed}'"
-            except json.JSONDecodeError:
-                return full
+        progress.position = match.end()
+        fixed = repair_json_literal(match.group(1).replace("''", "'"))
+        if fixed is None:
+            return match.group(0)
+        fixes[0] += 1
+        return "'" + fixed.replace("'", "''") + "'"
     
     # Count INSERT statements
     insert_count = len([l for l in content.splitlines() if l.strip().upper().startswith("INSERT")])
     
     # Fix JSON strings
-    pattern = r"'((?:[^'\\]|\\.|'')*?)'"
-    fixed_content = re.sub(pattern, fix_json_match, content, flags=re.DOTALL)
+    with stage("repair", nbytes=len(content)), tracking(size, len(content)) as progress:
+        fixed_content = SQL_LITERAL.sub(fix_json_match, content)
     
-    file_path.write_text(fixed_content, encoding="utf-8")
+    write_fixed(file_path, fixed_content, backup)
     return fixes[0], insert_count
 
 
 def main() -> None:
     args = parse_args()
+    start_stats(args, "fix_json_complete")
+    start_progress(args, "fix_json_complete")
+    start_profile(args, "fix_json_complete")
     input_dir: Path = args.input_dir
     
     if not input_dir.exists() or not input_dir.is_dir():
         print(f"Error: Directory '{input_dir}' not found")
         return
     
-    sql_files = sorted(input_dir.glob("table_*.sql"))
+    input_dir, extracted = prepare_table_dir(input_dir, args.jobs, partial(fix_file, backup=False))
+    if extracted is not None:
+        # Each table was already fixed by the worker process that extracted it
+        total_fixed = 0
+        for sql_file, _, (fixed, inserts) in extracted:
+            total_fixed += fixed
+            if fixed > 0:
+                print(f"  {sql_file.name}: fixed {fixed} JSON values in {inserts} INSERT statements")
+        print(f"\nFixed {total_fixed} JSON values")
+        finish_profile(args, "fix_json_complete")
+        finish_progress(args)
+        finish_stats(args)
+        print("Done!")
+        return
+    
+    sql_files = list_sql_files(input_dir)
     
     if not sql_files:
         print(f"No table_*.sql files found in '{input_dir}'")
         return
     
+    start_patch(args)
     print(f"Fixing JSON in {len(sql_files)} SQL files...")
-    if args.backup:
+    expect(sum(f.stat().st_size for f in sql_files if sql_stem(f) != "table_schema"))
+    if args.backup and not args.patch:
         print("Creating backups...")
     
     total_fixed = 0
     total_inserts = 0
     
     for sql_file in sql_files:
-        if sql_file.name == "table_schema.sql":
+        if sql_stem(sql_file) == "table_schema":
             continue
         
         try:
@@ -280,6 +201,10 @@ def main() -> None:
             traceback.print_exc()
     
     print(f"\nFixed {total_fixed} JSON values")
+    finish_patch(args)
+    finish_profile(args, "fix_json_complete")
+    finish_progress(args)
+    finish_stats(args)
     print("Done!")
 
 
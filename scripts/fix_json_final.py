@@ -1,9 +1,19 @@
 """Final fix for JSON strings with newlines in SQL files."""
 import argparse
-import json
+import os
 import re
+from functools import partial
 from pathlib import Path
 
+from dump_io import list_sql_files, read_text, sql_stem
+from dump_patch import add_patch_args, finish_patch, start_patch, write_fixed
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_progress import add_progress_args, expect, finish_progress, start_progress, tracking
+from dump_stats import add_stats_args, finish_stats, stage, start_stats
+from fix_json_complete import repair_json_literal
+from split_by_table import prepare_table_dir
+from sql_statements import SQL_LITERAL
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -12,23 +22,31 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "input_dir",
         type=Path,
-        help="Directory containing SQL files to fix.",
+        help="Directory containing SQL files to fix, or a pg_dump -Fd directory.",
     )
     parser.add_argument(
         "--backup",
         action="store_true",
         help="Create backup files before fixing.",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when input_dir is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    add_patch_args(parser)
     return parser.parse_args()
 
 
 def fix_file(file_path: Path, backup: bool) -> int:
     """Fix JSON strings by replacing actual newlines with escape sequences."""
-    if backup:
-        backup_path = file_path.with_suffix(file_path.suffix + ".bak")
-        backup_path.write_text(file_path.read_text(encoding="utf-8"), encoding="utf-8")
-    
-    content = file_path.read_text(encoding="utf-8")
+    size = file_path.stat().st_size
+    content = read_text(file_path)
     
     # Remove SQL line continuations first
     content = re.sub(r'\\\s*\n\s*', '', content)
@@ -37,96 +55,63 @@ def fix_file(file_path: Path, backup: bool) -> int:
     
     def fix_json_match(match):
         """Fix a quoted string that contains JSON."""
-        full = match.group(0)
-        inner = match.group(1)
-        
-        # Unescape SQL quotes
-        inner = inner.replace("''", "'")
-        
-        if not inner.strip().startswith(("{", "[")):
-            return full
-        
-        # Check if it has actual newlines
-        has_newline = "\n" in inner or "\r" in inner
-        
-        if has_newline:
-            try:
-                # Replace actual newlines with escape sequences
-                inner_fixed = inner.replace("\n", "\\n")
-                inner_fixed = inner_fixed.replace("\r", "\\r")
-                inner_fixed = inner_fixed.replace("\t", "\\t")
-                
-                # Parse and re-serialize
-                parsed = json.loads(inner_fixed)
-                fixed = json.dumps(parsed, ensure_ascii=False)
-                fixed = fixed.replace("'", "''")
-                fixes[0] += 1
-                return f"'{fixed}'"
-            except json.JSONDecodeError:
-                # Try more fixes
-                try:
-                    # Fix double-escaped sequences first
-                    inner_fixed = inner.replace("\\\\n", "\n")
-                    inner_fixed = inner_fixed.replace("\\\\t", "\t")
-                    inner_fixed = inner_fixed.replace("\\\\r", "\r")
-                    # Then escape actual newlines
-                    inner_fixed = inner_fixed.replace("\n", "\\n")
-                    inner_fixed = inner_fixed.replace("\r", "\\r")
-                    inner_fixed = inner_fixed.replace("\t", "\\t")
-                    
-                    # Fix excessive backslashes
-                    inner_fixed = re.sub(r'\\{3,}"', lambda m: '\\' * (len(m.group(0)) - 1) + '"', inner_fixed)
-                    
-                    parsed = json.loads(inner_fixed)
-                    fixed = json.dumps(parsed, ensure_ascii=False)
-                    fixed = fixed.replace("'", "''")
-                    fixes[0] += 1
-                    return f"'{fixed}'"
-                except:
-                    return full
-        else:
-            # No newlines, try parsing as-is
-            try:
-                parsed = json.loads(inner)
-                fixed = json.dumps(parsed, ensure_ascii=False)
-                fixed = fixed.replace("'", "''")
-                fixes[0] += 1
-                return f"'{fixed}'"
-            except json.JSONDecodeError:
-                return full
-    
-    # Match quoted strings - use DOTALL to handle newlines inside strings
-    # Pattern: '...' where ... can contain '' (SQL escape) or any char including newline
-    pattern = r"'((?:[^'\\]|\\.|'')*?)'"
+        progress.position = match.end()
+        fixed = repair_json_literal(match.group(1).replace("''", "'"))
+        if fixed is None:
+            return match.group(0)
+        fixes[0] += 1
+        return "'" + fixed.replace("'", "''") + "'"
     
-    fixed_content = re.sub(pattern, fix_json_match, content, flags=re.DOTALL)
+    # Match quoted strings: '...' where ... can contain '' (SQL escape) or any char including newline
+    with stage("repair", nbytes=len(content)), tracking(size, len(content)) as progress:
+        fixed_content = SQL_LITERAL.sub(fix_json_match, content)
     
-    file_path.write_text(fixed_content, encoding="utf-8")
+    write_fixed(file_path, fixed_content, backup)
     return fixes[0]
 
 
 def main() -> None:
     args = parse_args()
+    start_stats(args, "fix_json_final")
+    start_progress(args, "fix_json_final")
+    start_profile(args, "fix_json_final")
     input_dir: Path = args.input_dir
     
     if not input_dir.exists() or not input_dir.is_dir():
         print(f"Error: Directory '{input_dir}' not found")
         return
     
-    sql_files = sorted(input_dir.glob("table_*.sql"))
+    input_dir, extracted = prepare_table_dir(input_dir, args.jobs, partial(fix_file, backup=False))
+    if extracted is not None:
+        # Each table was already fixed by the worker process that extracted it
+        total_fixed = 0
+        for sql_file, _, fixed in extracted:
+            total_fixed += fixed
+            if fixed > 0:
+                print(f"  {sql_file.name}: fixed {fixed} JSON values")
+        print(f"\nFixed {total_fixed} JSON values")
+        finish_profile(args, "fix_json_final")
+        finish_progress(args)
+        finish_stats(args)
+        print("Done!")
+        return
+    
+    sql_files = list_sql_files(input_dir)
     
     if not sql_files:
         print(f"No table_*.sql files found in '{input_dir}'")
         return
     
+    start_patch(args)
     print(f"Fixing JSON in {len(sql_files)} SQL files...")
-    if args.backup:
+    expect(sum(f.stat().st_size for f in sql_files if sql_stem(f) != "table_schema"))
+    if args.backup and not args.patch:
         print("Creating backups...")
     
     total_fixed = 0
     
     for sql_file in sql_files:
-        if sql_file.name == "table_schema.sql":
+        if sql_stem(sql_file) == "table_schema":
             continue
         
         try:
@@ -140,6 +125,10 @@ def main() -> None:
             traceback.print_exc()
     
     print(f"\nFixed {total_fixed} JSON values")
+    finish_patch(args)
+    finish_profile(args, "fix_json_final")
+    finish_progress(args)
+    finish_stats(args)
     print("Done!")
 
 
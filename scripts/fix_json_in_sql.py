@@ -1,8 +1,17 @@
 import argparse
 import json
+import os
 import re
+from functools import partial
 from pathlib import Path
 
+from dump_io import list_sql_files, read_text, sql_stem
+from dump_patch import add_patch_args, finish_patch, start_patch, write_fixed
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import add_progress_args, expect, finish_progress, start_progress, tracking
+from dump_stats import add_stats_args, finish_stats, parse_json, serialize_json, stage, start_stats
+from split_by_table import prepare_table_dir
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -11,16 +20,28 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "input_dir",
         type=Path,
-        help="Directory containing SQL files to fix.",
+        help="Directory containing SQL files to fix, or a pg_dump -Fd directory.",
     )
     parser.add_argument(
         "--backup",
         action="store_true",
         help="Create backup files before fixing.",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when input_dir is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    add_patch_args(parser)
     return parser.parse_args()
 
 
+@hot_path
 def extract_values_carefully(values_str: str) -> list[str]:
     """
     Carefully extract values from VALUES clause, handling:
@@ -79,6 +100,7 @@ def extract_values_carefully(values_str: str) -> list[str]:
     return values
 
 
+@hot_path
 def fix_json_value(value: str) -> str:
     """Fix a single JSON value."""
     if value.strip() == "NULL":
@@ -98,8 +120,8 @@ def fix_json_value(value: str) -> str:
         inner_fixed = inner_fixed.replace("\r", "\\r")
         inner_fixed = inner_fixed.replace("\t", "\\t")
         
-        parsed = json.loads(inner_fixed)
-        fixed = json.dumps(parsed, ensure_ascii=False)
+        parsed = parse_json(inner_fixed)
+        fixed = serialize_json(parsed)
         fixed = fixed.replace("'", "''")
         return f"'{fixed}'"
     except json.JSONDecodeError:
@@ -111,16 +133,15 @@ def fix_json_value(value: str) -> str:
             inner_fixed = inner_fixed.replace("\n", "\\n")
             inner_fixed = inner_fixed.replace("\r", "\\r")
             inner_fixed = inner_fixed.replace("\t", "\\t")
-            inner_fixed = re.sub(r'\\{3,}"', lambda m: '\\' * (len(m.group(0)) - 1) + '"', inner_fixed)
-            
-            parsed = json.loads(inner_fixed)
-            fixed = json.dumps(parsed, ensure_ascii=False)
+            parsed = parse_json(inner_fixed)
+            fixed = serialize_json(parsed)
             fixed = fixed.replace("'", "''")
             return f"'{fixed}'"
         except:
             return value
 
 
+@hot_path
 def fix_insert_line(line: str) -> str:
     """Fix JSON values in an INSERT statement."""
     values_match = re.search(r'VALUES\s+\(', line, re.IGNORECASE)
@@ -154,11 +175,8 @@ def fix_insert_line(line: str) -> str:
 
 def fix_file(file_path: Path, backup: bool) -> tuple[int, int]:
     """Fix JSON in a SQL file."""
-    if backup:
-        backup_path = file_path.with_suffix(file_path.suffix + ".bak")
-        backup_path.write_text(file_path.read_text(encoding="utf-8"), encoding="utf-8")
-    
-    content = file_path.read_text(encoding="utf-8")
+    size = file_path.stat().st_size
+    content = read_text(file_path)
     content = re.sub(r'\\\s*\n\s*', '', content)
     
     lines = content.splitlines(keepends=True)
@@ -166,46 +184,68 @@ def fix_file(file_path: Path, backup: bool) -> tuple[int, int]:
     fixed_count = 0
     insert_count = 0
     
-    for line in lines:
-        if not line.strip().upper().startswith("INSERT INTO"):
-            fixed_lines.append(line)
-            continue
+    with stage("repair", nbytes=len(content)), tracking(size, len(lines)) as progress:
+        for i, line in enumerate(lines):
+            progress.position = i
+            if not line.strip().upper().startswith("INSERT INTO"):
+                fixed_lines.append(line)
+                continue
         
-        insert_count += 1
-        fixed = fix_insert_line(line)
+            insert_count += 1
+            fixed = fix_insert_line(line)
         
-        if fixed != line:
-            fixed_count += 1
+            if fixed != line:
+                fixed_count += 1
         
-        fixed_lines.append(fixed)
+            fixed_lines.append(fixed)
     
-    file_path.write_text("".join(fixed_lines), encoding="utf-8")
+    write_fixed(file_path, "".join(fixed_lines), backup)
     return fixed_count, insert_count
 
 
 def main() -> None:
     args = parse_args()
+    start_stats(args, "fix_json_in_sql")
+    start_progress(args, "fix_json_in_sql")
+    start_profile(args, "fix_json_in_sql")
     input_dir: Path = args.input_dir
     
     if not input_dir.exists() or not input_dir.is_dir():
         print(f"Error: Directory '{input_dir}' not found")
         return
     
-    sql_files = sorted(input_dir.glob("table_*.sql"))
+    input_dir, extracted = prepare_table_dir(input_dir, args.jobs, partial(fix_file, backup=False))
+    if extracted is not None:
+        # Each table was already fixed by the worker process that extracted it
+        total_fixed = 0
+        for sql_file, _, (fixed, inserts) in extracted:
+            total_fixed += fixed
+            if fixed > 0:
+                print(f"  {sql_file.name}: fixed {fixed}/{inserts} INSERT statements")
+        print(f"\nFixed {total_fixed} INSERT statements")
+        finish_profile(args, "fix_json_in_sql")
+        finish_progress(args)
+        finish_stats(args)
+        print("Done!")
+        return
+    
+    sql_files = list_sql_files(input_dir)
     
     if not sql_files:
         print(f"No table_*.sql files found in '{input_dir}'")
         return
     
+    start_patch(args)
     print(f"Fixing JSON in {len(sql_files)} SQL files...")
-    if args.backup:
+    expect(sum(f.stat().st_size for f in sql_files if sql_stem(f) != "table_schema"))
+    if args.backup and not args.patch:
         print("Creating backups...")
     
     total_fixed = 0
     total_inserts = 0
     
     for sql_file in sql_files:
-        if sql_file.name == "table_schema.sql":
+        if sql_stem(sql_file) == "table_schema":
             continue
         
         try:
@@ -220,6 +260,10 @@ def main() -> None:
             traceback.print_exc()
     
     print(f"\nFixed {total_fixed} INSERT statements")
+    finish_patch(args)
+    finish_profile(args, "fix_json_in_sql")
+    finish_progress(args)
+    finish_stats(args)
     print("Done!")
 
 
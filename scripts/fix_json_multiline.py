@@ -1,9 +1,16 @@
 """Fix JSON in SQL files that have multiline INSERT statements."""
 import argparse
-import json
 import re
 from pathlib import Path
 
+from dump_io import read_text
+from dump_patch import add_patch_args, finish_patch, start_patch, write_fixed
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_progress import add_progress_args, finish_progress, start_progress, tracking
+from dump_stats import add_stats_args, finish_stats, stage, start_stats
+from fix_json_complete import repair_json_literal
+from sql_statements import SQL_LITERAL
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -19,16 +26,17 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Create backup file before fixing.",
     )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    add_patch_args(parser)
     return parser.parse_args()
 
 
 def fix_file(file_path: Path, backup: bool) -> int:
     """Fix JSON in a SQL file, handling multiline INSERT statements."""
-    if backup:
-        backup_path = file_path.with_suffix(file_path.suffix + ".bak")
-        backup_path.write_text(file_path.read_text(encoding="utf-8"), encoding="utf-8")
-    
-    content = file_path.read_text(encoding="utf-8")
+    size = file_path.stat().st_size
+    content = read_text(file_path)
     
     # Remove SQL line continuations
     content = re.sub(r'\\\s*\n\s*', '', content)
@@ -37,88 +45,44 @@ def fix_file(file_path: Path, backup: bool) -> int:
     
     def fix_json_in_quoted_string(match):
         """Fix a quoted string that contains JSON."""
-        full = match.group(0)
-        inner = match.group(1)
-        
-        # Unescape SQL quotes
-        inner = inner.replace("''", "'")
-        
-        if not inner.strip().startswith(("{", "[")):
-            return full
-        
-        # Check if it has actual newlines
-        has_newline = "\n" in inner or "\r" in inner
-        
-        if has_newline:
-            try:
-                # Replace actual newlines with escape sequences
-                inner_fixed = inner.replace("\n", "\\n")
-                inner_fixed = inner_fixed.replace("\r", "\\r")
-                inner_fixed = inner_fixed.replace("\t", "\\t")
-                
-                # Parse and re-serialize
-                parsed = json.loads(inner_fixed)
-                fixed = json.dumps(parsed, ensure_ascii=False)
-                fixed = fixed.replace("'", "''")
-                fixes[0] += 1
-                return f"'{fixed}'"
-            except json.JSONDecodeError:
-                # Try more fixes
-                try:
-                    # Fix double-escaped sequences first
-                    inner_fixed = inner.replace("\\\\n", "\n")
-                    inner_fixed = inner_fixed.replace("\\\\t", "\t")
-                    inner_fixed = inner_fixed.replace("\\\\r", "\r")
-                    # Then escape actual newlines
-                    inner_fixed = inner_fixed.replace("\n", "\\n")
-                    inner_fixed = inner_fixed.replace("\r", "\\r")
-                    inner_fixed = inner_fixed.replace("\t", "\\t")
-                    
-                    # Fix excessive backslashes
-                    inner_fixed = re.sub(r'\\{3,}"', lambda m: '\\' * (len(m.group(0)) - 1) + '"', inner_fixed)
-                    
-                    parsed = json.loads(inner_fixed)
-                    fixed = json.dumps(parsed, ensure_ascii=False)
-                    fixed = fixed.replace("'", "''")
-                    fixes[0] += 1
-                    return f"'{fixed}'"
-                except:
-                    return full
-        else:
-            # No newlines, try parsing as-is
-            try:
-                parsed = json.loads(inner)
-                fixed = json.dumps(parsed, ensure_ascii=False)
-                fixed = fixed.replace("'", "''")
-                fixes[0] += 1
-                return f"'{fixed}'"
-            except json.JSONDecodeError:
-                return full
-    
-    # Match quoted strings - use DOTALL to handle newlines inside strings
-    pattern = r"'((?:[^'\\]|\\.|'')*?)'"
+        progress.position = match.end()
+        fixed = repair_json_literal(match.group(1).replace("''", "'"))
+        if fixed is None:
+            return match.group(0)
+        fixes[0] += 1
+        return "'" + fixed.replace("'", "''") + "'"
     
-    fixed_content = re.sub(pattern, fix_json_in_quoted_string, content, flags=re.DOTALL)
+    # Match quoted strings, including newlines and '' escapes inside them
+    with stage("repair", nbytes=len(content)), tracking(size, len(content)) as progress:
+        fixed_content = SQL_LITERAL.sub(fix_json_in_quoted_string, content)
     
-    file_path.write_text(fixed_content, encoding="utf-8")
+    write_fixed(file_path, fixed_content, backup)
     return fixes[0]
 
 
 def main() -> None:
     args = parse_args()
+    start_stats(args, "fix_json_multiline")
+    start_progress(args, "fix_json_multiline")
+    start_profile(args, "fix_json_multiline")
     input_file: Path = args.input_file
     
     if not input_file.exists():
         print(f"Error: File '{input_file}' not found")
         return
     
+    start_patch(args)
     print(f"Fixing JSON in {input_file.name}...")
-    if args.backup:
+    if args.backup and not args.patch:
         print("Creating backup...")
     
     try:
         fixed = fix_file(input_file, args.backup)
         print(f"Fixed {fixed} JSON values")
+        finish_patch(args)
+        finish_profile(args, "fix_json_multiline")
+        finish_progress(args)
+        finish_stats(args)
         print("Done!")
     except Exception as e:
         print(f"Error: {e}")
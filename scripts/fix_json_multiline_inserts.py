@@ -1,9 +1,18 @@
 """Fix JSON in SQL files with multiline INSERT statements."""
 import argparse
 import json
+import os
 import re
+from functools import partial
 from pathlib import Path
 
+from dump_io import list_sql_files, read_text, sql_stem
+from dump_patch import add_patch_args, finish_patch, start_patch, write_fixed
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import add_progress_args, expect, finish_progress, start_progress, tracking
+from dump_stats import add_stats_args, finish_stats, parse_json, serialize_json, stage, start_stats
+from split_by_table import prepare_table_dir
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -12,16 +21,28 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "input_dir",
         type=Path,
-        help="Directory containing SQL files to fix.",
+        help="Directory containing SQL files to fix, or a pg_dump -Fd directory.",
     )
     parser.add_argument(
         "--backup",
         action="store_true",
         help="Create backup files before fixing.",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when input_dir is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    add_patch_args(parser)
     return parser.parse_args()
 
 
+@hot_path
 def fix_json_value(value: str) -> str:
     """Fix a single JSON value."""
     if value.strip() == "NULL":
@@ -45,8 +66,8 @@ def fix_json_value(value: str) -> str:
             inner_fixed = inner_fixed.replace("\r", "\\r")
             inner_fixed = inner_fixed.replace("\t", "\\t")
             
-            parsed = json.loads(inner_fixed)
-            fixed = json.dumps(parsed, ensure_ascii=False)
+            parsed = parse_json(inner_fixed)
+            fixed = serialize_json(parsed)
             fixed = fixed.replace("'", "''")
             return f"'{fixed}'"
         except json.JSONDecodeError:
@@ -60,25 +81,23 @@ def fix_json_value(value: str) -> str:
                 inner_fixed = inner_fixed.replace("\r", "\\r")
                 inner_fixed = inner_fixed.replace("\t", "\\t")
                 
-                # Fix excessive backslashes
-                inner_fixed = re.sub(r'\\{3,}"', lambda m: '\\' * (len(m.group(0)) - 1) + '"', inner_fixed)
-                
-                parsed = json.loads(inner_fixed)
-                fixed = json.dumps(parsed, ensure_ascii=False)
+                parsed = parse_json(inner_fixed)
+                fixed = serialize_json(parsed)
                 fixed = fixed.replace("'", "''")
                 return f"'{fixed}'"
             except:
                 return value
     else:
         try:
-            parsed = json.loads(inner)
-            fixed = json.dumps(parsed, ensure_ascii=False)
+            parsed = parse_json(inner)
+            fixed = serialize_json(parsed)
             fixed = fixed.replace("'", "''")
             return f"'{fixed}'"
         except json.JSONDecodeError:
             return value
 
 
+@hot_path
 def extract_values_from_multiline_insert(insert_text: str) -> list[str]:
     """Extract values from a multiline INSERT statement."""
     # Find VALUES clause
@@ -151,11 +170,8 @@ def extract_values_from_multiline_insert(insert_text: str) -> list[str]:
 
 def fix_file(file_path: Path, backup: bool) -> tuple[int, int]:
     """Fix JSON in a SQL file, handling multiline INSERT statements."""
-    if backup:
-        backup_path = file_path.with_suffix(file_path.suffix + ".bak")
-        backup_path.write_text(file_path.read_text(encoding="utf-8"), encoding="utf-8")
-    
-    content = file_path.read_text(encoding="utf-8")
+    size = file_path.stat().st_size
+    content = read_text(file_path)
     
     # Remove SQL line continuations
     content = re.sub(r'\\\s*\n\s*', '', content)
@@ -165,84 +181,113 @@ def fix_file(file_path: Path, backup: bool) -> tuple[int, int]:
     fixed_count = 0
     insert_count = 0
     
-    i = 0
-    while i < len(lines):
-        line = lines[i]
+    with stage("repair", nbytes=len(content)), tracking(size, len(lines)) as progress:
+        i = 0
+        while i < len(lines):
+            progress.position = i
+            line = lines[i]
         
-        if not line.strip().upper().startswith("INSERT INTO"):
-            fixed_lines.append(line)
-            i += 1
-            continue
+            if not line.strip().upper().startswith("INSERT INTO"):
+                fixed_lines.append(line)
+                i += 1
+                continue
         
-        insert_count += 1
+            insert_count += 1
         
-        # Collect the entire INSERT statement (may span multiple lines)
-        insert_text = line
-        j = i + 1
-        while j < len(lines) and ';' not in insert_text:
-            insert_text += lines[j]
-            j += 1
+            # Collect the entire INSERT statement (may span multiple lines)
+            parts = [line]
+            j = i + 1
+            while j < len(lines) and ';' not in parts[-1]:
+                parts.append(lines[j])
+                j += 1
+            insert_text = "".join(parts)
         
-        # Fix JSON in this INSERT statement
-        values = extract_values_from_multiline_insert(insert_text)
-        if values:
-            fixed_values = [fix_json_value(v) for v in values]
+            # Fix JSON in this INSERT statement
+            values = extract_values_from_multiline_insert(insert_text)
+            if values:
+                fixed_values = [fix_json_value(v) for v in values]
             
-            # Reconstruct INSERT statement
-            values_match = re.search(r'VALUES\s*\(', insert_text, re.IGNORECASE)
-            if values_match:
-                values_start = values_match.end()
-                paren_count = 1
-                k = values_start
-                while k < len(insert_text) and paren_count > 0:
-                    if insert_text[k] == '(':
-                        paren_count += 1
-                    elif insert_text[k] == ')':
-                        paren_count -= 1
-                    k += 1
+                # Reconstruct INSERT statement
+                values_match = re.search(r'VALUES\s*\(', insert_text, re.IGNORECASE)
+                if values_match:
+                    values_start = values_match.end()
+                    paren_count = 1
+                    k = values_start
+                    while k < len(insert_text) and paren_count > 0:
+                        if insert_text[k] == '(':
+                            paren_count += 1
+                        elif insert_text[k] == ')':
+                            paren_count -= 1
+                        k += 1
                 
-                if paren_count == 0:
-                    before = insert_text[:values_start]
-                    after = insert_text[k-1:]
-                    fixed_insert = before + ", ".join(fixed_values) + after
+                    if paren_count == 0:
+                        before = insert_text[:values_start]
+                        after = insert_text[k-1:]
+                        fixed_insert = before + ", ".join(fixed_values) + after
                     
-                    if fixed_insert != insert_text:
-                        fixed_count += 1
+                        if fixed_insert != insert_text:
+                            fixed_count += 1
                     
-                    fixed_lines.append(fixed_insert)
-                    i = j
-                    continue
+                        fixed_lines.append(fixed_insert)
+                        i = j
+                        continue
         
-        fixed_lines.append(line)
-        i += 1
+            if ';' not in parts[-1]:
+                # Unterminated up to the end of the file: every later INSERT would
+                # rescan the same tail, so pass the rest through unchanged
+                fixed_lines.extend(lines[i:])
+                break
+        
+            fixed_lines.append(line)
+            i += 1
     
-    file_path.write_text("".join(fixed_lines), encoding="utf-8")
+    write_fixed(file_path, "".join(fixed_lines), backup)
     return fixed_count, insert_count
 
 
 def main() -> None:
     args = parse_args()
+    start_stats(args, "fix_json_multiline_inserts")
+    start_progress(args, "fix_json_multiline_inserts")
+    start_profile(args, "fix_json_multiline_inserts")
     input_dir: Path = args.input_dir
     
     if not input_dir.exists() or not input_dir.is_dir():
         print(f"Error: Directory '{input_dir}' not found")
         return
     
-    sql_files = sorted(input_dir.glob("table_*.sql"))
+    input_dir, extracted = prepare_table_dir(input_dir, args.jobs, partial(fix_file, backup=False))
+    if extracted is not None:
+        # Each table was already fixed by the worker process that extracted it
+        total_fixed = 0
+        for sql_file, _, (fixed, inserts) in extracted:
+            total_fixed += fixed
+            if fixed > 0:
+                print(f"  {sql_file.name}: fixed {fixed}/{inserts} INSERT statements")
+        print(f"\nFixed {total_fixed} INSERT statements")
+        finish_profile(args, "fix_json_multiline_inserts")
+        finish_progress(args)
+        finish_stats(args)
+        print("Done!")
+        return
+    
+    sql_files = list_sql_files(input_dir)
     
     if not sql_files:
         print(f"No table_*.sql files found in '{input_dir}'")
         return
     
+    start_patch(args)
     print(f"Fixing JSON in {len(sql_files)} SQL files...")
-    if args.backup:
+    expect(sum(f.stat().st_size for f in sql_files if sql_stem(f) != "table_schema"))
+    if args.backup and not args.patch:
         print("Creating backups...")
     
     total_fixed = 0
     total_inserts = 0
     
     for sql_file in sql_files:
-        if sql_file.name == "table_schema.sql":
+        if sql_stem(sql_file) == "table_schema":
             continue
         
         try:
@@ -257,6 +302,10 @@ def main() -> None:
             traceback.print_exc()
     
     print(f"\nFixed {total_fixed} INSERT statements")
+    finish_patch(args)
+    finish_profile(args, "fix_json_multiline_inserts")
+    finish_progress(args)
+    finish_stats(args)
     print("Done!")
 
 
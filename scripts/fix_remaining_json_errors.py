@@ -1,94 +1,175 @@
 """Fix remaining JSON errors in SQL files."""
+import argparse
 import json
 import re
 from pathlib import Path
 
+from dump_io import read_text
+from dump_patch import Span, add_patch_args, apply_spans, finish_patch, start_patch, write_fixed
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import Tracker, add_progress_args, finish_progress, start_progress, tracking
+from dump_stats import add_stats_args, finish_stats, parse_json, serialize_json, stage, start_stats
+from sql_statements import SQL_LITERAL, iter_insert_spans
+
+# Characters that may follow the closing quote of a JSON string
+_AFTER_STRING = frozenset(",:}]")
+_WHITESPACE = " \t\r\n"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Fix JSON values that still fail to parse by escaping stray double quotes inside their strings.",
+    )
+    parser.add_argument(
+        "input_file",
+        type=Path,
+        nargs="?",
+        default=Path("scripts/backup_plain_tables/table_content_edits.sql"),
+        help="SQL file to fix (default: scripts/backup_plain_tables/table_content_edits.sql).",
+    )
+    parser.add_argument(
+        "--backup",
+        action="store_true",
+        help="Create a backup file before fixing.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only count the values that would be fixed.",
+    )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    add_patch_args(parser)
+    return parser.parse_args()
+
+
+def escape_stray_quotes(json_str: str) -> str:
+    """
+    Escape the double quotes inside JSON strings that do not end the string.
+
+    One forward pass: inside a string, a quote ends it only if the next
+    non-blank character is one that can follow a string (, : } ] or the end
+    of the text); any other quote is taken as part of the text.
+    """
+    parts: list[str] = []
+    start = 0
+    in_string = False
+    n = len(json_str)
+    i = 0
+    while i < n:
+        char = json_str[i]
+        if char == "\\" and in_string:
+            i += 2
+            continue
+        if char == '"':
+            if not in_string:
+                in_string = True
+            else:
+                j = i + 1
+                while j < n and json_str[j] in _WHITESPACE:
+                    j += 1
+                if j == n or json_str[j] in _AFTER_STRING:
+                    in_string = False
+                else:
+                    parts.append(json_str[start:i])
+                    parts.append("\\")
+                    start = i
+        i += 1
+    if not parts:
+        return json_str
+    parts.append(json_str[start:])
+    return "".join(parts)
+
+
+def repair_stray_quotes(json_str: str) -> str | None:
+    """Re-serialized JSON of a string that fails to parse, after escaping its stray quotes; None if that does not help."""
+    escaped = escape_stray_quotes(json_str)
+    if escaped == json_str:
+        return None
+    try:
+        return serialize_json(parse_json(escaped))
+    except json.JSONDecodeError:
+        return None
+
+
 def fix_json_string(json_str: str) -> str:
-    """Fix a JSON string that has errors."""
-    # Try to find and fix unterminated strings
-    # Common issue: unescaped quotes in string values
-    
+    """Fix a JSON string that has errors; returns it unchanged if it cannot be fixed."""
     # First, try parsing as-is
     try:
-        parsed = json.loads(json_str)
-        return json.dumps(parsed, ensure_ascii=False)
-    except json.JSONDecodeError as e:
-        error_msg = str(e)
-        
-        # If it's an unterminated string, try to fix it
-        if "Unterminated string" in error_msg:
-            # Find the error position
-            error_pos = None
-            if "char " in error_msg:
-                try:
-                    error_pos = int(error_msg.split("char ")[1].split(")")[0])
-                except:
-                    pass
-            
-            if error_pos:
-                # Look for unescaped quotes before the error position
-                # Check if there's a quote that should be escaped
-                for i in range(max(0, error_pos - 50), min(len(json_str), error_pos + 50)):
-                    if json_str[i] == '"':
-                        # Check if it's escaped
-                        if i == 0 or json_str[i-1] != '\\':
-                            # Check if it's inside a string value (not a key)
-                            # Look backwards to see if we're in a string value
-                            before = json_str[:i]
-                            # Count quotes before this position
-                            quote_count = before.count('"')
-                            # If odd number, we're in a string value
-                            if quote_count % 2 == 1:
-                                # This quote should be escaped
-                                json_str = json_str[:i] + '\\' + json_str[i:]
-                                # Retry parsing
-                                try:
-                                    parsed = json.loads(json_str)
-                                    return json.dumps(parsed, ensure_ascii=False)
-                                except:
-                                    pass
-        
-        # If still can't parse, return original
-        return json_str
+        return serialize_json(parse_json(json_str))
+    except json.JSONDecodeError:
+        pass
 
-def fix_file(file_path: Path) -> int:
-    """Fix remaining JSON errors in a file."""
-    content = file_path.read_text(encoding="utf-8")
-    content = re.sub(r'\\\s*\n\s*', '', content)
-    
-    fixes = 0
-    
-    # Find all INSERT statements
-    inserts = re.findall(r'INSERT INTO[^;]+;', content, re.DOTALL)
-    
-    for insert_stmt in inserts:
-        # Find all JSON strings
-        pattern = r"'((?:[^'\\]|\\.|'')*?)'"
-        matches = list(re.finditer(pattern, insert_stmt, re.DOTALL))
-        
-        for match in matches:
+    # Common issue: unescaped quotes in string values
+    fixed = repair_stray_quotes(json_str)
+    return json_str if fixed is None else fixed
+
+
+@hot_path
+def collect_spans(content: str, progress: Tracker | None = None) -> list[Span]:
+    """(start, end, replacement) for every JSON literal of the INSERT statements in content that needs fixing."""
+    spans: list[Span] = []
+    for start, end in iter_insert_spans(content):
+        if progress is not None:
+            progress.position = end
+        for match in SQL_LITERAL.finditer(content, start, end):
             inner = match.group(1).replace("''", "'")
-            if inner.strip().startswith(("{", "[")):
-                try:
-                    json.loads(inner)
-                except json.JSONDecodeError:
-                    # Try to fix it
-                    fixed_json = fix_json_string(inner)
-                    if fixed_json != inner:
-                        # Replace in insert statement
-                        fixed_value = f"'{fixed_json.replace(\"'\", \"''\")}'"
-                        insert_stmt = insert_stmt[:match.start()] + fixed_value + insert_stmt[match.end():]
-                        fixes += 1
-    
-    if fixes > 0:
-        # Reconstruct content with fixed INSERT statements
-        # This is complex, so we'll use a simpler approach: fix the whole file
-        pass
-    
-    return fixes
-
-# Test on content_edits.sql
-file_path = Path("scripts/backup_plain_tables/table_content_edits.sql")
-print(f"Fixing {file_path.name}...")
-fixes = fix_file(file_path)
-print(f"Fixed {fixes} JSON values")
+            if not inner.strip().startswith(("{", "[")):
+                continue
+            try:
+                parse_json(inner)
+                continue
+            except json.JSONDecodeError:
+                pass
+            # Already known not to parse: go straight to the quote escaping
+            fixed_json = repair_stray_quotes(inner)
+            if fixed_json is not None:
+                escaped = fixed_json.replace("'", "''")
+                spans.append((match.start(), match.end(), f"'{escaped}'"))
+    return spans
+
+
+def fix_file(file_path: Path, backup: bool = False, dry_run: bool = False) -> int:
+    """Fix remaining JSON errors in a file. Returns the number of values fixed."""
+    size = file_path.stat().st_size
+    content = read_text(file_path)
+    content = re.sub(r'\\\s*\n\s*', '', content)
+
+    with stage("repair", nbytes=len(content)), tracking(size, len(content)) as progress:
+        spans = collect_spans(content, progress)
+
+    if spans and not dry_run:
+        # The untouched text between the spans is written as-is; the file is never rebuilt as one string
+        write_fixed(file_path, apply_spans(content, spans), backup)
+
+    return len(spans)
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "fix_remaining_json_errors")
+    start_progress(args, "fix_remaining_json_errors")
+    start_profile(args, "fix_remaining_json_errors")
+    file_path: Path = args.input_file
+
+    if not file_path.exists():
+        print(f"Error: File not found: {file_path}")
+        return
+
+    start_patch(args)
+    print(f"Fixing {file_path.name}...")
+    fixes = fix_file(file_path, args.backup, args.dry_run)
+    if args.dry_run:
+        print(f"Would fix {fixes} JSON values")
+    else:
+        print(f"Fixed {fixes} JSON values")
+    finish_patch(args)
+    finish_profile(args, "fix_remaining_json_errors")
+    finish_progress(args)
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
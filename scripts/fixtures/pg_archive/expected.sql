@@ -0,0 +1,32 @@
+CREATE TABLE public.users (
+    id integer NOT NULL,
+    name text,
+    profile jsonb
+);
+
+CREATE TABLE public.posts (
+    id integer NOT NULL,
+    user_id integer,
+    body text
+);
+
+COMMENT ON TABLE public.users IS 'app users';
+
+COPY public.users (id, name, profile) FROM stdin;
+1	An Nguyễn	{"tags": ["a\\tb"], "note": "it's"}
+2	B\\C	\N
+3	tab\there	{}
+\.
+
+COPY public.posts (id, user_id, body) FROM stdin;
+10	1	Hello
+11	3	multi\nline
+12	2	C:\\dir\\.
+\.
+
+ALTER TABLE ONLY public.users
+    ADD CONSTRAINT users_pkey PRIMARY KEY (id);
+
+ALTER TABLE ONLY public.posts
+    ADD CONSTRAINT posts_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id);
+
@@ -1,9 +1,30 @@
 """
 Script to analyze dependencies and generate insert order for SQL files.
 """
+import argparse
 from pathlib import Path
 import re
 
+from dump_io import table_chunk_map
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, start_stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Print the FK-safe insert order of the table files in a split backup.",
+    )
+    parser.add_argument(
+        "input_dir",
+        type=Path,
+        nargs="?",
+        default=Path("scripts/backup_plain_tables"),
+        help="Directory with table_schema.sql and table_*.sql files (default: scripts/backup_plain_tables).",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
 
 def parse_foreign_keys(schema_file: Path) -> dict[str, list[str]]:
     """Parse foreign keys from schema file."""
@@ -31,15 +52,8 @@ def parse_foreign_keys(schema_file: Path) -> dict[str, list[str]]:
 
 
 def get_all_tables(sql_dir: Path) -> list[str]:
-    """Get all table names from SQL files."""
-    tables = []
-    for sql_file in sorted(sql_dir.glob("table_*.sql")):
-        if sql_file.name == "table_schema.sql":
-            continue
-        # Extract table name from filename: table_users.sql -> users
-        table_name = sql_file.stem.replace("table_", "")
-        tables.append(table_name)
-    return tables
+    """Get all table names from SQL files (table_users.sql or table_users.sql.gz -> users)."""
+    return sorted(table_chunk_map(sql_dir))
 
 
 def topological_sort(tables: list[str], dependencies: dict[str, list[str]]) -> list[str]:
@@ -84,7 +98,10 @@ def topological_sort(tables: list[str], dependencies: dict[str, list[str]]) -> l
 
 
 def main():
-    sql_dir = Path("scripts/backup_plain_tables")
+    args = parse_args()
+    start_stats(args, "generate_insert_order")
+    start_profile(args, "generate_insert_order")
+    sql_dir: Path = args.input_dir
     schema_file = sql_dir / "table_schema.sql"
     
     if not schema_file.exists():
@@ -94,8 +111,9 @@ def main():
     # Parse dependencies
     dependencies = parse_foreign_keys(schema_file)
     
-    # Get all tables
-    tables = get_all_tables(sql_dir)
+    # Get all tables, with their files (chunks of a split table in load order)
+    table_files = table_chunk_map(sql_dir)
+    tables = sorted(table_files)
     
     # Sort by dependencies
     insert_order = topological_sort(tables, dependencies)
@@ -124,7 +142,8 @@ def main():
         for table in levels[level]:
             deps = dependencies.get(table, [])
             dep_str = f" -> depends on: {', '.join(deps)}" if deps else " -> no dependencies"
-            print(f"  table_{table}.sql{dep_str}")
+            names = ", ".join(f.name for f in table_files[table])
+            print(f"  {names}{dep_str}")
         print()
     
     print("\n" + "=" * 80)
@@ -132,8 +151,9 @@ def main():
     print("=" * 80)
     print()
     
-    for i, table in enumerate(insert_order, 1):
-        print(f"{i:2d}. table_{table}.sql")
+    files = [f for table in insert_order for f in table_files[table]]
+    for i, file in enumerate(files, 1):
+        print(f"{i:2d}. {file.name}")
     
     print("\n" + "=" * 80)
     print("LENH INSERT (co the copy va chay):")
@@ -144,8 +164,11 @@ def main():
     print("\\i table_schema.sql")
     print()
     print("-- Sau do chay data theo thu tu:")
-    for i, table in enumerate(insert_order, 1):
-        print(f"\\i table_{table}.sql")
+    for file in files:
+        print(f"\\i {file.name}")
+
+    finish_profile(args, "generate_insert_order")
+    finish_stats(args)
 
 
 if __name__ == "__main__":
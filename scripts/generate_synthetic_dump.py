@@ -0,0 +1,357 @@
+"""
+Generate a synthetic plain-SQL dump shaped like the real backup, at any size.
+
+The generator profiles a real table directory (backup_plain_tables): primary
+and foreign keys from table_schema.sql, column lists and value shapes from
+the table files. For each column it records the value kinds, the NULL ratio
+and a sample of real values. Rows are then generated table by table in FK
+order until each table reaches its share of the target size. A table's
+share matches its share of the real backup, so knowledge_nodes dominates
+as it does in production.
+
+Value shapes follow the samples:
+  - JSON values are regenerated with the same structure. String leaves
+    become Vietnamese text of similar length (with apostrophes and escaped
+    double quotes), and a fraction are pretty-printed over several lines.
+    Sampled JSON that does not parse is copied as is, so the fixers still
+    find broken values.
+  - Timestamps and enum-like columns reuse the sampled formats and values.
+  - Other text becomes Vietnamese text of similar length.
+  - Primary keys are deterministic UUIDs, and foreign keys point at rows of
+    the parent that were already generated, so the dump is FK-consistent.
+    Single-column UNIQUE text columns get a row suffix.
+
+Output is INSERT statements (or COPY blocks with --format copy), followed by
+the schema statements, like pg_dump's plain format. .gz/.zst and '-' work as
+everywhere else.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TextIO
+
+from convert_insert_to_copy import copy_field
+from dump_io import is_stdio, open_output, read_text, table_chunk_map
+from row_store import quote_literal, token_kind
+from schema_model import SchemaModel, parse_schema
+from split_by_table import parse_size
+from sql_statements import decode_literal, iter_file_statements, iter_insert_rows, iter_statements
+
+
+# Sampled values kept per column
+_SAMPLES = 64
+
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?([+-]\d{2}(:\d{2})?|Z)?")
+_UNIQUE = re.compile(
+    r'ALTER\s+TABLE\s+(?:ONLY\s+)?(?:public\.)?"?(\w+)"?\s+ADD\s+CONSTRAINT\s+\S+\s+UNIQUE\s*\(\s*("?\w+"?)\s*\)',
+    re.IGNORECASE,
+)
+
+_VIETNAMESE_WORDS = (
+    "học tập kiến thức bài giảng chương mục tiêu kỹ năng luyện tập câu hỏi đáp án giải thích ví dụ "
+    "phương trình hàm số đạo hàm tích phân xác suất thống kê hình học đại số lượng giác vectơ ma trận "
+    "người học giáo viên nội dung tổng quan chi tiết nâng cao cơ bản trung bình khó dễ thời gian "
+    "hoàn thành tiến độ điểm số đánh giá phản hồi gợi ý lộ trình ngày tuần tháng năm Việt Nam "
+    "tiếng Anh văn học lịch sử địa lý vật lý hóa học sinh học tin học lập trình dữ liệu thuật toán "
+    "được không những và của cho với trong ngoài trên dưới để khi nếu thì là có một hai ba"
+).split()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic SQL dump shaped like a real backup_plain_tables directory.",
+    )
+    parser.add_argument(
+        "output",
+        type=Path,
+        help="Dump file to write (.gz/.zst compressed, '-' for stdout).",
+    )
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=parse_size("10M"),
+        help="Approximate size of the data, e.g. 10M, 1G, 10G (default: 10M).",
+    )
+    parser.add_argument(
+        "--template",
+        type=Path,
+        default=Path("scripts/backup_plain_tables"),
+        help="Real table directory to profile (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("insert", "copy"),
+        default="insert",
+        help="Write INSERT statements or COPY blocks (default: insert).",
+    )
+    parser.add_argument(
+        "--multiline-ratio",
+        type=float,
+        default=0.05,
+        help="Fraction of JSON values written pretty-printed over several lines (default: 0.05).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed; the same seed and template give the same dump (default: 0).",
+    )
+    return parser.parse_args()
+
+
+@dataclass
+class ColumnProfile:
+    kinds: set[str] = field(default_factory=set)
+    nulls: int = 0
+    seen: int = 0
+    samples: list[str] = field(default_factory=list)
+    distinct: set[str] = field(default_factory=set)
+
+    def add(self, token: str, rng: random.Random) -> None:
+        self.seen += 1
+        kind = token_kind(token)
+        if kind is None:
+            self.nulls += 1
+            return
+        self.kinds.add(kind)
+        if len(self.distinct) <= _SAMPLES:
+            self.distinct.add(token)
+        # Reservoir sample of the non-NULL tokens
+        non_null = self.seen - self.nulls
+        if len(self.samples) < _SAMPLES:
+            self.samples.append(token)
+        elif rng.randrange(non_null) < _SAMPLES:
+            self.samples[rng.randrange(_SAMPLES)] = token
+
+    @property
+    def enum_like(self) -> bool:
+        """Few distinct values seen many times, e.g. status or type columns."""
+        return len(self.distinct) <= 12 and self.seen - self.nulls >= 2 * len(self.distinct)
+
+
+@dataclass
+class TableProfile:
+    columns: list[str]
+    profiles: dict[str, ColumnProfile]
+    rows: int = 0
+    bytes: int = 0
+
+
+def profile_tables(template: Path, rng: random.Random) -> dict[str, TableProfile]:
+    """Column lists, value profiles, row counts and sizes of every table in a table directory."""
+    tables: dict[str, TableProfile] = {}
+    for table, chunk_files in table_chunk_map(template).items():
+        profile: TableProfile | None = None
+        for chunk_file in chunk_files:
+            for _, columns, values, statement in iter_insert_rows(iter_file_statements(chunk_file)):
+                if profile is None:
+                    profile = TableProfile(columns, {c: ColumnProfile() for c in columns})
+                if columns != profile.columns:
+                    continue  # keep one column list per table
+                for column, token in zip(columns, values):
+                    profile.profiles[column].add(token, rng)
+                profile.rows += 1
+                profile.bytes += len(statement.encode("utf-8")) + 1
+        if profile is not None:
+            tables[table] = profile
+    return tables
+
+
+def synthetic_id(table: str, row: int) -> str:
+    """Deterministic UUID for row `row` of `table`, so FKs can be drawn without keeping keys."""
+    digest = hashlib.blake2b(f"{table}:{row}".encode("utf-8"), digest_size=16).digest()
+    return str(uuid.UUID(bytes=digest, version=4))
+
+
+class ValueGenerator:
+    def __init__(self, rng: random.Random, multiline_ratio: float) -> None:
+        self.rng = rng
+        self.multiline_ratio = multiline_ratio
+
+    def text(self, length: int) -> str:
+        """Vietnamese-looking text of about `length` characters, with the odd quote."""
+        rng = self.rng
+        words: list[str] = []
+        size = 0
+        while size < length:
+            word = rng.choice(_VIETNAMESE_WORDS)
+            roll = rng.random()
+            if roll < 0.001:
+                word = f"'{word}'"
+            elif roll < 0.006:
+                word = f'"{word}"'
+            words.append(word)
+            size += len(word) + 1
+        return " ".join(words)[:max(length, 1)]
+
+    def json_like(self, value):
+        """The same JSON structure with fresh string and number leaves."""
+        rng = self.rng
+        if isinstance(value, dict):
+            return {k: self.json_like(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.json_like(v) for v in value]
+        if isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, int):
+            return rng.randrange(max(abs(value) * 2, 10))
+        if isinstance(value, float):
+            return rng.uniform(-abs(value) * 2 - 0.01, abs(value) * 2 + 0.01)
+        if isinstance(value, str):
+            if _TIMESTAMP.fullmatch(value) or not value:
+                return value
+            return self.text(len(value))
+        return value
+
+    def token(self, profile: ColumnProfile) -> str:
+        """A raw SQL token shaped like the column's sampled values."""
+        rng = self.rng
+        if not profile.samples or rng.random() < profile.nulls / max(profile.seen, 1):
+            return "NULL"
+        sample = rng.choice(profile.samples)
+        kind = token_kind(sample)
+        if kind == "uuid":
+            return f"'{uuid.UUID(int=rng.getrandbits(128), version=4)}'"
+        if kind == "bool":
+            return rng.choice(("true", "false"))
+        if kind == "bare" or profile.enum_like:
+            return sample
+
+        value = decode_literal(sample) or ""
+        if _TIMESTAMP.fullmatch(value):
+            day = rng.randrange(1, 29)
+            return quote_literal(f"2025-{rng.randrange(1, 13):02d}-{day:02d} {value[11:]}")
+        if value.lstrip().startswith(("{", "[")):
+            try:
+                parsed = json.loads(value)
+            except json.JSONDecodeError:
+                return sample  # keep real broken JSON for the fixers to find
+            indent = 2 if rng.random() < self.multiline_ratio else None
+            return quote_literal(json.dumps(self.json_like(parsed), ensure_ascii=False, indent=indent))
+        return quote_literal(self.text(len(value)))
+
+
+def write_table(
+    fout: TextIO,
+    table: str,
+    profile: TableProfile,
+    model: SchemaModel,
+    generated: dict[str, int],
+    unique_columns: set[str],
+    values: ValueGenerator,
+    target_bytes: int,
+    copy_format: bool,
+) -> tuple[int, int]:
+    """Generate rows for one table until target_bytes is reached. Returns (rows, bytes)."""
+    rng = values.rng
+    pk = model.primary_keys.get(table, ())
+    references: dict[str, str] = {}
+    for fk in model.parents(table):
+        if len(fk.columns) == 1:
+            references[fk.columns[0]] = fk.ref_table
+
+    column_list = ", ".join(profile.columns)
+    if copy_format:
+        fout.write(f"COPY public.{table} ({column_list}) FROM stdin;\n")
+    rows = size = 0
+    while size < target_bytes or rows == 0:
+        tokens = []
+        for column in profile.columns:
+            column_profile = profile.profiles[column]
+            parent = references.get(column)
+            if pk == (column,) and "uuid" in column_profile.kinds:
+                token = f"'{synthetic_id(table, rows)}'"
+            elif parent is not None and "uuid" in column_profile.kinds:
+                # Self-references can only point at rows already written
+                available = rows if parent == table else generated.get(parent, 0)
+                token = values.token(column_profile)
+                if token != "NULL" or column in pk:
+                    token = f"'{synthetic_id(parent, rng.randrange(available))}'" if available else "NULL"
+            else:
+                token = values.token(column_profile)
+                if column in unique_columns and token_kind(token) == "text":
+                    token = f"{token[:-1]}-{rows}'"
+            tokens.append(token)
+
+        if copy_format:
+            line = "\t".join(copy_field(t) for t in tokens) + "\n"
+        else:
+            line = f"INSERT INTO public.{table} ({column_list}) VALUES ({', '.join(tokens)});\n"
+        fout.write(line)
+        rows += 1
+        size += len(line.encode("utf-8"))
+
+    if copy_format:
+        fout.write("\\.\n\n")
+    generated[table] = rows
+    return rows, size
+
+
+def generate_dump(
+    fout: TextIO,
+    template: Path,
+    size: int,
+    copy_format: bool = False,
+    multiline_ratio: float = 0.05,
+    seed: int = 0,
+) -> dict[str, tuple[int, int]]:
+    """Write a synthetic dump of about `size` bytes to fout. Returns (rows, bytes) per table."""
+    rng = random.Random(seed)
+    schema_file = template / "table_schema.sql"
+    model = parse_schema(schema_file)
+    profiles = profile_tables(template, rng)
+    total = sum(p.bytes for p in profiles.values()) or 1
+
+    unique: dict[str, set[str]] = {}
+    for table, column in _UNIQUE.findall(read_text(schema_file)):
+        unique.setdefault(table, set()).add(column)
+
+    fout.write("--\n-- Synthetic PostgreSQL database dump\n")
+    fout.write(f"-- Template: {template}, target size: {size} bytes, seed: {seed}\n--\n\n")
+
+    values = ValueGenerator(rng, multiline_ratio)
+    generated: dict[str, int] = {}
+    results: dict[str, tuple[int, int]] = {}
+    for table in model.insert_order(list(profiles)):
+        profile = profiles[table]
+        target = size * profile.bytes // total
+        results[table] = write_table(
+            fout, table, profile, model, generated, unique.get(table, set()), values, target, copy_format,
+        )
+
+    fout.write("\n")
+    for statement in iter_statements(read_text(schema_file).splitlines(keepends=True)):
+        fout.write(statement + "\n")
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    if not (args.template / "table_schema.sql").exists():
+        print(f"Error: Schema file not found: {args.template / 'table_schema.sql'}")
+        return
+    if not 0 <= args.multiline_ratio <= 1:
+        print("Error: --multiline-ratio must be between 0 and 1")
+        return
+
+    with open_output(args.output) as fout:
+        results = generate_dump(
+            fout, args.template, args.size, args.format == "copy", args.multiline_ratio, args.seed,
+        )
+
+    if is_stdio(args.output):
+        return
+    for table, (rows, size) in results.items():
+        print(f"  {table}: {rows} rows, {size / (1 << 20):.1f} MB")
+    total = sum(size for _, size in results.values())
+    print(f"\nWrote {sum(r for r, _ in results.values())} rows ({total / (1 << 20):.1f} MB) to '{args.output}'")
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
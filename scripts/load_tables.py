@@ -0,0 +1,422 @@
+"""Load per-table SQL files into PostgreSQL in batches, quarantining rows that fail."""
+import argparse
+import json
+import os
+import subprocess
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from dump_io import table_chunk_map
+from dump_patch import PatchError, check_patches, file_statements, use_patch
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, stage, start_stats
+from schema_model import parse_schema
+
+
+# Executes a batch of statements in one transaction; returns (psql exit code, server error or None)
+BatchExecutor = Callable[[list[str]], tuple[int, str | None]]
+
+# psql exit code for an error in the script under ON_ERROR_STOP; 1 and 2 mean psql itself failed
+PSQL_SCRIPT_ERROR = 3
+
+
+class LoadError(Exception):
+    """psql failed for a reason no row is to blame for (connection, login, missing database)."""
+
+
+class _Stopped(LoadError):
+    """Raised in the other workers once one worker's failure has stopped the load."""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Load table_*.sql files into PostgreSQL in FK-safe order using batched transactions. "
+            "Failing batches are bisected to isolate bad rows, which are written to a quarantine file."
+        ),
+    )
+    parser.add_argument(
+        "input_dir",
+        type=Path,
+        nargs="?",
+        default=Path("scripts/backup_plain_tables"),
+        help="Directory containing table_*.sql files (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Number of INSERT statements per transaction (default: 500).",
+    )
+    parser.add_argument(
+        "--quarantine",
+        type=Path,
+        help="File to write rejected statements to (default: <input_dir>/quarantine.sql).",
+    )
+    parser.add_argument(
+        "--schema",
+        action="store_true",
+        help="Run table_schema.sql before loading data.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help=(
+            "Chunks of one table to load at the same time, for tables split with "
+            "split_by_table.py --max-chunk-* and no self-referencing FK (default: 1)."
+        ),
+    )
+    parser.add_argument(
+        "--plan",
+        type=Path,
+        help="Run a JSON load plan from plan_load.py, one psql session per planned worker.",
+    )
+    parser.add_argument(
+        "--patch",
+        type=Path,
+        help="Apply a patch file from the JSON fixers' --patch option to the table files as they are read.",
+    )
+    add_connection_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+def add_connection_args(parser: argparse.ArgumentParser) -> None:
+    """Add the psql connection options shared by the loading tools."""
+    parser.add_argument("--dbname", "-d", default=os.environ.get("DB_NAME"), help="Database name (default: $DB_NAME).")
+    parser.add_argument("--username", "-U", default=os.environ.get("DB_USER"), help="Database user (default: $DB_USER).")
+    parser.add_argument("--host", default=os.environ.get("DB_HOST"), help="Database host (default: $DB_HOST).")
+    parser.add_argument("--port", default=os.environ.get("DB_PORT"), help="Database port (default: $DB_PORT).")
+    parser.add_argument("--psql", default="psql", help="psql executable to use (default: psql).")
+
+
+def psql_command(args: argparse.Namespace) -> list[str]:
+    """Build a psql command line that runs a script from stdin in one transaction."""
+    cmd = [args.psql, "-X", "-q", "-v", "ON_ERROR_STOP=1", "--single-transaction"]
+    if args.dbname:
+        cmd += ["-d", args.dbname]
+    if args.username:
+        cmd += ["-U", args.username]
+    if args.host:
+        cmd += ["-h", args.host]
+    if args.port:
+        cmd += ["-p", str(args.port)]
+    return cmd + ["-f", "-"]
+
+
+def make_psql_executor(command: list[str]) -> BatchExecutor:
+    """Return an executor that sends each batch to psql as a single transaction."""
+
+    def execute(statements: list[str]) -> tuple[int, str | None]:
+        sql = "\n".join(statements) + "\n"
+        with stage("execute", nbytes=len(sql), rows=len(statements)):
+            result = subprocess.run(command, input=sql.encode("utf-8"), capture_output=True)
+        if result.returncode == 0:
+            return 0, None
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        return result.returncode, error or f"psql exited with code {result.returncode}"
+
+    return execute
+
+
+def load_batch(
+    statements: list[str],
+    execute: BatchExecutor,
+    rejected: list[tuple[str, str]],
+    known_error: str | None = None,
+) -> int:
+    """
+    Load a batch, bisecting on failure until every bad statement is isolated.
+
+    Good halves are committed as they are found, so each bad row costs about
+    log2(len(statements)) extra round-trips instead of a full reload.
+    Rejected statements are appended to `rejected` with the server error.
+    Returns the number of statements committed.
+
+    known_error is passed when the batch is already known to fail, so it is
+    split straight away instead of being sent again. Only script errors (psql
+    exit code 3) are bisected; any other failure raises LoadError, as no row
+    would load.
+    """
+    error = known_error
+    if error is None:
+        code, error = execute(statements)
+        if code == 0:
+            return len(statements)
+        if code != PSQL_SCRIPT_ERROR:
+            raise LoadError(f"psql exited with code {code}:\n{error}")
+
+    if len(statements) == 1:
+        rejected.append((statements[0], error))
+        return 0
+
+    mid = len(statements) // 2
+    rejected_before = len(rejected)
+    loaded = load_batch(statements[:mid], execute, rejected)
+    # If the first half went in cleanly, the failure must be in the second half
+    second_error = error if len(rejected) == rejected_before else None
+    loaded += load_batch(statements[mid:], execute, rejected, second_error)
+    return loaded
+
+
+def load_file(
+    file_path: Path,
+    execute: BatchExecutor,
+    batch_size: int,
+    rejected: list[tuple[str, str]],
+) -> tuple[int, int]:
+    """Stream a table file in batches. Returns (loaded, rejected) row counts."""
+    loaded = 0
+    rejected_before = len(rejected)
+    batch: list[str] = []
+
+    for statement in file_statements(file_path):
+        batch.append(statement)
+        if len(batch) >= batch_size:
+            loaded += load_batch(batch, execute, rejected)
+            batch = []
+
+    if batch:
+        loaded += load_batch(batch, execute, rejected)
+
+    return loaded, len(rejected) - rejected_before
+
+
+def write_quarantine(quarantine_path: Path, rejected: list[tuple[str, str]]) -> None:
+    """Write rejected statements, each preceded by its server error as SQL comments."""
+    with quarantine_path.open("w", encoding="utf-8") as fout:
+        fout.write("-- Statements rejected by the server during load\n")
+        fout.write(f"-- Total rows: {len(rejected)}\n\n")
+        for statement, error in rejected:
+            for error_line in error.splitlines():
+                fout.write(f"-- {error_line}\n")
+            fout.write(statement + "\n\n")
+
+
+def _run_workers(workers: list[Callable[[], None]], max_workers: int, stop: threading.Event) -> None:
+    """
+    Run workers on up to max_workers threads and wait for all of them.
+
+    The first failure sets stop, which makes the others' executors (see
+    _stoppable) raise at their next batch; that failure is then re-raised.
+    """
+
+    def run(worker: Callable[[], None]) -> None:
+        try:
+            worker()
+        except Exception:
+            stop.set()
+            raise
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [pool.submit(run, worker) for worker in workers]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise next((e for e in errors if not isinstance(e, _Stopped)), errors[0])
+
+
+def _stoppable(execute: BatchExecutor, stop: threading.Event) -> BatchExecutor:
+    """execute, but raising _Stopped instead of sending a batch once stop is set."""
+
+    def run(statements: list[str]) -> tuple[int, str | None]:
+        if stop.is_set():
+            raise _Stopped("Stopped after another worker failed")
+        return execute(statements)
+
+    return run
+
+
+def load_chunks(
+    chunk_files: list[Path],
+    execute: BatchExecutor,
+    batch_size: int,
+    jobs: int,
+    rejected: list[tuple[str, str]],
+) -> list[tuple[Path, int, int]]:
+    """
+    Load the chunks of one table on up to `jobs` threads, each with its own psql sessions.
+
+    Only for tables without a self-referencing FK: chunk order does not matter
+    when no row of the table points at another. Rejected statements are
+    appended to `rejected` in chunk order, also when a chunk fails and stops
+    the others. Returns (chunk, loaded, rejected count) per chunk, in chunk order.
+    """
+    stop = threading.Event()
+    execute = _stoppable(execute, stop)
+    loaded = [0] * len(chunk_files)
+    chunk_rejected: list[list[tuple[str, str]]] = [[] for _ in chunk_files]
+
+    def load_chunk(i: int) -> None:
+        loaded[i], _ = load_file(chunk_files[i], execute, batch_size, chunk_rejected[i])
+
+    try:
+        _run_workers([partial(load_chunk, i) for i in range(len(chunk_files))], min(jobs, len(chunk_files)), stop)
+    finally:
+        for statements in chunk_rejected:
+            rejected.extend(statements)
+    return [(chunk_files[i], loaded[i], len(chunk_rejected[i])) for i in range(len(chunk_files))]
+
+
+def load_directory(
+    input_dir: Path,
+    execute: BatchExecutor,
+    batch_size: int,
+    jobs: int = 1,
+    rejected: list[tuple[str, str]] | None = None,
+) -> tuple[int, list[tuple[str, str]]]:
+    """
+    Load every table file (or chunk) in FK-safe order. Returns (loaded, rejected).
+
+    Rejected statements go to `rejected` (a new list if None) as they are
+    isolated, so a caller that passes one still has them if LoadError ends
+    the load early.
+    """
+    model = parse_schema(input_dir / "table_schema.sql")
+    table_files = table_chunk_map(input_dir)
+    insert_order = model.insert_order(list(table_files))
+
+    total_loaded = 0
+    rejected = [] if rejected is None else rejected
+
+    for table in insert_order:
+        chunk_files = table_files[table]
+        if jobs > 1 and len(chunk_files) > 1 and not model.self_referencing(table):
+            results = load_chunks(chunk_files, execute, batch_size, jobs, rejected)
+        else:
+            results = []
+            for chunk_file in chunk_files:
+                loaded, chunk_rejected = load_file(chunk_file, execute, batch_size, rejected)
+                results.append((chunk_file, loaded, chunk_rejected))
+
+        for chunk_file, loaded, chunk_rejected in results:
+            total_loaded += loaded
+            status = f", {chunk_rejected} quarantined" if chunk_rejected else ""
+            print(f"  {chunk_file.name}: {loaded} rows loaded{status}")
+
+    return total_loaded, rejected
+
+
+def run_plan(
+    input_dir: Path,
+    plan: dict,
+    execute: BatchExecutor,
+    batch_size: int,
+    rejected: list[tuple[str, str]] | None = None,
+) -> tuple[int, list[tuple[str, str]]]:
+    """
+    Run a plan_load.py plan: each worker thread loads its tasks in order,
+    first waiting for the tasks they depend on. Returns (loaded, rejected).
+
+    rejected is filled as in load_directory. If one worker fails, the others
+    stop at their next batch and the first failure is raised.
+    """
+    tasks = {task["id"]: task for task in plan["tasks"]}
+    finished = {task_id: threading.Event() for task_id in tasks}
+    lock = threading.Lock()
+    stop = threading.Event()
+    execute = _stoppable(execute, stop)
+    totals = [0]
+    rejected = [] if rejected is None else rejected
+
+    def run_worker(task_ids: list[str]) -> None:
+        for task_id in task_ids:
+            task = tasks[task_id]
+            for dep in task["depends_on"]:
+                finished[dep].wait()
+            try:
+                for file_name in task["files"]:
+                    task_rejected: list[tuple[str, str]] = []
+                    try:
+                        loaded, _ = load_file(input_dir / file_name, execute, batch_size, task_rejected)
+                    finally:
+                        with lock:
+                            rejected.extend(task_rejected)
+                    with lock:
+                        totals[0] += loaded
+                    status = f", {len(task_rejected)} quarantined" if task_rejected else ""
+                    print(f"  {file_name}: {loaded} rows loaded{status}")
+            finally:
+                # Dependants still run (and quarantine FK failures) if this task broke
+                finished[task_id].set()
+
+    worker_tasks = [ids for ids in plan["worker_tasks"] if ids]
+    _run_workers([partial(run_worker, ids) for ids in worker_tasks], len(worker_tasks), stop)
+
+    return totals[0], rejected
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "load_tables")
+    start_profile(args, "load_tables")
+    input_dir: Path = args.input_dir
+    quarantine_path: Path = args.quarantine or input_dir / "quarantine.sql"
+
+    if not (input_dir / "table_schema.sql").exists():
+        print(f"Error: Schema file not found: {input_dir / 'table_schema.sql'}")
+        return
+
+    if args.batch_size < 1:
+        print("Error: --batch-size must be at least 1")
+        return
+
+    if args.jobs < 1:
+        print("Error: --jobs must be at least 1")
+        return
+
+    if args.patch:
+        if not args.patch.exists():
+            print(f"Error: Patch file not found: {args.patch}")
+            return
+        use_patch(args.patch)
+        # Hash mismatches would otherwise only show once earlier batches are committed
+        try:
+            check_patches(input_dir)
+        except PatchError as e:
+            print(f"Error: {e}")
+            return
+
+    execute = make_psql_executor(psql_command(args))
+
+    if args.schema:
+        print("Inserting schema...")
+        _, error = execute([(input_dir / "table_schema.sql").read_text(encoding="utf-8")])
+        if error:
+            print(f"Error: schema failed to load:\n{error}")
+            return
+
+    rejected: list[tuple[str, str]] = []
+    try:
+        if args.plan:
+            plan = json.loads(args.plan.read_text(encoding="utf-8"))
+            print(f"Loading tables from '{input_dir}' with plan '{args.plan}' ({plan['workers']} workers)...")
+            loaded, _ = run_plan(input_dir, plan, execute, args.batch_size, rejected)
+        else:
+            print(f"Loading tables from '{input_dir}' (batch size {args.batch_size})...")
+            loaded, _ = load_directory(input_dir, execute, args.batch_size, args.jobs, rejected)
+    except (PatchError, LoadError) as e:
+        print(f"Error: {e}")
+        # Batches before the failure are already committed; keep the rows they rejected
+        if rejected:
+            write_quarantine(quarantine_path, rejected)
+            print(f"Quarantined {len(rejected)} rows rejected before the failure -> '{quarantine_path}'")
+        return
+
+    if rejected:
+        write_quarantine(quarantine_path, rejected)
+        print(f"\nLoaded {loaded} rows, quarantined {len(rejected)} rows -> '{quarantine_path}'")
+    else:
+        print(f"\nLoaded {loaded} rows")
+    finish_profile(args, "load_tables")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
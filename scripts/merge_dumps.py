@@ -0,0 +1,227 @@
+"""
+Merge several dumps table by table, resolving primary-key collisions by policy.
+
+Each table is read twice per source. The first pass builds an index of
+key -> (winning source, updatedAt, row fingerprint); the second pass
+re-reads the sources and writes each key's winning row. Only that index
+is held in memory, never whole rows.
+
+Policies for a key present in more than one source with different rows:
+  newest    the row with the latest "updatedAt" wins (ties and rows without
+            the column fall back to source order)
+  priority  the first source listed wins
+  fail      stop with an error
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from diff_dumps import row_fingerprint
+from dump_io import is_stdio
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, start_stats
+from dump_source import resolve_table_dir, table_files
+from extract_changes import parse_timestamp
+from row_selection import ColumnPositions, Key, iter_table_rows, row_key
+from schema_model import SchemaModel, parse_schema
+from split_by_table import write_table_file
+
+
+POLICIES = ("newest", "priority", "fail")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Merge N dumps into one table_*.sql directory, resolving primary-key conflicts.",
+    )
+    parser.add_argument(
+        "inputs",
+        type=Path,
+        nargs="+",
+        help="Table directories, SQL dumps (.gz/.zst) or pg_dump archives, highest priority first.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        "-o",
+        type=Path,
+        required=True,
+        help="Directory for the merged table files (must not exist or be empty).",
+    )
+    parser.add_argument(
+        "--policy",
+        choices=POLICIES,
+        default="newest",
+        help="How to resolve a key present in several sources (default: newest).",
+    )
+    parser.add_argument(
+        "--timestamp-column",
+        default='"updatedAt"',
+        help='Column compared by the newest policy (default: "updatedAt").',
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory for tables extracted from dump files (default: system temp dir).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when an input is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+class MergeConflict(ValueError):
+    pass
+
+
+def _timestamp(columns: list[str], values: list[str], column: str) -> datetime | None:
+    if column not in columns:
+        return None
+    return parse_timestamp(values[columns.index(column)])
+
+
+def _wins(policy: str, current: tuple[int, datetime | None, bytes], candidate: tuple[int, datetime | None, bytes]) -> bool:
+    """Whether candidate (from a later source) replaces current."""
+    if policy != "newest":
+        return False
+    _, current_ts, _ = current
+    _, candidate_ts, _ = candidate
+    return candidate_ts is not None and (current_ts is None or candidate_ts > current_ts)
+
+
+def merge_table(
+    table: str,
+    model: SchemaModel,
+    sources: list[Path | None],
+    output_file: Path,
+    policy: str,
+    timestamp_column: str,
+    source_name: str,
+) -> tuple[int, int]:
+    """Merge one table from every source that has it. Returns (rows written, conflicts)."""
+    positions = ColumnPositions()
+    index: dict[Key, tuple[int, datetime | None, bytes]] = {}
+    conflicts = 0
+
+    for i, table_file in enumerate(sources):
+        if table_file is None:
+            continue
+        for columns, values, _ in iter_table_rows(table_file):
+            key = row_key(model, table, columns, values, positions)
+            candidate = (i, _timestamp(columns, values, timestamp_column), row_fingerprint(columns, values))
+            current = index.get(key)
+            if current is None:
+                index[key] = candidate
+                continue
+            if current[2] == candidate[2]:
+                continue  # same row in several sources
+            conflicts += 1
+            if policy == "fail":
+                raise MergeConflict(
+                    f"{table}: key ({', '.join(key)}) differs between '{sources[current[0]]}' and '{table_file}'"
+                )
+            if _wins(policy, current, candidate):
+                index[key] = candidate
+
+    def lines():
+        for i, table_file in enumerate(sources):
+            if table_file is None:
+                continue
+            for columns, values, statement in iter_table_rows(table_file):
+                key = row_key(model, table, columns, values, positions)
+                winner = index.get(key)
+                if winner is not None and winner[0] == i:
+                    del index[key]  # emit each key once
+                    yield statement + "\n"
+
+    rows = write_table_file(output_file, table, source_name, lines())
+    return rows, conflicts
+
+
+def merge_dirs(
+    table_dirs: list[Path],
+    output_dir: Path,
+    policy: str,
+    timestamp_column: str,
+    source_name: str,
+) -> dict[str, tuple[int, int]]:
+    """Merge table directories into output_dir. Returns (rows, conflicts) per table."""
+    schema_files = [d / "table_schema.sql" for d in table_dirs if (d / "table_schema.sql").exists()]
+    if not schema_files:
+        raise ValueError("None of the inputs has a table_schema.sql")
+    model = parse_schema(schema_files[0])
+
+    table_maps = [table_files(d) for d in table_dirs]
+    tables = sorted(set().union(*table_maps))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results: dict[str, tuple[int, int]] = {}
+    for table in model.insert_order(tables):
+        sources = [m.get(table) for m in table_maps]
+        results[table] = merge_table(
+            table, model, sources, output_dir / f"table_{table}.sql", policy, timestamp_column, source_name,
+        )
+
+    shutil.copyfile(schema_files[0], output_dir / "table_schema.sql")
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "merge_dumps")
+    start_profile(args, "merge_dumps")
+    output_dir: Path = args.output_dir
+
+    for path in args.inputs:
+        if not is_stdio(path) and not path.exists():
+            print(f"Error: Input '{path}' not found")
+            return
+    if output_dir.exists() and any(output_dir.iterdir()):
+        print(f"Error: Output directory '{output_dir}' is not empty")
+        return
+
+    source_name = " + ".join(str(p) for p in args.inputs)
+    # Build the result next to the destination and move it into place only on success
+    part_dir = output_dir.with_name(output_dir.name + ".part")
+    shutil.rmtree(part_dir, ignore_errors=True)
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        try:
+            table_dirs = [
+                resolve_table_dir(path, Path(tmp) / f"source_{i}", args.jobs) for i, path in enumerate(args.inputs)
+            ]
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        print(f"Merging {len(table_dirs)} dumps (policy: {args.policy})...")
+        try:
+            results = merge_dirs(table_dirs, part_dir, args.policy, args.timestamp_column, source_name)
+        except MergeConflict as exc:
+            shutil.rmtree(part_dir, ignore_errors=True)
+            print(f"Error: {exc}")
+            return
+
+    if output_dir.exists():
+        output_dir.rmdir()
+    part_dir.rename(output_dir)
+
+    for table, (rows, conflicts) in results.items():
+        if rows:
+            note = f" ({conflicts} conflicts resolved)" if conflicts else ""
+            print(f"  table_{table}.sql: {rows} rows{note}")
+    print(f"\nMerged {sum(r for r, _ in results.values())} rows into '{output_dir}'")
+    finish_profile(args, "merge_dumps")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
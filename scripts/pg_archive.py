@@ -0,0 +1,490 @@
+"""
+Pure-Python reader for pg_dump custom-format (-Fc) and directory-format (-Fd) archives.
+
+Walks the archive header and TOC the same way pg_restore does and streams each
+table's (decompressed) COPY data, so the dump tools can consume an archive
+directly instead of a plain-format intermediate file. Archive versions 1.10
+through 1.16 (pg_dump 8.0 - 17) are supported, with uncompressed, gzip and
+zstd data blocks; zstd needs the optional `zstandard` package.
+"""
+import argparse
+import gzip
+import sys
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+ARCHIVE_MAGIC = b"PGDMP"
+
+# ArchiveFormat values written in the header
+FORMAT_CUSTOM = 1
+FORMAT_TAR = 3
+FORMAT_DIRECTORY = 5
+
+# pg_compress_algorithm values (archive version 1.15+)
+COMPRESSION_NONE = 0
+COMPRESSION_GZIP = 1
+COMPRESSION_LZ4 = 2
+COMPRESSION_ZSTD = 3
+
+# teSection values of TOC entries
+SECTION_NONE = 1
+SECTION_PRE_DATA = 2
+SECTION_DATA = 3
+SECTION_POST_DATA = 4
+
+# Data block types in custom-format archives
+_BLK_DATA = 1
+_BLK_BLOBS = 3
+
+# Offset flags written after each TOC entry in custom-format archives
+_OFFSET_POS_NOT_SET = 1
+_OFFSET_POS_SET = 2
+_OFFSET_NO_DATA = 3
+
+_MIN_VERSION = (1, 10)
+_MAX_VERSION = (1, 16)
+
+
+class ArchiveError(Exception):
+    """Raised when an archive is malformed or uses an unsupported feature."""
+
+
+@dataclass
+class TocEntry:
+    dump_id: int
+    had_dumper: bool
+    tag: str
+    desc: str
+    section: int
+    defn: str
+    copy_stmt: str
+    namespace: str
+    owner: str
+    dependencies: list[int] = field(default_factory=list)
+    # Custom format: where the entry's data block starts, if known
+    data_state: int = _OFFSET_NO_DATA
+    data_offset: int = 0
+    # Directory/tar format: name of the entry's data file
+    filename: str = ""
+
+    @property
+    def has_data(self) -> bool:
+        if self.filename:
+            return True
+        return self.had_dumper and self.data_state != _OFFSET_NO_DATA
+
+
+@dataclass
+class Archive:
+    version: tuple[int, int, int]
+    int_size: int
+    off_size: int
+    format: int
+    compression: int
+    dbname: str
+    server_version: str
+    dump_version: str
+    entries: list[TocEntry]
+    # File offset just past the TOC, where custom-format data blocks begin
+    data_start: int = 0
+
+
+class _Reader:
+    """Primitive readers matching ReadByte/ReadInt/ReadStr/ReadOffset in pg_backup_archiver.c."""
+
+    def __init__(self, fh: BinaryIO) -> None:
+        self._fh = fh
+        self.int_size = 4
+        self.off_size = 8
+        self.position = 0
+
+    def read(self, n: int) -> bytes:
+        data = self._fh.read(n)
+        if len(data) != n:
+            raise ArchiveError("Unexpected end of archive")
+        self.position += n
+        return data
+
+    def read_byte(self) -> int:
+        return self.read(1)[0]
+
+    def read_int(self) -> int:
+        sign = self.read_byte()
+        value = int.from_bytes(self.read(self.int_size), "little")
+        return -value if sign else value
+
+    def read_str(self) -> str | None:
+        length = self.read_int()
+        if length < 0:
+            return None
+        return self.read(length).decode("utf-8") if length else ""
+
+    def read_offset(self) -> tuple[int, int]:
+        state = self.read_byte()
+        return state, int.from_bytes(self.read(self.off_size), "little")
+
+
+def read_archive(fh: BinaryIO) -> Archive:
+    """Read the header and TOC of a custom- or directory-format archive (toc.dat)."""
+    reader = _Reader(fh)
+    if reader.read(5) != ARCHIVE_MAGIC:
+        raise ArchiveError("Not a pg_dump archive (missing PGDMP magic)")
+
+    version = (reader.read_byte(), reader.read_byte(), reader.read_byte())
+    if not (_MIN_VERSION <= version[:2] <= _MAX_VERSION):
+        raise ArchiveError(f"Unsupported archive version {version[0]}.{version[1]}")
+
+    reader.int_size = reader.read_byte()
+    reader.off_size = reader.read_byte()
+    archive_format = reader.read_byte()
+    if archive_format not in (FORMAT_CUSTOM, FORMAT_DIRECTORY, FORMAT_TAR):
+        raise ArchiveError(f"Unsupported archive format {archive_format}")
+
+    if version[:2] >= (1, 15):
+        compression = reader.read_byte()
+    else:
+        # Older archives store a zlib level; anything non-zero means gzip
+        compression = COMPRESSION_GZIP if reader.read_int() != 0 else COMPRESSION_NONE
+
+    for _ in range(7):  # creation timestamp (struct tm fields)
+        reader.read_int()
+
+    dbname = reader.read_str() or ""
+    server_version = reader.read_str() or ""
+    dump_version = reader.read_str() or ""
+
+    entries = [_read_toc_entry(reader, version, archive_format) for _ in range(reader.read_int())]
+
+    return Archive(
+        version=version,
+        int_size=reader.int_size,
+        off_size=reader.off_size,
+        format=archive_format,
+        compression=compression,
+        dbname=dbname,
+        server_version=server_version,
+        dump_version=dump_version,
+        entries=entries,
+        data_start=reader.position,
+    )
+
+
+def _section_of(desc: str) -> int:
+    """The section of an entry from an archive older than 1.11, which does not store it (as pg_restore derives it)."""
+    if desc in ("COMMENT", "ACL", "ACL LANGUAGE"):
+        return SECTION_NONE
+    if desc in ("TABLE DATA", "BLOBS", "BLOB COMMENTS"):
+        return SECTION_DATA
+    if desc in ("CONSTRAINT", "CHECK CONSTRAINT", "FK CONSTRAINT", "INDEX", "RULE", "TRIGGER"):
+        return SECTION_POST_DATA
+    return SECTION_PRE_DATA
+
+
+def _read_toc_entry(reader: _Reader, version: tuple[int, int, int], archive_format: int) -> TocEntry:
+    dump_id = reader.read_int()
+    had_dumper = bool(reader.read_int())
+    reader.read_str()  # catalog tableoid
+    reader.read_str()  # catalog oid
+    tag = reader.read_str() or ""
+    desc = reader.read_str() or ""
+    if version[:2] >= (1, 11):
+        section = reader.read_int()
+    else:
+        section = _section_of(desc)
+    defn = reader.read_str() or ""
+    reader.read_str()  # drop statement
+    copy_stmt = reader.read_str() or ""
+    namespace = reader.read_str() or ""
+    reader.read_str()  # tablespace
+    if version[:2] >= (1, 14):
+        reader.read_str()  # table access method
+    if version[:2] >= (1, 16):
+        reader.read_int()  # relkind
+    owner = reader.read_str() or ""
+    reader.read_str()  # "with oids", always "false" in supported versions
+
+    dependencies: list[int] = []
+    while True:
+        dep = reader.read_str()
+        if dep is None:
+            break
+        dependencies.append(int(dep))
+
+    entry = TocEntry(
+        dump_id=dump_id,
+        had_dumper=had_dumper,
+        tag=tag,
+        desc=desc,
+        section=section,
+        defn=defn,
+        copy_stmt=copy_stmt,
+        namespace=namespace,
+        owner=owner,
+        dependencies=dependencies,
+    )
+
+    if archive_format == FORMAT_CUSTOM:
+        entry.data_state, entry.data_offset = reader.read_offset()
+    else:
+        entry.filename = reader.read_str() or ""
+
+    return entry
+
+
+def _decompressor(compression: int):
+    """Return an object with .decompress(bytes) for a custom-format data block."""
+    if compression == COMPRESSION_NONE:
+        return None
+    if compression == COMPRESSION_GZIP:
+        return zlib.decompressobj()
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ArchiveError("zstd-compressed archives require the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ArchiveError("lz4-compressed archives are not supported; re-dump with -Z gzip or -Z zstd")
+
+
+def _iter_block_chunks(reader: _Reader, compression: int) -> Iterator[bytes]:
+    """Yield the decompressed payload of the data block at the reader's position."""
+    decompressor = _decompressor(compression)
+    while True:
+        length = reader.read_int()
+        if length <= 0:
+            break
+        chunk = reader.read(length)
+        if decompressor is None:
+            yield chunk
+        else:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+    if compression == COMPRESSION_GZIP:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def _skip_block(reader: _Reader) -> None:
+    while True:
+        length = reader.read_int()
+        if length <= 0:
+            return
+        reader.read(length)
+
+
+def iter_custom_data(fh: BinaryIO, archive: Archive) -> Iterator[tuple[TocEntry, Iterator[bytes]]]:
+    """
+    Yield (entry, chunks) for every table data block of a custom-format archive, in TOC order.
+
+    Seekable files jump to each entry's recorded offset. Archives written to a
+    pipe have no offsets, so blocks are read sequentially; pg_dump writes them
+    in TOC order. Each chunk iterator must be consumed before advancing.
+    """
+    by_id = {entry.dump_id: entry for entry in archive.entries}
+    reader = _Reader(fh)
+    reader.int_size = archive.int_size
+    reader.off_size = archive.off_size
+    reader.position = archive.data_start
+    seekable = fh.seekable()
+
+    if seekable and all(e.data_state == _OFFSET_POS_SET for e in archive.entries if e.has_data):
+        for entry in archive.entries:
+            if not entry.has_data or entry.desc != "TABLE DATA":
+                continue
+            fh.seek(entry.data_offset)
+            reader.position = entry.data_offset
+            block_type = reader.read_byte()
+            if block_type != _BLK_DATA or reader.read_int() != entry.dump_id:
+                raise ArchiveError(f"Corrupt data block for {entry.tag}")
+            yield entry, _iter_block_chunks(reader, archive.compression)
+        return
+
+    if seekable:
+        fh.seek(archive.data_start)
+    while True:
+        block = fh.read(1)
+        if not block:
+            return
+        reader.position += 1
+        dump_id = reader.read_int()
+        entry = by_id.get(dump_id)
+        if block[0] == _BLK_DATA and entry is not None and entry.desc == "TABLE DATA":
+            chunks = _iter_block_chunks(reader, archive.compression)
+            yield entry, chunks
+            for _ in chunks:  # drain anything the caller left unread
+                pass
+        elif block[0] in (_BLK_DATA, _BLK_BLOBS):
+            if block[0] == _BLK_BLOBS:
+                # Large objects: a list of (oid, data block) pairs terminated by oid 0
+                while reader.read_int() != 0:
+                    _skip_block(reader)
+            else:
+                _skip_block(reader)
+        else:
+            raise ArchiveError(f"Unknown data block type {block[0]}")
+
+
+def read_directory_archive(archive_dir: Path) -> Archive:
+    """Read toc.dat of a directory-format archive."""
+    with (archive_dir / "toc.dat").open("rb") as fh:
+        archive = read_archive(fh)
+    if archive.format != FORMAT_DIRECTORY:
+        raise ArchiveError(f"{archive_dir / 'toc.dat'} is not a directory-format TOC")
+    return archive
+
+
+def is_directory_archive(path: Path) -> bool:
+    return path.is_dir() and (path / "toc.dat").is_file()
+
+
+def is_custom_archive(path: Path) -> bool:
+    """True if path is a custom-format (-Fc) archive file: PGDMP magic and the custom format byte."""
+    if not path.is_file():
+        return False
+    with path.open("rb") as fh:
+        head = fh.read(11)
+    return len(head) == 11 and head.startswith(ARCHIVE_MAGIC) and head[10] == FORMAT_CUSTOM
+
+
+def open_directory_data(archive_dir: Path, entry: TocEntry) -> BinaryIO:
+    """Open the (decompressed) data file of one directory-format TOC entry."""
+    base = archive_dir / entry.filename
+    if base.exists():
+        return base.open("rb")
+    if base.with_name(base.name + ".gz").exists():
+        return gzip.open(base.with_name(base.name + ".gz"), "rb")
+    if base.with_name(base.name + ".zst").exists():
+        if zstandard is None:
+            raise ArchiveError("zstd-compressed archives require the 'zstandard' package")
+        raw = base.with_name(base.name + ".zst").open("rb")
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+    if base.with_name(base.name + ".lz4").exists():
+        raise ArchiveError("lz4-compressed archives are not supported; re-dump with -Z gzip or -Z zstd")
+    raise ArchiveError(f"Data file for {entry.tag} not found: {base}")
+
+
+def _iter_file_chunks(fh: BinaryIO, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    with fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _entry_sql(entry: TocEntry) -> bytes:
+    if not entry.defn:
+        return b""
+    return (entry.defn.rstrip("\n") + "\n\n").encode("utf-8")
+
+
+def iter_directory_plain_sql(archive_dir: Path) -> Iterator[bytes]:
+    """Stream a directory-format archive as plain-format SQL, in TOC order."""
+    archive = read_directory_archive(archive_dir)
+    for entry in archive.entries:
+        if entry.desc == "TABLE DATA":
+            if entry.has_data:
+                yield entry.copy_stmt.encode("utf-8")
+                yield from _strip_terminator(_iter_file_chunks(open_directory_data(archive_dir, entry)))
+                yield b"\\.\n\n"
+            continue
+        yield _entry_sql(entry)
+
+
+def iter_plain_sql(fh: BinaryIO) -> Iterator[bytes]:
+    """
+    Stream a custom-format archive as plain-format SQL (what pg_restore -f - would print).
+
+    Schema entries are emitted from their TOC definitions and table data as
+    COPY ... FROM stdin blocks, in TOC order.
+    """
+    archive = read_archive(fh)
+    if archive.format != FORMAT_CUSTOM:
+        raise ArchiveError("Only custom-format archives can be streamed from a single file")
+
+    data_blocks = iter_custom_data(fh, archive)
+    pending = next(data_blocks, None)
+
+    for entry in archive.entries:
+        if entry.desc == "TABLE DATA":
+            if not entry.has_data:
+                continue
+            if pending is None or pending[0].dump_id != entry.dump_id:
+                # Skipping would leave every later table's data unmatched too
+                raise ArchiveError(f"Data block for {entry.tag} (dump ID {entry.dump_id}) is missing or out of order")
+            yield entry.copy_stmt.encode("utf-8")
+            yield from _strip_terminator(pending[1])
+            yield b"\\.\n\n"
+            pending = next(data_blocks, None)
+            continue
+        yield _entry_sql(entry)
+
+
+def _strip_terminator(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Pass COPY data through, dropping a trailing '\\.' line if the archive stored one."""
+    held = b""
+    for chunk in chunks:
+        data = held + chunk
+        # Hold back the last few bytes so a terminator split across chunks is still seen
+        held = data[-4:]
+        if len(data) > 4:
+            yield data[:-4]
+    # Only a '\\.' line of its own: a field can end in an escaped backslash and '.'
+    if held == b"\\.\n" or held.endswith(b"\n\\.\n"):
+        held = held[:-3]
+    if held:
+        yield held
+
+
+def _print_toc(archive: Archive) -> None:
+    print(f"; Archive version {'.'.join(map(str, archive.version))}, database {archive.dbname}")
+    print(f"; Dumped from {archive.server_version} by pg_dump {archive.dump_version}")
+    for entry in archive.entries:
+        data = " (data)" if entry.has_data else ""
+        print(f"{entry.dump_id}; {entry.desc} {entry.namespace} {entry.tag} {entry.owner}{data}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Inspect a pg_dump custom- or directory-format archive or print it as plain SQL.",
+    )
+    parser.add_argument("archive", type=Path, help="Path to a pg_dump -Fc archive or -Fd directory.")
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="Print the archive's table of contents instead of its SQL.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    if is_directory_archive(args.archive):
+        if args.list:
+            _print_toc(read_directory_archive(args.archive))
+        else:
+            for chunk in iter_directory_plain_sql(args.archive):
+                sys.stdout.buffer.write(chunk)
+        return
+
+    with args.archive.open("rb") as fh:
+        if args.list:
+            _print_toc(read_archive(fh))
+            return
+
+        out = sys.stdout.buffer
+        for chunk in iter_plain_sql(fh):
+            out.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Cost-based load plan: which table (or chunk) each of K loaders runs, and when.
+
+Every table file is weighted by its size and row count, read from the
+directory's manifest.json (split_by_table.py --manifest / --max-chunk-*) or
+from the files themselves. Tasks are scheduled by critical path: whenever a
+loader is free it takes the ready task with the longest chain of work still
+hanging off it, so big parents like knowledge_nodes start first and small
+leaf tables fill the gaps. A task becomes ready once every table it has a
+foreign key to has finished loading.
+
+Chunks of a table without a self-referencing FK are independent tasks;
+chunks of a self-referencing table run one after another.
+
+The plan is JSON: per-task files, dependencies and simulated start/finish,
+plus the task order per worker. load_tables.py --plan runs it.
+"""
+import argparse
+import heapq
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dump_io import open_input, table_chunk_map
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, stage, start_stats
+from schema_model import SchemaModel, parse_schema
+from split_by_table import read_manifest
+
+
+# Cost of one row in byte-equivalents: per-statement parse, WAL and index work
+# that a byte count alone does not capture
+_DEFAULT_ROW_COST = 256
+
+_TOTAL_ROWS = re.compile(r"-- Total rows: (\d+)")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Plan a parallel, FK-safe load of table_*.sql files weighted by table size.",
+    )
+    parser.add_argument(
+        "input_dir",
+        type=Path,
+        nargs="?",
+        default=Path("scripts/backup_plain_tables"),
+        help="Directory of table_*.sql files (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--workers",
+        "-k",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of parallel loaders to plan for (default: CPU count).",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=Path,
+        help="Write the JSON plan here (default: <input_dir>/load_plan.json).",
+    )
+    parser.add_argument(
+        "--row-cost",
+        type=int,
+        default=_DEFAULT_ROW_COST,
+        help=f"Cost of one row in bytes, added to the file size (default: {_DEFAULT_ROW_COST}).",
+    )
+    parser.add_argument(
+        "--throughput",
+        type=float,
+        default=8.0,
+        help="Load throughput of one worker in MB/s of cost, for the time estimate (default: 8).",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+@dataclass
+class LoadTask:
+    id: str
+    table: str
+    files: list[str]
+    rows: int
+    bytes: int
+    cost: int = 0
+    depends_on: list[str] = field(default_factory=list)
+    worker: int = -1
+    start: int = 0
+    finish: int = 0
+
+
+def count_rows(table_file: Path) -> int:
+    """Rows of a table file from its '-- Total rows' header, or by counting INSERT lines."""
+    with open_input(table_file) as fin:
+        for line in fin:
+            if not line.startswith("--"):
+                break
+            match = _TOTAL_ROWS.match(line)
+            if match:
+                return int(match.group(1))
+    with open_input(table_file) as fin:
+        return sum(1 for line in fin if line.lstrip().upper().startswith("INSERT INTO"))
+
+
+def table_sizes(input_dir: Path) -> dict[str, list[tuple[str, int, int]]]:
+    """Table -> [(file name, rows, bytes)] per chunk, from manifest.json or the files."""
+    manifest = read_manifest(input_dir)
+    if manifest is not None:
+        return {
+            table: [(chunk["file"], chunk["rows"], chunk["bytes"]) for chunk in entry["chunks"]]
+            for table, entry in manifest["tables"].items()
+        }
+    return {
+        table: [(path.name, count_rows(path), path.stat().st_size) for path in paths]
+        for table, paths in table_chunk_map(input_dir).items()
+    }
+
+
+def build_tasks(
+    sizes: dict[str, list[tuple[str, int, int]]],
+    model: SchemaModel,
+    row_cost: int,
+) -> list[LoadTask]:
+    """
+    One task per table file, with dependency edges from FKs.
+
+    Only edges that agree with the topological order are kept, so FK cycles
+    cannot deadlock the plan; they fall back to insert-order precedence.
+    """
+    order = model.insert_order(list(sizes))
+    position = {table: i for i, table in enumerate(order)}
+    chunk_ids: dict[str, list[str]] = {}
+    tasks: list[LoadTask] = []
+
+    for table in order:
+        chunks = sizes[table]
+        parents = sorted({
+            fk.ref_table for fk in model.parents(table)
+            if fk.ref_table in position and position[fk.ref_table] < position[table]
+        })
+        parent_ids = [task_id for parent in parents for task_id in chunk_ids[parent]]
+        ids = []
+        for i, (file_name, rows, size) in enumerate(chunks):
+            task_id = table if len(chunks) == 1 else f"{table}#{i + 1}"
+            depends_on = list(parent_ids)
+            if ids and model.self_referencing(table):
+                depends_on.append(ids[-1])
+            tasks.append(LoadTask(task_id, table, [file_name], rows, size, size + rows * row_cost, depends_on))
+            ids.append(task_id)
+        chunk_ids[table] = ids
+
+    return tasks
+
+
+def _children(tasks: list[LoadTask]) -> dict[str, list[str]]:
+    children: dict[str, list[str]] = {task.id: [] for task in tasks}
+    for task in tasks:
+        for dep in task.depends_on:
+            children[dep].append(task.id)
+    return children
+
+
+def bottom_levels(tasks: list[LoadTask]) -> dict[str, int]:
+    """Length of the costliest dependency chain starting at each task, its own cost included."""
+    children = _children(tasks)
+    levels: dict[str, int] = {}
+    # Tasks are in topological order, so walking them backwards sees children first
+    for task in reversed(tasks):
+        levels[task.id] = task.cost + max((levels[c] for c in children[task.id]), default=0)
+    return levels
+
+
+def schedule(tasks: list[LoadTask], workers: int) -> int:
+    """
+    List-schedule tasks on `workers` loaders by critical path. Returns the makespan.
+
+    Sets worker/start/finish on every task.
+    """
+    levels = bottom_levels(tasks)
+    by_id = {task.id: task for task in tasks}
+    waiting = {task.id: len(task.depends_on) for task in tasks}
+    children = _children(tasks)
+
+    # Ready tasks, longest remaining chain first (ties: bigger task, then name)
+    ready = [(-levels[t.id], -t.cost, t.id) for t in tasks if not t.depends_on]
+    heapq.heapify(ready)
+    idle = list(range(workers))
+    running: list[tuple[int, int, str]] = []  # (finish, worker, task id)
+    now = 0
+
+    while ready or running:
+        while ready and idle:
+            _, _, task_id = heapq.heappop(ready)
+            task = by_id[task_id]
+            task.worker = heapq.heappop(idle)
+            task.start = now
+            task.finish = now + task.cost
+            heapq.heappush(running, (task.finish, task.worker, task_id))
+
+        now, worker, task_id = heapq.heappop(running)
+        done = [(worker, task_id)]
+        while running and running[0][0] == now:
+            _, other_worker, other_id = heapq.heappop(running)
+            done.append((other_worker, other_id))
+
+        for worker, task_id in done:
+            heapq.heappush(idle, worker)
+            for child in children[task_id]:
+                waiting[child] -= 1
+                if waiting[child] == 0:
+                    heapq.heappush(ready, (-levels[child], -by_id[child].cost, child))
+
+    return now
+
+
+def critical_path(tasks: list[LoadTask]) -> list[str]:
+    """Task ids along the costliest dependency chain."""
+    levels = bottom_levels(tasks)
+    children = _children(tasks)
+
+    roots = [task.id for task in tasks if not task.depends_on]
+    if not roots:
+        return []
+    path = [max(roots, key=lambda t: levels[t])]
+    while children[path[-1]]:
+        path.append(max(children[path[-1]], key=lambda t: levels[t]))
+    return path
+
+
+def build_plan(input_dir: Path, workers: int, row_cost: int = _DEFAULT_ROW_COST) -> dict:
+    """Plan the load of input_dir on `workers` loaders and return the JSON-ready plan."""
+    with stage("read"):
+        model = parse_schema(input_dir / "table_schema.sql")
+        sizes = table_sizes(input_dir)
+    with stage("schedule"):
+        tasks = build_tasks(sizes, model, row_cost)
+        makespan = schedule(tasks, workers)
+
+    worker_tasks: list[list[str]] = [[] for _ in range(workers)]
+    for task in sorted(tasks, key=lambda t: (t.start, t.worker)):
+        worker_tasks[task.worker].append(task.id)
+
+    return {
+        "input_dir": str(input_dir),
+        "schema": "table_schema.sql",
+        "workers": workers,
+        "row_cost": row_cost,
+        "total_cost": sum(task.cost for task in tasks),
+        "makespan": makespan,
+        "critical_path": critical_path(tasks),
+        "worker_tasks": worker_tasks,
+        "tasks": [
+            {
+                "id": task.id,
+                "table": task.table,
+                "files": task.files,
+                "rows": task.rows,
+                "bytes": task.bytes,
+                "cost": task.cost,
+                "depends_on": task.depends_on,
+                "worker": task.worker,
+                "start": task.start,
+                "finish": task.finish,
+            }
+            for task in sorted(tasks, key=lambda t: (t.start, t.worker))
+        ],
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "plan_load")
+    start_profile(args, "plan_load")
+    input_dir: Path = args.input_dir
+
+    if not (input_dir / "table_schema.sql").exists():
+        print(f"Error: Schema file not found: {input_dir / 'table_schema.sql'}")
+        return
+    if args.workers < 1:
+        print("Error: --workers must be at least 1")
+        return
+
+    plan = build_plan(input_dir, args.workers, args.row_cost)
+    output: Path = args.output or input_dir / "load_plan.json"
+    output.write_text(json.dumps(plan, indent=2) + "\n", encoding="utf-8")
+
+    bytes_per_second = args.throughput * (1 << 20)
+    for worker, task_ids in enumerate(plan["worker_tasks"]):
+        print(f"  worker {worker + 1}: {', '.join(task_ids) or '(idle)'}")
+    print(f"\nCritical path: {' -> '.join(plan['critical_path'])}")
+    print(
+        f"Expected makespan: {plan['makespan']:,} cost units "
+        f"(~{plan['makespan'] / bytes_per_second:.1f}s at {args.throughput:g} MB/s per worker; "
+        f"serial: ~{plan['total_cost'] / bytes_per_second:.1f}s)"
+    )
+    print(f"Wrote plan for {len(plan['tasks'])} tasks on {args.workers} workers to '{output}'")
+    finish_profile(args, "plan_load")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Select rows across tables by primary key and close the selection over foreign keys.
+
+A selection maps table -> set of primary-key tuples (raw SQL tokens, e.g.
+("'50793e3c-...'",)). Only keys are held in memory; rows are re-read from
+the table files when the selection is written out. Tables without a primary
+key in the schema are keyed by their whole value tuple.
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from row_store import STORE_SUFFIX, iter_store_rows
+from schema_model import ForeignKey, SchemaModel
+from split_by_table import write_table_file
+from sql_statements import iter_file_statements, iter_insert_rows
+
+
+Key = tuple[str, ...]
+Selection = dict[str, set[Key]]
+
+# (table, columns, values) -> whether the row seeds the selection
+RowPredicate = Callable[[str, list[str], list[str]], bool]
+
+
+def iter_table_rows(table_file: Path) -> Iterator[tuple[list[str], list[str], str]]:
+    """Yield (columns, values, statement) for every INSERT in a table file or .rows store."""
+    if table_file.name.endswith(STORE_SUFFIX):
+        yield from iter_store_rows(table_file)
+        return
+    for _, columns, values, statement in iter_insert_rows(iter_file_statements(table_file)):
+        yield columns, values, statement
+
+
+class ColumnPositions:
+    """Caches column-name -> index lookups for each distinct INSERT column list."""
+
+    def __init__(self) -> None:
+        self._cache: dict[tuple[tuple[str, ...], tuple[str, ...]], list[int] | None] = {}
+
+    def get(self, columns: list[str], wanted: tuple[str, ...]) -> list[int] | None:
+        cache_key = (tuple(columns), wanted)
+        if cache_key not in self._cache:
+            if all(c in columns for c in wanted):
+                self._cache[cache_key] = [columns.index(c) for c in wanted]
+            else:
+                self._cache[cache_key] = None
+        return self._cache[cache_key]
+
+    def values(self, columns: list[str], values: list[str], wanted: tuple[str, ...]) -> Key | None:
+        """Values of the wanted columns, or None if a column is missing or NULL."""
+        positions = self.get(columns, wanted)
+        if positions is None:
+            return None
+        picked = tuple(values[i] for i in positions)
+        if any(v.upper() == "NULL" for v in picked):
+            return None
+        return picked
+
+
+def row_key(model: SchemaModel, table: str, columns: list[str], values: list[str], positions: ColumnPositions) -> Key:
+    pk_columns = model.primary_keys.get(table)
+    if pk_columns:
+        positions_pk = positions.get(columns, pk_columns)
+        if positions_pk is not None:
+            return tuple(values[i] for i in positions_pk)
+    return tuple(values)
+
+
+def parent_closure(
+    table_files: dict[str, Path],
+    model: SchemaModel,
+    selected: Selection,
+    seed: RowPredicate | None = None,
+) -> Selection:
+    """
+    Add every parent row that the selected rows reference, transitively.
+
+    Tables are scanned children-first, so a parent is usually scanned after
+    all of its children have asked for keys and one sweep suffices; self-
+    references and FK cycles cause extra sweeps over just the tables that
+    still have unresolved references. `seed` selects additional rows during
+    each table's first scan. Updates and returns `selected`.
+    """
+    order = model.insert_order(list(table_files))
+    parent_fks: dict[str, list[ForeignKey]] = {t: model.parents(t) for t in order}
+    positions = ColumnPositions()
+
+    # table -> referenced columns -> referenced value tuples not yet scanned for
+    pending: dict[str, dict[tuple[str, ...], set[Key]]] = defaultdict(lambda: defaultdict(set))
+    scanned: set[str] = set()
+
+    while True:
+        todo = [t for t in reversed(order) if t not in scanned or pending.get(t)]
+        if not todo:
+            return selected
+
+        for table in todo:
+            first_scan = table not in scanned
+            wants = pending.pop(table, {})
+            if not first_scan and not wants:
+                continue
+            scanned.add(table)
+            keys = selected.setdefault(table, set())
+
+            for columns, values, _ in iter_table_rows(table_files[table]):
+                key = row_key(model, table, columns, values, positions)
+                already = key in keys
+                if already:
+                    if not first_scan:
+                        continue  # its parents were requested when it was added
+                elif not (
+                    (first_scan and seed is not None and seed(table, columns, values))
+                    or any(positions.values(columns, values, ref) in refs for ref, refs in wants.items())
+                ):
+                    continue
+
+                keys.add(key)
+                for fk in parent_fks[table]:
+                    ref_values = positions.values(columns, values, fk.columns)
+                    if ref_values is None or fk.ref_table not in table_files:
+                        continue
+                    if fk.ref_columns == model.primary_keys.get(fk.ref_table) and ref_values in selected.get(fk.ref_table, ()):
+                        continue
+                    pending[fk.ref_table][fk.ref_columns].add(ref_values)
+
+
+def write_selection(
+    table_files: dict[str, Path],
+    model: SchemaModel,
+    selected: Selection,
+    output_dir: Path,
+    source_name: str,
+    transform: Callable[[str, str], str] | None = None,
+) -> dict[str, int]:
+    """
+    Write the selected rows as table_<name>.sql files in insert order. Returns rows per table.
+
+    transform(table, statement) rewrites each statement (e.g. into an upsert) and
+    must return the full output line; by default statements are written unchanged.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    positions = ColumnPositions()
+    written: dict[str, int] = {}
+
+    for table in model.insert_order(list(table_files)):
+        keys = selected.get(table)
+        if not keys:
+            continue
+
+        def lines(table: str = table, keys: set[Key] = keys) -> Iterable[str]:
+            for columns, values, statement in iter_table_rows(table_files[table]):
+                if row_key(model, table, columns, values, positions) in keys:
+                    yield transform(table, statement) if transform else statement + "\n"
+
+        rows = write_table_file(output_dir / f"table_{table}.sql", table, source_name, lines())
+        if rows:
+            written[table] = rows
+
+    return written
+
+
+def child_closure(table_files: dict[str, Path], model: SchemaModel, selected: Selection) -> Selection:
+    """
+    Add every row that references a selected row, transitively (parents -> children).
+
+    Tables are scanned parents-first and a table is rescanned only when one of
+    its parents gained rows after it was scanned (self-references, FK cycles).
+    Updates and returns `selected`.
+    """
+    order = model.insert_order(list(table_files))
+    parent_fks = {t: [fk for fk in model.parents(t) if fk.ref_table in table_files] for t in order}
+    child_fks = {t: [fk for fk in model.children(t) if fk.table in table_files] for t in order}
+    positions = ColumnPositions()
+
+    # (table, columns) -> values of those columns in selected rows, for FKs that
+    # reference something other than the parent's primary key
+    exposed: dict[tuple[str, tuple[str, ...]], set[Key]] = defaultdict(set)
+
+    def referenced(fk: ForeignKey) -> set[Key]:
+        if fk.ref_columns == model.primary_keys.get(fk.ref_table):
+            return selected.setdefault(fk.ref_table, set())
+        return exposed[(fk.ref_table, fk.ref_columns)]
+
+    dirty = {t for t in order if selected.get(t)}
+    for table in list(dirty):
+        dirty.update(fk.table for fk in child_fks[table])
+
+    while dirty:
+        for table in order:
+            if table not in dirty:
+                continue
+            dirty.discard(table)
+            keys = selected.setdefault(table, set())
+            exposes = {fk.ref_columns for fk in child_fks[table] if fk.ref_columns != model.primary_keys.get(table)}
+            grew = False
+
+            for columns, values, _ in iter_table_rows(table_files[table]):
+                key = row_key(model, table, columns, values, positions)
+                if key not in keys:
+                    if not any(positions.values(columns, values, fk.columns) in referenced(fk) for fk in parent_fks[table]):
+                        continue
+                    keys.add(key)
+                    grew = True
+                for ref_columns in exposes:
+                    ref_values = positions.values(columns, values, ref_columns)
+                    if ref_values is not None:
+                        exposed[(table, ref_columns)].add(ref_values)
+
+            if grew:
+                dirty.update(fk.table for fk in child_fks[table])
+
+    return selected
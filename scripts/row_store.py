@@ -0,0 +1,461 @@
+"""
+Compact, memory-mapped columnar store for parsed table rows.
+
+`row_store.py build` parses a backup once and writes one table_<name>.rows
+file per table next to a copy of table_schema.sql. The row-level tools
+(diff_dumps, extract_changes, subset_dump, merge_dumps) accept such a
+directory wherever they accept table_*.sql files and skip SQL parsing
+entirely; SQL is only re-emitted for the rows they write out.
+
+File layout (native byte order, every section 8-byte aligned):
+
+    magic      b"PGROWS1\\n"
+    per column NULL bitmap (1 bit per row), then the column data:
+                 uuid   16 bytes per row
+                 bool   1 bit per row
+                 text   uint64 heap offset + uint32 length per row (unquoted value)
+                 bare   same, the token as written (numbers)
+                 raw    same, the token as written (columns with mixed kinds)
+    heap       UTF-8 bytes shared by all heap-backed columns
+    header     JSON with row count, column kinds and section offsets,
+               followed by its length as a little-endian uint64
+"""
+import argparse
+import json
+import mmap
+import re
+import shutil
+import sys
+import tempfile
+import uuid
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from dump_io import is_stdio, table_file_map
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, start_stats
+from split_by_table import write_table_file
+from sql_statements import iter_file_statements, iter_insert_rows
+
+
+MAGIC = b"PGROWS1\n"
+STORE_SUFFIX = ".rows"
+
+_UUID_TOKEN = re.compile(r"'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'")
+
+_HEAP_KINDS = ("text", "bare", "raw")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Build, inspect or re-emit a binary columnar row store of a table_*.sql directory.",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Parse table files once into <output_dir>/table_<name>.rows.")
+    build.add_argument("input", type=Path, help="Table directory, SQL dump (.gz/.zst) or pg_dump archive.")
+    build.add_argument("output_dir", type=Path, nargs="?", help="Store directory (default: <input>_rows/).")
+
+    info = sub.add_parser("info", help="Print row counts and column kinds of a store.")
+    info.add_argument("store_dir", type=Path)
+
+    dump = sub.add_parser("dump", help="Re-emit a store as table_*.sql files.")
+    dump.add_argument("store_dir", type=Path)
+    dump.add_argument("output_dir", type=Path)
+    return parser.parse_args()
+
+
+def token_kind(token: str) -> str | None:
+    """Classify a raw SQL value token: None for NULL, else uuid/bool/text/bare."""
+    upper = token.upper()
+    if upper == "NULL":
+        return None
+    if upper == "TRUE" or upper == "FALSE":
+        return "bool"
+    if token.startswith("'"):
+        return "uuid" if _UUID_TOKEN.fullmatch(token) else "text"
+    return "bare"
+
+
+def quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _align(fh: BinaryIO) -> None:
+    padding = -fh.tell() % 8
+    if padding:
+        fh.write(b"\0" * padding)
+
+
+class _ColumnBuilder:
+    """Accumulates one column; widens its kind when a value does not fit."""
+
+    def __init__(self, heap: BinaryIO) -> None:
+        self.kind: str | None = None  # None until the first non-NULL value
+        self.rows = 0
+        self.nulls = bytearray()
+        self.fixed = bytearray()  # uuid: 16 bytes per row, bool: 1 byte per row
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self._heap = heap
+
+    def _heap_append(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.offsets.append(self._heap.tell())
+        self.lengths.append(len(data))
+        self._heap.write(data)
+
+    def _set_null(self, row: int) -> None:
+        byte = row >> 3
+        while len(self.nulls) <= byte:
+            self.nulls.append(0)
+        self.nulls[byte] |= 1 << (row & 7)
+
+    def _is_null(self, row: int) -> bool:
+        byte = row >> 3
+        return byte < len(self.nulls) and bool(self.nulls[byte] & (1 << (row & 7)))
+
+    def _append_placeholder(self) -> None:
+        if self.kind == "uuid":
+            self.fixed += bytes(16)
+        elif self.kind == "bool":
+            self.fixed.append(0)
+        elif self.kind in _HEAP_KINDS:
+            self.offsets.append(0)
+            self.lengths.append(0)
+
+    def _append(self, token: str) -> None:
+        if self.kind == "uuid":
+            self.fixed += uuid.UUID(token[1:-1]).bytes
+        elif self.kind == "bool":
+            self.fixed.append(1 if token.upper() == "TRUE" else 0)
+        elif self.kind == "text":
+            self._heap_append(token[1:-1].replace("''", "'"))
+        else:
+            self._heap_append(token)
+
+    def _old_token(self, row: int) -> str:
+        # Only needed while widening fixed-width columns, so heap kinds never get here
+        if self.kind == "uuid":
+            return quote_literal(str(uuid.UUID(bytes=bytes(self.fixed[16 * row:16 * row + 16]))))
+        return "TRUE" if self.fixed[row] else "FALSE"
+
+    def _widen(self, kind: str) -> None:
+        target = "text" if {self.kind, kind} <= {"uuid", "text"} else "raw"
+        if self.kind in ("uuid", "bool"):
+            tokens = [None if self._is_null(r) else self._old_token(r) for r in range(self.rows)]
+            self.kind = target
+            self.fixed = bytearray()
+            for token in tokens:
+                if token is None:
+                    self._append_placeholder()
+                else:
+                    self._append(token)
+        elif target == "raw" and self.kind == "text":
+            # Re-quote existing values; the old heap bytes are left unreferenced
+            old = [(o, n) for o, n in zip(self.offsets, self.lengths)]
+            self.offsets = array("Q")
+            self.lengths = array("I")
+            self._heap.flush()
+            for row, (offset, length) in enumerate(old):
+                if self._is_null(row):
+                    self._append_placeholder()
+                    continue
+                self._heap.seek(offset)
+                value = self._heap.read(length).decode("utf-8")
+                self._heap.seek(0, 2)
+                self._heap_append(quote_literal(value))
+            self.kind = target
+        else:
+            self.kind = target  # bare -> raw keeps its tokens as written
+
+    def _accepts(self, kind: str) -> bool:
+        return kind == self.kind or self.kind == "raw" or (self.kind == "text" and kind == "uuid")
+
+    def add(self, token: str) -> None:
+        kind = token_kind(token)
+        if kind is None:
+            self._set_null(self.rows)
+            self._append_placeholder()
+        else:
+            if self.kind is None:
+                self.kind = kind
+                # Backfill placeholders for the NULLs seen so far
+                for _ in range(self.rows):
+                    self._append_placeholder()
+            elif not self._accepts(kind):
+                self._widen(kind)
+            self._append(token)
+        self.rows += 1
+
+    def write(self, fh: BinaryIO) -> dict:
+        """Write the NULL bitmap and column data; returns the column's header entry."""
+        rows = self.rows
+        kind = self.kind or "bare"  # an all-NULL column
+        entry: dict = {"kind": kind}
+
+        _align(fh)
+        entry["nulls"] = fh.tell()
+        nulls = bytes(self.nulls) + bytes((rows + 7) // 8 - len(self.nulls))
+        fh.write(nulls)
+
+        _align(fh)
+        entry["data"] = fh.tell()
+        if kind == "uuid":
+            fh.write(self.fixed)
+        elif kind == "bool":
+            bits = bytearray((rows + 7) // 8)
+            for row, value in enumerate(self.fixed):
+                if value:
+                    bits[row >> 3] |= 1 << (row & 7)
+            fh.write(bits)
+        else:
+            offsets = self.offsets if self.kind else array("Q", bytes(8 * rows))
+            lengths = self.lengths if self.kind else array("I", bytes(4 * rows))
+            offsets.tofile(fh)
+            _align(fh)
+            entry["lengths"] = fh.tell()
+            lengths.tofile(fh)
+        return entry
+
+
+def build_table_store(table: str, rows: Iterator[tuple[list[str], list[str]]], output_file: Path) -> int:
+    """Write one table's rows to a .rows file. Returns the row count."""
+    columns: list[str] | None = None
+    builders: list[_ColumnBuilder] = []
+    count = 0
+
+    with tempfile.TemporaryFile(dir=output_file.parent) as heap:
+        for row_columns, values in rows:
+            if columns is None:
+                columns = row_columns
+                builders = [_ColumnBuilder(heap) for _ in columns]
+            elif row_columns != columns:
+                raise ValueError(f"{table}: INSERT statements with different column lists are not supported")
+            for builder, token in zip(builders, values):
+                builder.add(token)
+            count += 1
+
+        heap.flush()
+        heap_size = heap.seek(0, 2)
+
+        with output_file.open("wb") as fh:
+            fh.write(MAGIC)
+            entries = [b.write(fh) for b in builders]
+            _align(fh)
+            heap_offset = fh.tell()
+            heap.seek(0)
+            shutil.copyfileobj(heap, fh, 1 << 20)
+
+            header = {
+                "table": table,
+                "rows": count,
+                "byteorder": sys.byteorder,
+                "columns": [dict(e, name=c) for c, e in zip(columns or [], entries)],
+                "heap": heap_offset,
+                "heap_size": heap_size,
+            }
+            header_bytes = json.dumps(header).encode("utf-8")
+            fh.write(header_bytes)
+            fh.write(len(header_bytes).to_bytes(8, "little"))
+
+    return count
+
+
+class RowStore:
+    """Read-only, memory-mapped view of a .rows file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if bytes(self._view[: len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError(f"'{path}' is not a row store file")
+        header_len = int.from_bytes(self._view[-8:], "little")
+        start = len(self._view) - 8 - header_len
+        self.header = json.loads(bytes(self._view[start: start + header_len]).decode("utf-8"))
+        if self.header["byteorder"] != sys.byteorder:
+            self.close()
+            raise ValueError(f"'{path}' was written on a {self.header['byteorder']}-endian machine")
+
+        self.table: str = self.header["table"]
+        self.rows: int = self.header["rows"]
+        self.columns: list[str] = [c["name"] for c in self.header["columns"]]
+        heap = self.header["heap"]
+        self._heap = self._view[heap: heap + self.header["heap_size"]]
+        self._columns = {c["name"]: Column(self, c) for c in self.header["columns"]}
+
+    def column(self, name: str) -> "Column":
+        return self._columns[name]
+
+    def tokens(self, row: int) -> list[str]:
+        return [self._columns[c].token(row) for c in self.columns]
+
+    def statement(self, row: int) -> str:
+        return f"INSERT INTO public.{self.table} ({', '.join(self.columns)}) VALUES ({', '.join(self.tokens(row))});"
+
+    def close(self) -> None:
+        for attr in ("_heap", "_view"):
+            view = getattr(self, attr, None)
+            if view is not None:
+                view.release()
+        for column in getattr(self, "_columns", {}).values():
+            column.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "RowStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Column:
+    """One column of a RowStore; values are decoded from the mapped bytes on access."""
+
+    def __init__(self, store: RowStore, entry: dict) -> None:
+        view = store._view
+        rows = store.rows
+        self.name: str = entry["name"]
+        self.kind: str = entry["kind"]
+        self._heap = store._heap
+        self._views: list[memoryview] = []
+        self._nulls = self._slice(view, entry["nulls"], (rows + 7) // 8)
+        if self.kind == "uuid":
+            self._data = self._slice(view, entry["data"], 16 * rows)
+        elif self.kind == "bool":
+            self._data = self._slice(view, entry["data"], (rows + 7) // 8)
+        else:
+            self._offsets = self._slice(view, entry["data"], 8 * rows).cast("Q")
+            self._lengths = self._slice(view, entry["lengths"], 4 * rows).cast("I")
+            self._views += [self._offsets, self._lengths]
+
+    def _slice(self, view: memoryview, start: int, size: int) -> memoryview:
+        part = view[start: start + size]
+        self._views.append(part)
+        return part
+
+    def release(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+
+    def is_null(self, row: int) -> bool:
+        return bool(self._nulls[row >> 3] & (1 << (row & 7)))
+
+    def _heap_text(self, row: int) -> str:
+        offset = self._offsets[row]
+        return str(self._heap[offset: offset + self._lengths[row]], "utf-8")
+
+    def value(self, row: int) -> str | bool | None:
+        """Decoded value: None for NULL, bool for booleans, str otherwise."""
+        if self.is_null(row):
+            return None
+        if self.kind == "uuid":
+            return str(uuid.UUID(bytes=bytes(self._data[16 * row: 16 * row + 16])))
+        if self.kind == "bool":
+            return bool(self._data[row >> 3] & (1 << (row & 7)))
+        text = self._heap_text(row)
+        if self.kind == "raw" and text.startswith("'"):
+            return text[1:-1].replace("''", "'")
+        return text
+
+    def token(self, row: int) -> str:
+        """The value as an SQL token, as it appeared in the INSERT statement."""
+        if self.is_null(row):
+            return "NULL"
+        if self.kind == "uuid":
+            return quote_literal(str(uuid.UUID(bytes=bytes(self._data[16 * row: 16 * row + 16]))))
+        if self.kind == "bool":
+            return "TRUE" if self._data[row >> 3] & (1 << (row & 7)) else "FALSE"
+        if self.kind == "text":
+            return quote_literal(self._heap_text(row))
+        return self._heap_text(row)
+
+
+def store_file_map(directory: Path, prefix: str = "table_") -> dict[str, Path]:
+    """Map table name -> .rows file for every table_<name>.rows in a directory."""
+    return {
+        path.name[len(prefix): -len(STORE_SUFFIX)]: path
+        for path in sorted(directory.glob(f"{prefix}*{STORE_SUFFIX}"))
+    }
+
+
+def iter_store_rows(path: Path) -> Iterator[tuple[list[str], list[str], str]]:
+    """Yield (columns, tokens, statement) for every row of a .rows file, like iter_table_rows."""
+    with RowStore(path) as store:
+        columns = [store.column(c) for c in store.columns]
+        prefix = f"INSERT INTO public.{store.table} ({', '.join(store.columns)}) VALUES ("
+        for row in range(store.rows):
+            tokens = [c.token(row) for c in columns]
+            yield store.columns, tokens, prefix + ", ".join(tokens) + ");"
+
+
+def build_store(table_dir: Path, output_dir: Path) -> dict[str, int]:
+    """Parse every table file of a directory into output_dir. Returns rows per table."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results: dict[str, int] = {}
+    for table, table_file in sorted(table_file_map(table_dir).items()):
+        rows = ((columns, values) for _, columns, values, _ in iter_insert_rows(iter_file_statements(table_file)))
+        results[table] = build_table_store(table, rows, output_dir / f"table_{table}{STORE_SUFFIX}")
+
+    schema_file = table_dir / "table_schema.sql"
+    if schema_file.exists():
+        shutil.copyfile(schema_file, output_dir / "table_schema.sql")
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, f"row_store {args.command}")
+    start_profile(args, f"row_store_{args.command}")
+
+    if args.command == "build":
+        # Imported here: dump_source imports this module for store-aware table lookups
+        from dump_source import resolve_table_dir
+
+        input_path: Path = args.input
+        if not is_stdio(input_path) and not input_path.exists():
+            print(f"Error: Input '{input_path}' not found")
+            return
+        output_dir: Path = args.output_dir or Path(f"{input_path.name}_rows")
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                table_dir = resolve_table_dir(input_path, Path(tmp))
+            except ValueError as e:
+                print(f"Error: {e}")
+                return
+            print(f"Building row store of '{input_path}' in '{output_dir}'...")
+            results = build_store(table_dir, output_dir)
+        for table, rows in results.items():
+            size = (output_dir / f"table_{table}{STORE_SUFFIX}").stat().st_size
+            print(f"  table_{table}{STORE_SUFFIX}: {rows} rows, {size} bytes")
+
+    elif args.command == "info":
+        for table, path in store_file_map(args.store_dir).items():
+            with RowStore(path) as store:
+                kinds = ", ".join(f"{c}:{store.column(c).kind}" for c in store.columns)
+                print(f"  {table}: {store.rows} rows ({kinds})")
+
+    else:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        for table, path in store_file_map(args.store_dir).items():
+            lines = (statement + "\n" for _, _, statement in iter_store_rows(path))
+            rows = write_table_file(args.output_dir / f"table_{table}.sql", table, path.name, lines)
+            print(f"  table_{table}.sql: {rows} rows")
+        schema_file = args.store_dir / "table_schema.sql"
+        if schema_file.exists():
+            shutil.copyfile(schema_file, args.output_dir / "table_schema.sql")
+
+    finish_profile(args, f"row_store_{args.command}")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Primary keys and foreign keys parsed from a table_schema.sql file.
+
+Shared by the tools that need more than the table-level dependency list of
+generate_insert_order.parse_foreign_keys: row diffs, delta extraction,
+subsetting and merges all have to know which columns identify a row and
+which columns point at which parent.
+"""
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dump_io import read_text
+from generate_insert_order import topological_sort
+
+
+_CONSTRAINT = re.compile(
+    r'ALTER\s+TABLE\s+(?:ONLY\s+)?(?:public\.)?"?(\w+)"?\s+'
+    r'ADD\s+CONSTRAINT\s+(?:"[^"]+"|\w+)\s+'
+    r'(PRIMARY\s+KEY|FOREIGN\s+KEY)\s*\(([^)]*)\)'
+    r'(?:\s*REFERENCES\s+(?:public\.)?"?(\w+)"?\s*\(([^)]*)\))?',
+    re.IGNORECASE,
+)
+
+
+def _column_list(text: str) -> tuple[str, ...]:
+    return tuple(c.strip() for c in text.split(",") if c.strip())
+
+
+@dataclass(frozen=True)
+class ForeignKey:
+    table: str
+    columns: tuple[str, ...]
+    ref_table: str
+    ref_columns: tuple[str, ...]
+
+
+@dataclass
+class SchemaModel:
+    primary_keys: dict[str, tuple[str, ...]] = field(default_factory=dict)
+    foreign_keys: list[ForeignKey] = field(default_factory=list)
+
+    def parents(self, table: str) -> list[ForeignKey]:
+        """FKs declared on `table` (table -> referenced parent)."""
+        return [fk for fk in self.foreign_keys if fk.table == table]
+
+    def children(self, table: str) -> list[ForeignKey]:
+        """FKs that reference `table` (child -> table)."""
+        return [fk for fk in self.foreign_keys if fk.ref_table == table]
+
+    def self_referencing(self, table: str) -> bool:
+        """Whether `table` has an FK to itself, so its rows must load in file order."""
+        return any(fk.ref_table == table for fk in self.parents(table))
+
+    def dependencies(self) -> dict[str, list[str]]:
+        """Table -> referenced tables, in the shape generate_insert_order.topological_sort expects."""
+        dependencies: dict[str, list[str]] = {}
+        for fk in self.foreign_keys:
+            if fk.ref_table == fk.table:
+                continue  # self-references do not constrain the table order
+            refs = dependencies.setdefault(fk.table, [])
+            if fk.ref_table not in refs:
+                refs.append(fk.ref_table)
+        return dependencies
+
+    def insert_order(self, tables: list[str]) -> list[str]:
+        """Order tables parents-first; delete in the reverse order."""
+        return topological_sort(sorted(tables), self.dependencies())
+
+
+def parse_schema(schema_file: Path) -> SchemaModel:
+    """Parse PRIMARY KEY and FOREIGN KEY constraints from a (possibly compressed) schema file."""
+    model = SchemaModel()
+    for match in _CONSTRAINT.finditer(read_text(schema_file)):
+        table, kind, columns, ref_table, ref_columns = match.groups()
+        if kind.upper().startswith("PRIMARY"):
+            model.primary_keys[table] = _column_list(columns)
+        elif ref_table:
+            model.foreign_keys.append(
+                ForeignKey(table, _column_list(columns), ref_table, _column_list(ref_columns))
+            )
+    return model
@@ -1,8 +1,48 @@
 import argparse
+import io
+import json
+import mmap
+import os
 import re
+import shutil
+from array import array
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
+from typing import Any, BinaryIO, Callable, Iterable, TextIO
+
+from convert_copy_to_insert import is_meta_line, iter_insert_lines, iter_plain_lines
+from dump_io import is_stdio, map_input, open_input, open_output, open_output_binary, sql_stem
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import Tracker, add_progress_args, finish_progress, follow, start_progress, tracking
+from dump_stats import (
+    add,
+    add_stats_args,
+    enabled as stats_enabled,
+    finish_stats,
+    merge_collected,
+    run_collected,
+    stage,
+    start_stats,
+    timed_iter,
+    timed_writer,
+)
+from pg_archive import (
+    ArchiveError,
+    TocEntry,
+    is_custom_archive,
+    is_directory_archive,
+    open_directory_data,
+    read_directory_archive,
+)
+from schema_model import SchemaModel, parse_schema
+
+
+MANIFEST_NAME = "manifest.json"
+
+_SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
 
 
 def parse_args() -> argparse.Namespace:
@@ -12,7 +52,10 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "input",
         type=Path,
-        help="Path to SQL file with INSERT statements.",
+        help=(
+            "Path to SQL file with INSERT statements (.gz/.zst, or '-' for stdin), "
+            "a pg_dump -Fc archive file, or a pg_dump -Fd directory."
+        ),
     )
     parser.add_argument(
         "output_dir",
@@ -26,9 +69,56 @@ def parse_args() -> argparse.Namespace:
         default="table_",
         help="Prefix for output filenames (default: 'table_').",
     )
+    parser.add_argument(
+        "--compress",
+        choices=["gz", "zst"],
+        help="Compress the per-table output files (table_<name>.sql.gz / .sql.zst).",
+    )
+    parser.add_argument(
+        "--compress-threads",
+        type=int,
+        default=1,
+        help="Worker threads for compressing output in parallel blocks (default: 1).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for -Fd directory input, one table per worker (default: CPU count).",
+    )
+    parser.add_argument(
+        "--max-chunk-bytes",
+        type=parse_size,
+        help="Split tables into numbered chunks of at most this many bytes, e.g. 256M (suffixes K/M/G).",
+    )
+    parser.add_argument(
+        "--max-chunk-rows",
+        type=int,
+        help="Split tables into numbered chunks of at most this many rows.",
+    )
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        help=f"Write {MANIFEST_NAME} even without chunking (always written with --max-chunk-*).",
+    )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
     return parser.parse_args()
 
 
+def parse_size(text: str) -> int:
+    """Parse a byte size such as 1048576, 512K, 256M or 2G."""
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?)i?B?\s*", text, re.IGNORECASE)
+    if not match or int(match.group(1)) < 1:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+
+_NON_SPACE = re.compile(rb"\S")
+
+
 def extract_table_name(insert_line: str) -> str | None:
     """
     Extract table name from INSERT INTO statement.
@@ -41,79 +131,548 @@ def extract_table_name(insert_line: str) -> str | None:
     return match.group(1) if match else None
 
 
-def split_file(input_path: Path, output_dir: Path, prefix: str) -> None:
+def write_table_header(fout: TextIO, table_name: str, source_name: str, rows: int) -> None:
+    fout.write(f"-- SQL data for table: {table_name}\n")
+    fout.write(f"-- Generated from: {source_name}\n")
+    fout.write(f"-- Generated at: {datetime.now().isoformat()}\n")
+    fout.write(f"-- Total rows: {rows}\n")
+    fout.write("\n")
+
+
+def split_file(
+    input_path: Path,
+    output_dir: Path,
+    prefix: str,
+    compress: str | None = None,
+    compress_threads: int = 1,
+    max_chunk_bytes: int | None = None,
+    max_chunk_rows: int | None = None,
+    manifest: bool = False,
+) -> None:
     """
     Split SQL file by table, grouping INSERT statements per table.
+
+    With max_chunk_bytes / max_chunk_rows, tables over the limit are written as
+    numbered chunks (see write_table_chunks) and a manifest is written.
+
+    A pg_dump -Fc archive is read through open_input as plain SQL and its COPY
+    blocks are converted to INSERT rows, as for -Fd data files. Raises
+    ArchiveError if the archive is malformed.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
+    suffix = f".sql.{compress}" if compress else ".sql"
+    source_name = "stdin" if is_stdio(input_path) else input_path.name
+    chunked = max_chunk_bytes is not None or max_chunk_rows is not None
+    archive = not is_stdio(input_path) and is_custom_archive(input_path)
+    
+    with map_input(input_path) as mapped:
+        if mapped is not None:
+            with tracking(len(mapped), 2 * len(mapped)) as progress:
+                written = split_mapped(
+                    mapped, output_dir, prefix, suffix, compress_threads, source_name,
+                    max_chunk_bytes, max_chunk_rows, progress,
+                )
+            if chunked or manifest:
+                write_manifest(output_dir, source_name, written, prefix)
+            print(f"\nSplit into {len({table for table, _, _ in written})} table files in '{output_dir}'")
+            return
     
-    # Group INSERT statements by table name
-    tables: dict[str, list[str]] = defaultdict(list)
-    non_insert_lines: list[str] = []
+    # Spool INSERT statements to one file per table, so memory does not grow with the dump
+    rows: dict[str, int] = defaultdict(int)
+    schema_file = output_dir / f"{prefix}schema.sql"
+    schema_lines = 0
     
-    with input_path.open("r", encoding="utf-8") as fin:
-        for line in fin:
+    with ExitStack() as stack:
+        fin = stack.enter_context(open_input(input_path))
+        stack.enter_context(follow(fin))
+        spools: dict[str, BinaryIO] = {}
+        schema_out = None
+        
+        lines = timed_iter(fin, "read")
+        if archive:
+            lines = iter_plain_lines(lines)
+        for line in lines:
             stripped = line.strip()
             
             if not stripped or stripped.startswith("--"):
                 # Keep comments/empty lines with the first table or in a separate file
                 continue
             
-            if stripped.upper().startswith("INSERT INTO"):
-                table_name = extract_table_name(stripped)
-                if table_name:
-                    tables[table_name].append(line)
-                else:
-                    # Malformed INSERT, keep in non-insert
-                    non_insert_lines.append(line)
-            else:
-                # Non-INSERT statements (CREATE, ALTER, etc.)
-                non_insert_lines.append(line)
+            table_name = extract_table_name(stripped) if stripped.upper().startswith("INSERT INTO") else None
+            if table_name:
+                spool = spools.get(table_name)
+                if spool is None:
+                    spool = stack.enter_context((output_dir / f"{prefix}{table_name}.spool").open("wb"))
+                    spool = timed_writer(spool, "spool")
+                    spools[table_name] = spool
+                spool.write(line.encode("utf-8"))
+                rows[table_name] += 1
+                continue
+            
+            # Non-INSERT statements (CREATE, ALTER, etc.) and malformed INSERTs
+            if schema_out is None:
+                schema_out = stack.enter_context(schema_file.open("w", encoding="utf-8"))
+                schema_out.write("-- Non-INSERT statements (CREATE, ALTER, etc.)\n")
+                schema_out.write(f"-- Generated from: {source_name}\n")
+                schema_out.write(f"-- Generated at: {datetime.now().isoformat()}\n")
+                schema_out.write("\n")
+            schema_out.write(line)
+            schema_lines += 1
     
     # Write each table to its own file
-    for table_name, inserts in sorted(tables.items()):
-        output_file = output_dir / f"{prefix}{table_name}.sql"
+    written: list[tuple[str, Path, int]] = []
+    for table_name in sorted(rows):
+        spool_file = output_dir / f"{prefix}{table_name}.spool"
+        if chunked:
+            with spool_file.open("rb") as body:
+                for output_file, chunk_rows in write_table_chunks(
+                    output_dir, prefix, suffix, table_name, source_name, body,
+                    max_chunk_bytes, max_chunk_rows, compress_threads,
+                ):
+                    written.append((table_name, output_file, chunk_rows))
+                    print(f"  {output_file.name}: {chunk_rows} rows")
+            spool_file.unlink()
+            continue
         
-        with output_file.open("w", encoding="utf-8") as fout:
-            # Write header
-            fout.write(f"-- SQL data for table: {table_name}\n")
-            fout.write(f"-- Generated from: {input_path.name}\n")
-            fout.write(f"-- Generated at: {datetime.now().isoformat()}\n")
-            fout.write(f"-- Total rows: {len(inserts)}\n")
-            fout.write("\n")
+        output_file = output_dir / f"{prefix}{table_name}{suffix}"
+        _finish_chunk(spool_file, output_file, table_name, source_name, rows[table_name], compress_threads)
+        written.append((table_name, output_file, rows[table_name]))
+        print(f"  {output_file.name}: {rows[table_name]} rows")
+    
+    if schema_lines:
+        print(f"  {schema_file.name}: {schema_lines} lines")
+    
+    if chunked or manifest:
+        write_manifest(output_dir, source_name, written, prefix)
+    print(f"\nSplit into {len(rows)} table files in '{output_dir}'")
+
+
+def write_table_file(
+    output_file: Path,
+    table_name: str,
+    source_name: str,
+    lines: Iterable[str],
+    compress_threads: int = 1,
+) -> int:
+    """
+    Write lines to a table_<name>.sql file with the usual header. Returns the row count.
+
+    Lines are streamed to a .part file first because the header needs the row
+    count; the final file is the header followed by the copied body. Nothing is
+    written when there are no lines.
+    """
+    part_file = output_file.with_name(output_file.name + ".part")
+    rows = 0
+    with part_file.open("w", encoding="utf-8") as body:
+        for line in timed_iter(lines, "serialize"):
+            body.write(line)
+            rows += 1
+
+    if rows:
+        with stage("write", nbytes=part_file.stat().st_size, rows=rows):
+            with open_output(output_file, threads=compress_threads) as fout, part_file.open("r", encoding="utf-8") as body:
+                write_table_header(fout, table_name, source_name, rows)
+                shutil.copyfileobj(body, fout, 1 << 20)
+    part_file.unlink()
+    return rows
+
+
+def write_table_chunks(
+    output_dir: Path,
+    prefix: str,
+    suffix: str,
+    table_name: str,
+    source_name: str,
+    lines: Iterable[bytes],
+    max_bytes: int | None = None,
+    max_rows: int | None = None,
+    compress_threads: int = 1,
+) -> list[tuple[Path, int]]:
+    """
+    Write encoded lines as numbered chunks of at most max_bytes and/or max_rows each.
+
+    Chunks are <prefix><name>.0001.sql, .0002.sql, ..., each a complete table
+    file with its own header. A table that fits in one chunk is written as a
+    plain <prefix><name>.sql, and a single row over max_bytes gets a chunk of its
+    own. Returns (file, rows) per chunk.
+    """
+    part_file = output_dir / f"{prefix}{table_name}.part"
+    chunks: list[tuple[Path, int]] = []
+    body = None
+    rows = size = 0
+
+    for line in lines:
+        if body is not None and (
+            (max_rows is not None and rows >= max_rows)
+            or (max_bytes is not None and size + len(line) > max_bytes)
+        ):
+            body.close()
+            chunk_file = output_dir / f"{prefix}{table_name}.{len(chunks) + 1:04d}{suffix}"
+            chunks.append(_finish_chunk(part_file, chunk_file, table_name, source_name, rows, compress_threads))
+            body = None
+        if body is None:
+            body = part_file.open("wb")
+            rows = size = 0
+        body.write(line)
+        rows += 1
+        size += len(line)
+
+    if body is None:
+        return chunks
+    body.close()
+
+    if not chunks:
+        output_file = output_dir / f"{prefix}{table_name}{suffix}"
+    else:
+        output_file = output_dir / f"{prefix}{table_name}.{len(chunks) + 1:04d}{suffix}"
+    chunks.append(_finish_chunk(part_file, output_file, table_name, source_name, rows, compress_threads))
+    return chunks
+
+
+def _finish_chunk(
+    part_file: Path,
+    output_file: Path,
+    table_name: str,
+    source_name: str,
+    rows: int,
+    compress_threads: int,
+) -> tuple[Path, int]:
+    header = io.StringIO()
+    write_table_header(header, table_name, source_name, rows)
+    with stage("write", nbytes=part_file.stat().st_size, rows=rows):
+        with open_output_binary(output_file, threads=compress_threads) as fout, part_file.open("rb") as body:
+            fout.write(header.getvalue().encode("utf-8"))
+            shutil.copyfileobj(body, fout, 1 << 20)
+    part_file.unlink()
+    return output_file, rows
+
+
+def write_manifest(
+    output_dir: Path,
+    source_name: str,
+    written: list[tuple[str, Path, int]],
+    prefix: str = "table_",
+) -> Path:
+    """
+    Write manifest.json describing every table's files from (table, file, rows).
+
+    Bytes are the on-disk sizes. self_referencing marks tables with an FK to
+    themselves, whose chunks must be loaded one after another.
+    """
+    schema_file = output_dir / f"{prefix}schema.sql"
+    model = parse_schema(schema_file) if schema_file.exists() else SchemaModel()
+
+    tables: dict[str, dict[str, Any]] = {}
+    for table_name, output_file, rows in written:
+        entry = tables.setdefault(
+            table_name,
+            {"rows": 0, "bytes": 0, "self_referencing": model.self_referencing(table_name), "chunks": []},
+        )
+        size = output_file.stat().st_size
+        entry["chunks"].append({"file": output_file.name, "rows": rows, "bytes": size})
+        entry["rows"] += rows
+        entry["bytes"] += size
+
+    manifest = {
+        "source": source_name,
+        "generated_at": datetime.now().isoformat(),
+        "tables": dict(sorted(tables.items())),
+    }
+    manifest_file = output_dir / MANIFEST_NAME
+    manifest_file.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    return manifest_file
+
+
+def read_manifest(directory: Path) -> dict[str, Any] | None:
+    """Load a directory's manifest.json, or None if it has none."""
+    manifest_file = directory / MANIFEST_NAME
+    if not manifest_file.exists():
+        return None
+    return json.loads(manifest_file.read_text(encoding="utf-8"))
+
+
+@hot_path
+def split_mapped(
+    data: mmap.mmap,
+    output_dir: Path,
+    prefix: str,
+    suffix: str,
+    compress_threads: int,
+    source_name: str,
+    max_chunk_bytes: int | None = None,
+    max_chunk_rows: int | None = None,
+    progress: Tracker | None = None,
+) -> list[tuple[str, Path, int]]:
+    """
+    Bytes-level split_file over a memory-mapped dump. Returns (table, file, rows) per file written.
+
+    Lines are routed on their ASCII prefix and only (start, end) offsets are
+    kept per table; rows are then written as memoryview slices without being
+    decoded, so non-ASCII content costs nothing beyond the copy itself.
+    Line endings are kept as they are in the input.
+
+    progress (from dump_progress.tracking(len(data), 2 * len(data))) runs
+    through the dump once while routing and once more while writing.
+    """
+    tables: dict[str, array] = defaultdict(lambda: array("Q"))
+    non_insert = array("Q")
+    n = len(data)
+    pos = 0
+    progress = progress or Tracker()
+    
+    with stage("tokenize", nbytes=n):
+        while pos < n:
+            progress.position = pos
+            end = data.find(b"\n", pos)
+            end = n if end == -1 else end + 1
             
-            # Write all INSERT statements for this table
-            for insert_line in inserts:
-                fout.write(insert_line)
+            first = _NON_SPACE.search(data, pos, end)
+            if first is None or data[first.start():first.start() + 2] == b"--":
+                pos = end
+                continue
+            
+            start = first.start()
+            table_name = None
+            if data[start:start + 11].upper() == b"INSERT INTO":
+                # Only the statement head is decoded to find the table name
+                table_name = extract_table_name(data[start:min(end, start + 256)].decode("utf-8", "ignore"))
+            (tables[table_name] if table_name else non_insert).extend((pos, end))
+            pos = end
+    total_rows = sum(len(offsets) for offsets in tables.values()) // 2
+    add("tokenize", rows=total_rows)
+    
+    chunked = max_chunk_bytes is not None or max_chunk_rows is not None
+    written: list[tuple[str, Path, int]] = []
+    view = memoryview(data)
+    rows_done = 0
+    try:
+        for table_name, offsets in sorted(tables.items()):
+            progress.position = n + n * rows_done // max(1, total_rows)
+            rows_done += len(offsets) // 2
+            if chunked:
+                lines = (view[offsets[i]:offsets[i + 1]] for i in range(0, len(offsets), 2))
+                for output_file, rows in write_table_chunks(
+                    output_dir, prefix, suffix, table_name, source_name, lines,
+                    max_chunk_bytes, max_chunk_rows, compress_threads,
+                ):
+                    written.append((table_name, output_file, rows))
+                    print(f"  {output_file.name}: {rows} rows")
+                continue
+            
+            output_file = output_dir / f"{prefix}{table_name}{suffix}"
+            rows = len(offsets) // 2
+            header = io.StringIO()
+            write_table_header(header, table_name, source_name, rows)
+            
+            with open_output_binary(output_file, threads=compress_threads) as raw:
+                fout = timed_writer(raw, "write")
+                fout.write(header.getvalue().encode("utf-8"))
+                for i in range(0, len(offsets), 2):
+                    fout.write(view[offsets[i]:offsets[i + 1]])
+            add("write", rows=rows)
+            
+            written.append((table_name, output_file, rows))
+            print(f"  {output_file.name}: {rows} rows")
         
-        print(f"  {output_file.name}: {len(inserts)} rows")
+        if non_insert:
+            schema_file = output_dir / f"{prefix}schema.sql"
+            with schema_file.open("wb") as fout:
+                fout.write(b"-- Non-INSERT statements (CREATE, ALTER, etc.)\n")
+                fout.write(f"-- Generated from: {source_name}\n".encode("utf-8"))
+                fout.write(f"-- Generated at: {datetime.now().isoformat()}\n".encode("utf-8"))
+                fout.write(b"\n")
+                for i in range(0, len(non_insert), 2):
+                    fout.write(view[non_insert[i]:non_insert[i + 1]])
+            print(f"  {schema_file.name}: {len(non_insert) // 2} lines")
+    finally:
+        view.release()
     
-    # Write non-INSERT statements to a separate file if any
-    if non_insert_lines:
+    return written
+
+
+def _split_archive_table(
+    archive_dir: Path,
+    entry: TocEntry,
+    output_dir: Path,
+    prefix: str,
+    suffix: str,
+    compress_threads: int,
+    post_process: Callable[[Path], Any] | None,
+    max_chunk_bytes: int | None = None,
+    max_chunk_rows: int | None = None,
+) -> list[tuple[Path, int, Any]]:
+    """Worker: convert one table's -Fd data file into a table_<name>.sql file (or chunks)."""
+    with io.TextIOWrapper(open_directory_data(archive_dir, entry), encoding="utf-8") as fin:
+        lines = iter_insert_lines(entry.copy_stmt, fin)
+        if max_chunk_bytes is None and max_chunk_rows is None:
+            output_file = output_dir / f"{prefix}{entry.tag}{suffix}"
+            rows = write_table_file(output_file, entry.tag, archive_dir.name, lines, compress_threads)
+            chunks = [(output_file, rows)] if rows else []
+        else:
+            chunks = write_table_chunks(
+                output_dir, prefix, suffix, entry.tag, archive_dir.name,
+                (line.encode("utf-8") for line in lines), max_chunk_bytes, max_chunk_rows, compress_threads,
+            )
+
+    return [
+        (output_file, rows, post_process(output_file) if post_process is not None else None)
+        for output_file, rows in chunks
+    ]
+
+
+def split_directory_archive(
+    archive_dir: Path,
+    output_dir: Path,
+    prefix: str = "table_",
+    compress: str | None = None,
+    compress_threads: int = 1,
+    jobs: int = 1,
+    post_process: Callable[[Path], Any] | None = None,
+    max_chunk_bytes: int | None = None,
+    max_chunk_rows: int | None = None,
+    manifest: bool = False,
+) -> list[tuple[Path, int, Any]]:
+    """
+    Split a pg_dump -Fd directory into per-table files, one worker process per table data file.
+
+    post_process (a picklable function) runs in the same worker on each finished
+    file, e.g. a fixer's fix_file; its return value is passed back to the caller.
+    Returns (output_file, rows, post_process result) for every file with rows;
+    a chunked table has one entry per chunk.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    suffix = f".sql.{compress}" if compress else ".sql"
+    archive = read_directory_archive(archive_dir)
+
+    data_entries = [e for e in archive.entries if e.desc == "TABLE DATA" and e.has_data]
+    # Start the biggest data files first so one large table does not finish last
+    data_entries.sort(key=lambda e: _data_file_size(archive_dir, e), reverse=True)
+
+    results: list[tuple[Path, int, Any]] = []
+    written: list[tuple[str, Path, int]] = []
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [
+            pool.submit(
+                run_collected,
+                stats_enabled(),
+                _split_archive_table,
+                archive_dir,
+                entry,
+                output_dir,
+                prefix,
+                suffix,
+                compress_threads,
+                post_process,
+                max_chunk_bytes,
+                max_chunk_rows,
+            )
+            for entry in data_entries
+        ]
+        for entry, future in zip(data_entries, futures):
+            for output_file, rows, result in merge_collected(future.result()):
+                results.append((output_file, rows, result))
+                written.append((entry.tag, output_file, rows))
+
+    schema_lines = []
+    for entry in archive.entries:
+        if entry.desc == "TABLE DATA":
+            continue
+        for line in entry.defn.splitlines(keepends=True):
+            stripped = line.strip()
+            if stripped and not stripped.startswith("--") and not is_meta_line(line):
+                schema_lines.append(line if line.endswith("\n") else line + "\n")
+
+    if schema_lines:
         schema_file = output_dir / f"{prefix}schema.sql"
         with schema_file.open("w", encoding="utf-8") as fout:
             fout.write("-- Non-INSERT statements (CREATE, ALTER, etc.)\n")
-            fout.write(f"-- Generated from: {input_path.name}\n")
+            fout.write(f"-- Generated from: {archive_dir.name}\n")
             fout.write(f"-- Generated at: {datetime.now().isoformat()}\n")
             fout.write("\n")
-            for line in non_insert_lines:
-                fout.write(line)
-        print(f"  {schema_file.name}: {len(non_insert_lines)} lines")
-    
-    print(f"\nSplit into {len(tables)} table files in '{output_dir}'")
+            fout.writelines(schema_lines)
+
+    if manifest or max_chunk_bytes is not None or max_chunk_rows is not None:
+        write_manifest(output_dir, archive_dir.name, written, prefix)
+    return sorted(results, key=lambda r: r[0].name)
+
+
+def _data_file_size(archive_dir: Path, entry: TocEntry) -> int:
+    for suffix in ("", ".gz", ".zst", ".lz4"):
+        candidate = archive_dir / (entry.filename + suffix)
+        if candidate.exists():
+            return candidate.stat().st_size
+    return 0
+
+
+def prepare_table_dir(
+    input_dir: Path,
+    jobs: int = 1,
+    post_process: Callable[[Path], Any] | None = None,
+) -> tuple[Path, list[tuple[Path, int, Any]] | None]:
+    """
+    Resolve a tool's input directory.
+
+    A plain directory of table files is returned as-is with no results. A pg_dump
+    -Fd directory is split in parallel into <input>_tables/ first (running
+    post_process on each table in its worker) and (tables_dir, results) is returned.
+    """
+    if not is_directory_archive(input_dir):
+        return input_dir, None
+
+    output_dir = input_dir.parent / f"{input_dir.name}_tables"
+    print(f"Extracting -Fd archive '{input_dir}' into '{output_dir}' with {jobs} workers...")
+    results = split_directory_archive(input_dir, output_dir, jobs=jobs, post_process=post_process)
+    return output_dir, results
 
 
 def main() -> None:
     args = parse_args()
+    start_stats(args, "split_by_table")
+    start_progress(args, "split_by_table")
+    start_profile(args, "split_by_table")
     input_path: Path = args.input
-    output_dir: Path = args.output_dir or input_path.parent / f"{input_path.stem}_tables"
     
-    if not input_path.exists():
+    if is_stdio(input_path):
+        if not args.output_dir:
+            print("Error: output_dir is required when reading from stdin")
+            return
+    elif not input_path.exists():
         print(f"Error: Input file '{input_path}' not found")
         return
     
+    if args.max_chunk_rows is not None and args.max_chunk_rows < 1:
+        print("Error: --max-chunk-rows must be at least 1")
+        return
+    
+    output_dir: Path = args.output_dir or input_path.parent / f"{sql_stem(input_path)}_tables"
+    
+    if is_directory_archive(input_path):
+        print(f"Splitting -Fd archive '{input_path}' by table with {args.jobs} workers...")
+        results = split_directory_archive(
+            input_path, output_dir, args.prefix, args.compress, args.compress_threads, args.jobs,
+            max_chunk_bytes=args.max_chunk_bytes, max_chunk_rows=args.max_chunk_rows, manifest=args.manifest,
+        )
+        for output_file, rows, _ in results:
+            print(f"  {output_file.name}: {rows} rows")
+        print(f"\nSplit into {len(results)} table files in '{output_dir}'")
+        finish_profile(args, "split_by_table")
+        finish_progress(args)
+        finish_stats(args)
+        print("Done!")
+        return
+    
     print(f"Splitting '{input_path}' by table...")
-    split_file(input_path, output_dir, args.prefix)
+    try:
+        split_file(
+            input_path, output_dir, args.prefix, args.compress, args.compress_threads,
+            args.max_chunk_bytes, args.max_chunk_rows, args.manifest,
+        )
+    except ArchiveError as e:
+        print(f"Error: {e}")
+        return
+    finish_profile(args, "split_by_table")
+    finish_progress(args)
+    finish_stats(args)
     print("Done!")
 
 
@@ -0,0 +1,407 @@
+"""Quote-aware helpers for reading INSERT statements from plain SQL files."""
+import json
+import re
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from dump_io import open_input
+from dump_profile import hot_path
+from dump_progress import follow
+from dump_stats import timed_iter
+
+
+# Characters that can change the scanner state outside of a quoted section
+_SPECIAL = re.compile(r"['\";]|--")
+
+_INSERT_HEAD = re.compile(
+    r'INSERT\s+INTO\s+((?:"[^"]+"|\w+)(?:\.(?:"[^"]+"|\w+))?)\s*(?:\(([^)]*)\))?\s*VALUES\s*\(',
+    re.IGNORECASE,
+)
+
+
+@hot_path
+def iter_statements(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yield complete SQL statements (including the trailing ';') from an iterable of lines.
+
+    Works in a single forward pass, so statements spanning several lines and several
+    statements on one line (as written by the multiline fixers) are both handled.
+    Semicolons inside single-quoted literals or double-quoted identifiers are ignored,
+    '' is treated as an escaped quote (standard_conforming_strings=on), and `--`
+    comments outside of quotes are dropped.
+    """
+    parts: list[str] = []
+    quote: str | None = None
+
+    for line in lines:
+        start = 0
+        pos = 0
+        n = len(line)
+
+        while pos < n:
+            if quote is not None:
+                end = line.find(quote, pos)
+                if end == -1:
+                    pos = n
+                    break
+                pos = end + 1
+                if pos < n and line[pos] == quote:
+                    # Doubled quote: still inside the literal
+                    pos += 1
+                else:
+                    quote = None
+                continue
+
+            match = _SPECIAL.search(line, pos)
+            if match is None:
+                pos = n
+                break
+
+            token = match.group()
+            if token == ";":
+                parts.append(line[start:match.end()])
+                statement = "".join(parts).strip()
+                parts = []
+                if statement:
+                    yield statement
+                start = pos = match.end()
+            elif token == "--":
+                parts.append(line[start:match.start()])
+                start = pos = n
+            else:
+                quote = token
+                pos = match.end()
+
+        parts.append(line[start:])
+
+    tail = "".join(parts).strip()
+    if tail:
+        yield tail
+
+
+def iter_file_statements(file_path: Path) -> Iterator[str]:
+    """Stream statements from a (possibly compressed) SQL file without reading it into memory."""
+    with open_input(file_path) as fin, follow(fin):
+        yield from timed_iter(iter_statements(timed_iter(fin, "read")), "tokenize")
+
+
+# A complete single-quoted literal, '' escapes included, with its body as group 1.
+# Written unrolled ([^']* between the escapes) so a match never backtracks: the
+# lazy "(?:[^'\\]|\\.|'')*?" form it replaces went quadratic on long runs of
+# backslashes and quotes, and ended a literal at its first ''.
+SQL_LITERAL = re.compile(r"'([^']*(?:''[^']*)*)'")
+SQL_LITERAL_BYTES = re.compile(rb"'([^']*(?:''[^']*)*)'")
+
+_INSERT_INTO = re.compile(r"INSERT INTO")
+_INSERT_INTO_BYTES = re.compile(rb"INSERT INTO")
+_STATEMENT_SPECIAL = re.compile(r"['\";]")
+_STATEMENT_SPECIAL_BYTES = re.compile(rb"['\";]")
+# Quoted section starting at a quote character, doubled quotes included
+_QUOTED_SECTION = {
+    "'": SQL_LITERAL,
+    '"': re.compile(r'"[^"]*(?:""[^"]*)*"'),
+    b"'": SQL_LITERAL_BYTES,
+    b'"': re.compile(rb'"[^"]*(?:""[^"]*)*"'),
+}
+
+
+@hot_path
+def iter_insert_spans(data) -> Iterator[tuple[int, int]]:
+    """
+    Yield (start, end) offsets of every 'INSERT INTO ... ;' in a str or bytes-like object.
+
+    end is just past the terminating ';'. Unlike the `INSERT INTO[^;]+;` regex
+    this replaces, semicolons inside quoted literals do not end a statement,
+    and the whole scan is a single linear pass: an INSERT that is never
+    terminated stops the search instead of being rescanned from every later
+    INSERT INTO.
+    """
+    if isinstance(data, str):
+        head, special = _INSERT_INTO, _STATEMENT_SPECIAL
+    else:
+        head, special = _INSERT_INTO_BYTES, _STATEMENT_SPECIAL_BYTES
+
+    pos = 0
+    while True:
+        start = head.search(data, pos)
+        if start is None:
+            return
+        pos = start.end()
+        while True:
+            match = special.search(data, pos)
+            if match is None:
+                return
+            token = match.group()
+            if token == ";" or token == b";":
+                yield start.start(), match.end()
+                pos = match.end()
+                break
+            section = _QUOTED_SECTION[token].match(data, match.start())
+            if section is None:
+                # Unterminated quote: nothing after it can end a statement
+                return
+            pos = section.end()
+
+
+@hot_path
+def parse_insert_head(statement: str) -> tuple[str, list[str], int] | None:
+    """
+    Parse the head of an INSERT statement.
+
+    Returns (table, columns, values_start) where values_start is the offset just
+    after the opening parenthesis of the VALUES list, or None if the statement
+    is not a single-table INSERT ... VALUES.
+    """
+    match = _INSERT_HEAD.match(statement)
+    if not match:
+        return None
+
+    table = match.group(1).split(".")[-1].strip('"')
+    columns = [c.strip() for c in (match.group(2) or "").split(",") if c.strip()]
+    return table, columns, match.end()
+
+
+def parse_insert_target(statement: str) -> tuple[str, list[str], int] | None:
+    """parse_insert_head, but with the table name as written: schema-qualified and quoted if it was."""
+    match = _INSERT_HEAD.match(statement)
+    if not match:
+        return None
+
+    columns = [c.strip() for c in (match.group(2) or "").split(",") if c.strip()]
+    return match.group(1), columns, match.end()
+
+
+@hot_path
+def split_values(statement: str, values_start: int) -> tuple[list[str], int]:
+    """
+    Split the VALUES tuple of an INSERT statement into raw SQL value tokens.
+
+    Returns (values, values_end) where values_end is the offset of the closing
+    parenthesis. Tokens are returned stripped but otherwise untouched, so a
+    string literal keeps its surrounding quotes and '' escapes.
+    """
+    bounds, values_end = _value_bounds(statement, values_start)
+    values = [statement[bounds[i]:bounds[i + 1]].strip() for i in range(0, len(bounds), 2)]
+    return values, values_end
+
+
+def _value_bounds(statement: str, values_start: int) -> tuple[list[int], int]:
+    """Offsets (start, end, start, end, ...) of every field of a VALUES tuple, plus the closing paren."""
+    bounds: list[int] = []
+    depth = 0
+    pos = values_start
+    token_start = values_start
+    n = len(statement)
+
+    while pos < n:
+        char = statement[pos]
+        if char == "'" or char == '"':
+            end = pos + 1
+            while True:
+                end = statement.find(char, end)
+                if end == -1:
+                    raise ValueError("Unterminated quoted value in INSERT statement")
+                if end + 1 < n and statement[end + 1] == char:
+                    end += 2
+                    continue
+                break
+            pos = end + 1
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            if depth == 0:
+                bounds.append(token_start)
+                bounds.append(pos)
+                return bounds, pos
+            depth -= 1
+        elif char == "," and depth == 0:
+            bounds.append(token_start)
+            bounds.append(pos)
+            token_start = pos + 1
+        pos += 1
+
+    raise ValueError("Unterminated VALUES list in INSERT statement")
+
+
+# Characters that matter while splitting a VALUES tuple outside of quotes
+_VALUE_SPECIAL = re.compile(r"['\"(),]")
+
+# One whole field: a '' -escaped literal or a bare token, then its separator.
+# Fields this does not cover (nested parentheses, "..." or E'...') fall back to _VALUE_SPECIAL.
+_VALUE_FIELD = re.compile(r"\s*('[^']*(?:''[^']*)*'|[^,()'\"]*?)\s*([,)])")
+
+
+class LazyRow:
+    """
+    The VALUES tuple of one INSERT statement, split and decoded on demand.
+
+    Holds the statement and a table of field offsets that is filled in only as
+    far as the highest field accessed so far, so reading the leading `id`
+    column of a row never scans the JSON documents after it. Behaves as a
+    read-only sequence of raw tokens (row[i], len(row), iteration); text(),
+    json() and the column-name accessors decode single fields.
+    """
+
+    __slots__ = ("statement", "columns", "_index", "_bounds", "_pos", "_depth", "_token_start", "_end")
+
+    def __init__(
+        self,
+        statement: str,
+        values_start: int,
+        columns: list[str] | None = None,
+        index: dict[str, int] | None = None,
+    ) -> None:
+        self.statement = statement
+        self.columns = columns or []
+        # Column name -> position, shared by every row with the same column list
+        self._index = index if index is not None else {c: i for i, c in enumerate(self.columns)}
+        self._bounds: list[int] = []  # start, end of each field found so far
+        self._pos = values_start
+        self._depth = 0
+        self._token_start = values_start
+        self._end = -1  # offset of the closing parenthesis once found
+
+    def _scan(self, wanted: int) -> None:
+        """Extend the offset table until it has more than `wanted` fields (or the tuple ends)."""
+        if self._end >= 0:
+            return
+        if not self._bounds and wanted >= len(self.statement):
+            # Everything is wanted: the plain character loop beats per-field regex calls
+            self._bounds, self._end = _value_bounds(self.statement, self._pos)
+            return
+        statement = self.statement
+        bounds = self._bounds
+        limit = 2 * wanted
+        pos = self._pos
+        depth = self._depth
+        token_start = self._token_start
+        search = _VALUE_SPECIAL.search
+        field = _VALUE_FIELD.match
+        find = statement.find
+        n = len(statement)
+
+        while len(bounds) <= limit:
+            if pos == token_start and not depth:
+                whole = field(statement, pos)
+                if whole is not None:
+                    bounds.extend(whole.span(1))
+                    pos = token_start = whole.end()
+                    if statement[pos - 1] == ")":
+                        self._end = pos - 1
+                        break
+                    continue
+
+            match = search(statement, pos)
+            if match is None:
+                raise ValueError("Unterminated VALUES list in INSERT statement")
+            pos = match.end()
+            char = statement[pos - 1]
+
+            if char == "'" or char == '"':
+                while True:
+                    end = find(char, pos)
+                    if end == -1:
+                        raise ValueError("Unterminated quoted value in INSERT statement")
+                    pos = end + 1
+                    if pos < n and statement[pos] == char:
+                        pos += 1  # doubled quote: still inside the literal
+                        continue
+                    break
+            elif char == "(":
+                depth += 1
+            elif depth:
+                if char == ")":
+                    depth -= 1
+            else:
+                bounds.append(token_start)
+                bounds.append(pos - 1)
+                token_start = pos
+                if char == ")":
+                    self._end = pos - 1
+                    break
+
+        self._pos = pos
+        self._depth = depth
+        self._token_start = token_start
+
+    @property
+    def values_end(self) -> int:
+        """Offset of the closing parenthesis of the VALUES tuple."""
+        if self._end < 0:
+            self._scan(len(self.statement))
+        return self._end
+
+    def __len__(self) -> int:
+        if self._end < 0:
+            self._scan(len(self.statement))
+        return len(self._bounds) // 2
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if len(self._bounds) <= 2 * i:
+            self._scan(i)
+            if len(self._bounds) <= 2 * i:
+                raise IndexError("VALUES index out of range")
+        return self.statement[self._bounds[2 * i]:self._bounds[2 * i + 1]].strip()
+
+    def __iter__(self) -> Iterator[str]:
+        if self._end < 0:
+            self._scan(len(self.statement))
+        statement = self.statement
+        bounds = self._bounds
+        for i in range(0, len(bounds), 2):
+            yield statement[bounds[i]:bounds[i + 1]].strip()
+
+    def raw(self, column: str) -> str:
+        """Raw SQL token of a column, e.g. "'50793e3c-...'" or NULL."""
+        return self[self._index[column]]
+
+    def text(self, column: str) -> str | None:
+        """Decoded text of a column (None for NULL), see decode_literal."""
+        return decode_literal(self.raw(column))
+
+    def json(self, column: str):
+        """Parse a JSON/JSONB column; NULL gives None."""
+        text = self.text(column)
+        return None if text is None else json.loads(text)
+
+    def __repr__(self) -> str:
+        return f"LazyRow({self.statement[:60]!r}...)"
+
+
+def decode_literal(token: str) -> str | None:
+    """
+    Decode a raw SQL value token into its text value.
+
+    NULL becomes None, quoted literals are unquoted with '' unescaped, and
+    anything else (numbers, TRUE/FALSE) is returned as written.
+    """
+    if token.upper() == "NULL":
+        return None
+    if len(token) >= 2 and token[0] == "'" and token[-1] == "'":
+        return token[1:-1].replace("''", "'")
+    return token
+
+
+def iter_insert_rows(statements: Iterable[str]) -> Iterator[tuple[str, list[str], LazyRow, str]]:
+    """
+    Yield (table, columns, values, statement) for every single-row INSERT ... VALUES.
+
+    values is a LazyRow: index it like the list split_values returns, but only
+    the fields that are actually read get split out. Other statements are skipped.
+    """
+    indexes: dict[tuple[str, ...], dict[str, int]] = {}
+    for statement in statements:
+        head = parse_insert_head(statement)
+        if head is None:
+            continue
+        table, columns, values_start = head
+        key = tuple(columns)
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = {c: i for i, c in enumerate(columns)}
+        yield table, columns, LazyRow(statement, values_start, columns, index), statement
@@ -0,0 +1,167 @@
+"""
+Cut a small, referentially consistent subset out of a full backup.
+
+Starting from seed rows (e.g. one subject or a few users), the subset
+follows foreign keys down to every row that references a selected row
+(subjects -> domains -> learning_nodes -> content_items -> content_versions
+...), then up to every parent those rows need (e.g. the users behind
+user_progress). Rows reached on the way up are not expanded downwards again,
+so seeding one subject does not pull in every other subject's content.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from dump_io import is_stdio, read_text, sql_stem
+from dump_profile import add_profile_args, finish_profile, start_profile
+from dump_stats import add_stats_args, finish_stats, start_stats
+from dump_source import resolve_table_dir, table_files as dump_table_files
+from row_selection import Selection, child_closure, parent_closure, write_selection
+from schema_model import parse_schema
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Write the FK closure of a set of seed rows as a mini dump (table_*.sql files).",
+    )
+    parser.add_argument(
+        "input",
+        type=Path,
+        help="Table directory, SQL dump (.gz/.zst, '-' for stdin) or pg_dump archive.",
+    )
+    parser.add_argument(
+        "output_dir",
+        type=Path,
+        nargs="?",
+        help="Directory for the subset (default: <input>_subset/).",
+    )
+    parser.add_argument(
+        "--seed",
+        action="append",
+        default=[],
+        metavar="TABLE=ID[,ID...]",
+        help="Primary key values to start from, e.g. subjects=50793e3c-2814-43fa-bedc-fbaf002c1acc. Repeatable.",
+    )
+    parser.add_argument(
+        "--seed-file",
+        action="append",
+        default=[],
+        metavar="TABLE=PATH",
+        help="Read primary key values for TABLE from a file, one per line. Repeatable.",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory for tables extracted from a dump file (default: system temp dir).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when the input is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+def seed_token(value: str) -> str:
+    """Render a seed id the way it appears in the dump: numbers bare, everything else quoted."""
+    if value.lstrip("+-").isdigit():
+        return value
+    return "'" + value.replace("'", "''") + "'"
+
+
+def parse_seeds(seeds: list[str], seed_files: list[str]) -> dict[str, list[str]]:
+    """Collect TABLE=ID[,ID...] and TABLE=PATH options into table -> ids."""
+    result: dict[str, list[str]] = {}
+    for option in seeds:
+        table, _, ids = option.partition("=")
+        if not ids:
+            raise ValueError(f"Invalid --seed '{option}', expected TABLE=ID[,ID...]")
+        result.setdefault(table.strip(), []).extend(i.strip() for i in ids.split(",") if i.strip())
+    for option in seed_files:
+        table, _, path = option.partition("=")
+        if not path:
+            raise ValueError(f"Invalid --seed-file '{option}', expected TABLE=PATH")
+        ids = [line.strip() for line in read_text(path).splitlines() if line.strip()]
+        result.setdefault(table.strip(), []).extend(ids)
+    return result
+
+
+def subset(table_dir: Path, output_dir: Path, seeds: dict[str, list[str]], source_name: str) -> dict[str, int]:
+    """Write the FK closure of the seed rows to output_dir. Returns rows written per table."""
+    schema_file = table_dir / "table_schema.sql"
+    model = parse_schema(schema_file)
+    table_files = dump_table_files(table_dir)
+
+    selected: Selection = {}
+    for table, ids in seeds.items():
+        pk_columns = model.primary_keys.get(table)
+        if table not in table_files:
+            raise ValueError(f"Seed table '{table}' has no table file in '{table_dir}'")
+        if not pk_columns or len(pk_columns) != 1:
+            raise ValueError(f"Seed table '{table}' needs a single-column primary key")
+        selected.setdefault(table, set()).update((seed_token(i),) for i in ids)
+
+    # Seeds that do not exist are dropped by the write pass, which only emits rows it finds
+    child_closure(table_files, model, selected)
+    parent_closure(table_files, model, selected)
+
+    written = write_selection(table_files, model, selected, output_dir, source_name)
+    shutil.copyfile(schema_file, output_dir / "table_schema.sql")
+    return written
+
+
+def main() -> None:
+    args = parse_args()
+    start_stats(args, "subset_dump")
+    start_profile(args, "subset_dump")
+    input_path: Path = args.input
+
+    if not is_stdio(input_path) and not input_path.exists():
+        print(f"Error: Input '{input_path}' not found")
+        return
+
+    try:
+        seeds = parse_seeds(args.seed, args.seed_file)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        return
+    if not seeds:
+        print("Error: at least one --seed or --seed-file is required")
+        return
+
+    name = "stdin" if is_stdio(input_path) else (input_path.name if input_path.is_dir() else sql_stem(input_path))
+    output_dir: Path = args.output_dir or Path(f"{name}_subset")
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        try:
+            table_dir = resolve_table_dir(input_path, Path(tmp), args.jobs)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        if not (table_dir / "table_schema.sql").exists():
+            print(f"Error: Schema file not found: {table_dir / 'table_schema.sql'}")
+            return
+
+        print(f"Subsetting '{input_path}' from {sum(len(v) for v in seeds.values())} seed rows...")
+        try:
+            written = subset(table_dir, output_dir, seeds, name)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+
+    for table, rows in written.items():
+        print(f"  table_{table}.sql: {rows} rows")
+    print(f"\nWrote {sum(written.values())} rows in {len(written)} table files to '{output_dir}'")
+    finish_profile(args, "subset_dump")
+    finish_stats(args)
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
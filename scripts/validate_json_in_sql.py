@@ -1,48 +1,114 @@
+import argparse
 import json
+import os
 import re
 from pathlib import Path
 
+from dump_io import list_sql_files, map_input, read_text, sql_stem
+from dump_profile import add_profile_args, finish_profile, hot_path, start_profile
+from dump_progress import Tracker, add_progress_args, expect, finish_progress, start_progress, tracking
+from dump_stats import add_stats_args, finish_stats, parse_json, stage, start_stats
+from split_by_table import prepare_table_dir
+from sql_statements import SQL_LITERAL_BYTES, iter_insert_spans
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Validate JSON values inside SQL INSERT statements.",
+    )
+    parser.add_argument(
+        "input_dir",
+        type=Path,
+        nargs="?",
+        default=Path("scripts/backup_plain_tables"),
+        help="Directory of table_*.sql files or a pg_dump -Fd directory (default: scripts/backup_plain_tables).",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes when input_dir is a pg_dump -Fd directory (default: CPU count).",
+    )
+    add_progress_args(parser)
+    add_stats_args(parser)
+    add_profile_args(parser)
+    return parser.parse_args()
+
+
+_LINE_CONTINUATION = re.compile(rb'\\\s*\n\s*')
+_JSON_START = re.compile(rb"\s*[{\[]")
+
 
 def validate_file(file_path: Path) -> tuple[int, list[str]]:
     """Validate all JSON strings in a SQL file."""
-    content = file_path.read_text(encoding="utf-8")
-    content = re.sub(r'\\\s*\n\s*', '', content)  # Remove line continuations
+    size = file_path.stat().st_size
+    with map_input(file_path) as mapped:
+        if mapped is not None:
+            with tracking(size, len(mapped)) as progress:
+                return validate_bytes(mapped, progress)
+    
+    data = read_text(file_path).encode("utf-8")
+    with tracking(size, len(data)) as progress:
+        return validate_bytes(data, progress)
+
+
+@hot_path
+def validate_bytes(data, progress: Tracker | None = None) -> tuple[int, list[str]]:
+    """
+    Same checks as validate_file, run over a bytes-like object (e.g. an mmap).
+    
+    Statements and literals are located with linear-time byte scanners and only
+    literals that start with { or [ are decoded, so non-JSON text is never
+    decoded at all. progress, if given, is set to the offset of each statement.
+    """
+    if _LINE_CONTINUATION.search(data):
+        data = _LINE_CONTINUATION.sub(b'', data)  # Remove line continuations
     
     errors = []
     json_count = 0
+    line_num = 1
+    line_pos = 0
+    progress = progress or Tracker()
     
-    # Find all INSERT statements (may span multiple lines)
-    inserts = re.findall(r'INSERT INTO[^;]+;', content, re.DOTALL)
-    
-    for insert_stmt in inserts:
-        # Find all quoted strings that look like JSON
-        pattern = r"'((?:[^'\\]|\\.|'')*?)'"
-        for match in re.finditer(pattern, insert_stmt, re.DOTALL):
-            inner = match.group(1).replace("''", "'")
-            if inner.strip().startswith(("{", "[")):
+    with stage("tokenize", nbytes=len(data)):
+        for insert_start, insert_end in iter_insert_spans(data):
+            progress.position = insert_start
+            for match in SQL_LITERAL_BYTES.finditer(data, insert_start, insert_end):
+                if not _JSON_START.match(data, match.start(1), match.end(1)):
+                    continue
                 json_count += 1
+                inner = data[match.start(1):match.end(1)].replace(b"''", b"'")
                 try:
-                    json.loads(inner)
-                except json.JSONDecodeError as e:
-                    # Find line number in original content
-                    line_num = content[:content.find(insert_stmt)].count('\n') + 1
+                    parse_json(inner)
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    # Count newlines incrementally instead of rescanning from the start
+                    line_num += data[line_pos:insert_start].count(b'\n')
+                    line_pos = insert_start
                     errors.append(f"Line {line_num}: {str(e)[:100]}")
     
     return json_count, errors
 
 
 def main():
-    input_dir = Path("scripts/backup_plain_tables")
-    sql_files = sorted(input_dir.glob("table_*.sql"))
+    args = parse_args()
+    start_stats(args, "validate_json_in_sql")
+    start_progress(args, "validate_json_in_sql")
+    start_profile(args, "validate_json_in_sql")
+    input_dir, extracted = prepare_table_dir(args.input_dir, args.jobs, validate_file)
+    
+    if extracted is not None:
+        # Validated by the worker process that extracted each table
+        results = [(sql_file, result) for sql_file, _, result in extracted]
+    else:
+        table_files = [f for f in list_sql_files(input_dir) if sql_stem(f) != "table_schema"]
+        expect(sum(f.stat().st_size for f in table_files))
+        results = [(sql_file, validate_file(sql_file)) for sql_file in table_files]
     
     total_json = 0
     total_errors = 0
     
-    for sql_file in sql_files:
-        if sql_file.name == "table_schema.sql":
-            continue
-        
-        count, errors = validate_file(sql_file)
+    for sql_file, (count, errors) in results:
         total_json += count
         if errors:
             total_errors += len(errors)
@@ -51,6 +117,9 @@ def main():
                 print(f"  {err}")
     
     print(f"\nTotal: {total_json} JSON values, {total_errors} errors")
+    finish_profile(args, "validate_json_in_sql")
+    finish_progress(args)
+    finish_stats(args)
 
 
 if __name__ == "__main__":